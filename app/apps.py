@@ -1,11 +1,15 @@
+import sys
 from threading import Lock
 
 from django.apps import AppConfig as DjangoAppConfig
 
-from init.settings import user_logger
+from init.settings import user_logger, WORKER
 
 logger = user_logger
 
+# 独立worker进程的启动命令，该命令自行启动消费者
+WORKER_COMMAND = 'run_workers'
+
 
 # This is the place to import signals，不能删
 
@@ -21,15 +25,18 @@ class AppConfig(DjangoAppConfig):
                 return
             AppConfig.ready_called = True  # 标记ready方法已被调用
 
-            from app.workers import start_workers
-            from app.tasks import start_schedulers
-            logger.info('Starting Kafka consumer thread...')
-            start_workers()
-            logger.info('Starting Kafka consumer thread ok...')
+            if WORKER['WEB_CONSUMER_ENABLE'] and WORKER_COMMAND not in sys.argv:
+                from app.workers import start_workers
+                from app.tasks import start_schedulers
+                logger.info('Starting Kafka consumer thread...')
+                start_workers()
+                logger.info('Starting Kafka consumer thread ok...')
 
-            logger.info('Starting schedulers thread...')
-            start_schedulers()
-            logger.info('Starting schedulers thread ok...')
+                logger.info('Starting schedulers thread...')
+                start_schedulers()
+                logger.info('Starting schedulers thread ok...')
+            else:
+                logger.info('Kafka consumers and schedulers are disabled in this process.')
 
             logger.info('Initializing Elasticsearch index...')
             try:
@@ -8,6 +8,8 @@ _user_context = contextvars.ContextVar("user_context", default={})
 query_embedding_context = contextvars.ContextVar("query_embedding", default=[])
 _trace_progress_context = contextvars.ContextVar("trace_progress", default="")
 _openapi_key_context = contextvars.ContextVar("ak", default="")
+# 请求级query向量备忘，key为(model, query)
+_query_embedding_memo_context = contextvars.ContextVar("query_embedding_memo", default=None)
 
 class _UserContext(object):
     @property
@@ -79,6 +81,38 @@ class _OpenapiContext(object):
     def ak(self, value):
         _openapi_key_context.set(value)
 
+class _QueryEmbeddingMemo(object):
+    """
+    请求（会话）级query向量备忘，同一请求内各检索路由、表格补全及多次工具调用共享同一份向量
+    备忘字典在请求入口创建，子线程拷贝上下文后引用的是同一个字典
+    """
+
+    def begin(self):
+        """开启备忘作用域，已处于作用域内时复用外层备忘并返回None"""
+        if _query_embedding_memo_context.get() is not None:
+            return None
+        return _query_embedding_memo_context.set({})
+
+    def end(self, token):
+        if token is None:
+            return
+        try:
+            _query_embedding_memo_context.reset(token)
+        except ValueError:
+            # 流式生成器可能在其他上下文中关闭，无法reset时直接清空
+            _query_embedding_memo_context.set(None)
+
+    def get(self, model: str, query: str):
+        memo = _query_embedding_memo_context.get()
+        return memo.get((model, query)) if memo is not None else None
+
+    def put(self, model: str, query: str, embedding):
+        memo = _query_embedding_memo_context.get()
+        if memo is not None and embedding:
+            memo[(model, query)] = embedding
+
+
 UserContext = _UserContext()
 TraceContext = TraceContext()
 OpenapiContext = _OpenapiContext()
+QueryEmbeddingMemo = _QueryEmbeddingMemo()
@@ -25,10 +25,11 @@ def file_indexing(request):
         file_name = data.get('file_name', '')
         callback = data.get('callback')
         metadata = data.get('metadata', {})
+        incremental = data.get('incremental')
         if not file_id:
             raise CheckError("请求体中file_id必传")
         async_file_indexing(file_id=file_id, file_name=file_name,
-                            metadata=metadata, callbacks=[callback], user=get_user_info())
+                            metadata=metadata, callbacks=[callback], user=get_user_info(), incremental=incremental)
         return HttpResponse(ApiReturn(ApiReturn.CODE_OK, body={"file_id": file_id, "status": "success"}).to_json())
     except CheckError as e:
         error = OpenApiError(message=e.error_msg,
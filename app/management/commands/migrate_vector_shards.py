@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import ShardingMethod, PointStruct
+
+from init.settings import user_logger, QDRANT_VECTOR_DB
+from bella_rag.vector_stores.qdrant import build_client_kwargs
+from bella_rag.vector_stores.sharding import ShardRouter, SOURCE_ID_KEY
+
+logger = user_logger
+
+
+class Command(BaseCommand):
+    help = ('将qdrant集合迁移为按租户custom分片的新集合，point id不变，可重复执行；'
+            '迁移期间的删除不会同步，需在停写期间执行或完成后再执行一次，'
+            '迁移完成后将collection_name等配置切换为新集合并开启[QDRANT_VECTOR_DB].sharding')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', required=True, help='源集合名称')
+        parser.add_argument('--target', required=True, help='目标集合名称，不存在时按源集合的向量配置创建')
+        parser.add_argument('--shard-num', type=int, default=QDRANT_VECTOR_DB['SHARD_NUM'],
+                            help='空间按哈希归入的分片数，0为每个空间一个分片，需与线上shard_num一致')
+        parser.add_argument('--shard-number', type=int, default=1, help='每个分片key的物理分片数')
+        parser.add_argument('--replication-factor', type=int, default=None, help='副本数，默认与源集合一致')
+        parser.add_argument('--batch-size', type=int, default=256, help='每批迁移的point数量')
+        parser.add_argument('--offset', default=None, help='从指定point id继续迁移，用于中断后恢复')
+
+    def handle(self, *args, **options):
+        source, target = options['source'], options['target']
+        if source == target:
+            raise CommandError('源集合与目标集合不能相同')
+
+        client = QdrantClient(**build_client_kwargs(
+            url=QDRANT_VECTOR_DB["URL"] if QDRANT_VECTOR_DB["URL"] else None,
+            host=QDRANT_VECTOR_DB["HOST"] if not QDRANT_VECTOR_DB["URL"] else None,
+            port=QDRANT_VECTOR_DB["PORT"] if not QDRANT_VECTOR_DB["URL"] else None,
+            grpc_port=QDRANT_VECTOR_DB["GRPC_PORT"],
+            prefer_grpc=QDRANT_VECTOR_DB["PREFER_GRPC"],
+            api_key=QDRANT_VECTOR_DB["API_KEY"] if QDRANT_VECTOR_DB["API_KEY"] else None,
+        ))
+        if not client.collection_exists(source):
+            raise CommandError(f'源集合不存在：{source}')
+        source_info = client.get_collection(source)
+        self._ensure_target(client, source_info, target, options)
+
+        router = ShardRouter(options['shard_num'])
+        shard_keys = set()
+        migrated = 0
+        offset = options['offset']
+        while True:
+            points, offset = client.scroll(collection_name=source, limit=options['batch_size'], offset=offset,
+                                           with_payload=True, with_vectors=True)
+            groups = defaultdict(list)
+            for point in points:
+                groups[router.shard_key((point.payload or {}).get(SOURCE_ID_KEY))].append(point)
+            for shard_key, shard_points in groups.items():
+                if shard_key not in shard_keys:
+                    self._create_shard_key(client, target, shard_key)
+                    shard_keys.add(shard_key)
+                client.upsert(collection_name=target, shard_key_selector=shard_key,
+                              points=[PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in shard_points])
+            migrated += len(points)
+            logger.info(f'migrate vector shards: {source} -> {target}, migrated: {migrated}, next offset: {offset}')
+            if offset is None:
+                break
+
+        source_count = client.count(collection_name=source, exact=True).count
+        target_count = client.count(collection_name=target, exact=True).count
+        self.stdout.write(f'迁移完成：{source}({source_count}) -> {target}({target_count})，分片数：{len(shard_keys)}')
+        if source_count != target_count:
+            self.stdout.write(self.style.WARNING('源集合与目标集合数量不一致，迁移期间可能有写入，可重新执行迁移'))
+
+    @staticmethod
+    def _ensure_target(client: QdrantClient, source_info, target: str, options: dict):
+        """创建custom分片的目标集合，并复制源集合的payload索引"""
+        if client.collection_exists(target):
+            params = client.get_collection(target).config.params
+            if params.sharding_method != ShardingMethod.CUSTOM:
+                raise CommandError(f'目标集合已存在且不是custom分片方式：{target}')
+        else:
+            source_params = source_info.config.params
+            client.create_collection(
+                collection_name=target,
+                vectors_config=source_params.vectors,
+                sharding_method=ShardingMethod.CUSTOM,
+                shard_number=options['shard_number'],
+                replication_factor=options['replication_factor'] or source_params.replication_factor,
+            )
+            logger.info(f'created custom sharded collection: {target}')
+
+        existing = client.get_collection(target).payload_schema or {}
+        for field_name, field_info in (source_info.payload_schema or {}).items():
+            if field_name not in existing:
+                client.create_payload_index(collection_name=target, field_name=field_name,
+                                            field_schema=field_info.data_type, wait=True)
+
+    @staticmethod
+    def _create_shard_key(client: QdrantClient, collection_name: str, shard_key: str):
+        # 分片key已存在时qdrant返回错误，重复执行迁移时忽略
+        try:
+            client.create_shard_key(collection_name=collection_name, shard_key=shard_key)
+        except Exception as e:
+            logger.info(f'create shard key skipped: {collection_name}.{shard_key}, {e}')
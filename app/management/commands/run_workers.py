@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import signal
+import threading
+from typing import List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from init.settings import user_logger, WORKER
+
+logger = user_logger
+
+
+def parse_listener_specs(specs: List[str]) -> List[Tuple[str, int, int]]:
+    """
+    解析消费者配置，格式：名称[:进程数[:线程数]]，进程数、线程数默认为1
+    """
+    res = []
+    for spec in specs:
+        parts = [part.strip() for part in spec.split(':')]
+        if not parts[0] or len(parts) > 3:
+            raise CommandError(f'消费者配置不合法：{spec}')
+        try:
+            process_num = int(parts[1]) if len(parts) > 1 else 1
+            instance_num = int(parts[2]) if len(parts) > 2 else 1
+        except ValueError:
+            raise CommandError(f'消费者配置不合法：{spec}')
+        if process_num < 1 or instance_num < 1:
+            raise CommandError(f'进程数、线程数需大于0：{spec}')
+        res.append((parts[0], process_num, instance_num))
+    return res
+
+
+def run_listener_process(name: str, instance_num: int):
+    """子进程入口：初始化django后启动指定消费者，收到退出信号后停止消费"""
+    import django
+    from init.const import APPS
+    if "app.apps.AppConfig" not in APPS:
+        APPS.append("app.apps.AppConfig")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "init.settings")
+    django.setup()
+
+    from app.workers import start_workers, stop_workers
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stopped.set())
+    signal.signal(signal.SIGINT, lambda *args: stopped.set())
+
+    logger.info(f'worker process start, listener: {name}, instances: {instance_num}, pid: {os.getpid()}')
+    start_workers({name: instance_num})
+    stopped.wait()
+    logger.info(f'worker process stop, listener: {name}, pid: {os.getpid()}')
+    stop_workers()
+
+
+class Command(BaseCommand):
+    help = '独立启动kafka消费者进程，与web服务分开部署和扩容'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listener', action='append', dest='listeners',
+                            help='消费者配置，格式：名称[:进程数[:线程数]]，可重复指定，默认使用[WORKER].listeners')
+        parser.add_argument('--no-schedulers', action='store_true', help='不在当前进程启动定时任务')
+
+    def handle(self, *args, **options):
+        from app.workers import LISTENERS
+
+        specs = parse_listener_specs(options['listeners'] or WORKER['LISTENERS'])
+        unknown = [name for name, _, _ in specs if name not in LISTENERS]
+        if unknown:
+            raise CommandError(f'未知的消费者：{unknown}，可选：{list(LISTENERS)}')
+
+        # spawn方式启动，避免fork继承父进程的kafka、数据库连接
+        ctx = multiprocessing.get_context('spawn')
+        processes = []
+        for name, process_num, instance_num in specs:
+            for i in range(process_num):
+                process = ctx.Process(target=run_listener_process, args=(name, instance_num),
+                                      name=f'worker-{name}-{i}')
+                process.start()
+                processes.append(process)
+                logger.info(f'start worker process: {process.name}, pid: {process.pid}')
+
+        if not options['no_schedulers']:
+            from app.tasks import start_schedulers
+            start_schedulers()
+
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stopped.set())
+        signal.signal(signal.SIGINT, lambda *args: stopped.set())
+        # 任一子进程退出则整体退出，交由部署平台拉起
+        failed = False
+        while not stopped.wait(5):
+            if any(not process.is_alive() for process in processes):
+                logger.error('worker process exited unexpectedly, stop all workers')
+                failed = True
+                break
+
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        if failed:
+            raise CommandError('worker process exited unexpectedly')
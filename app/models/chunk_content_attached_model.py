@@ -20,6 +20,7 @@ class ChunkContentAttached(models.Model):
     chunk_status = models.IntegerField(default=1, verbose_name='切片状态')
     order_num = models.CharField(max_length=128, default='', verbose_name='切片层级信息')
     context_id = models.CharField(max_length=128, default='', verbose_name='切片管理上下文id')
+    content_hash = models.CharField(max_length=64, default='', verbose_name='切片内容指纹')
     create_time = models.DateTimeField(auto_now_add=True, null=True, verbose_name='创建时间')
     update_time = models.DateTimeField(auto_now=True, null=True, verbose_name='更新时间')
 
@@ -38,7 +39,8 @@ class ChunkContentAttached(models.Model):
             'content_title': self.content_title,
             'content_data': self.content_data,
             'chunk_pos': self.chunk_pos,
-            'token': self.token
+            'token': self.token,
+            'content_hash': self.content_hash
         }
 
     def to_dict(self):
@@ -81,16 +83,16 @@ class ChunkContentAttachedMapper:
 
         table_name = ChunkContentAttached._meta.db_table
         fields = ['chunk_id', 'source_id', 'content_title', 'content_data', 'chunk_pos', 'chunk_status',
-                  'token', 'order_num']  # 替换为实际字段名
+                  'token', 'order_num', 'content_hash']  # 替换为实际字段名
         update_fields = ['source_id', 'content_title', 'content_data', 'chunk_pos', 'chunk_status',
-                         'token', 'order_num']  # 替换为实际需要更新的字段
+                         'token', 'order_num', 'content_hash']  # 替换为实际需要更新的字段
 
         values = []
         for obj in chunk_content_attached_list:
             values.append((
                 obj.chunk_id, obj.source_id, obj.content_title.encode('utf-8', 'replace').decode('utf-8'),
                 obj.content_data.encode('utf-8', 'replace').decode('utf-8'), obj.chunk_pos, obj.chunk_status,
-                obj.token, obj.order_num
+                obj.token, obj.order_num, obj.content_hash
             ))
 
         fields_str = ', '.join([connection.ops.quote_name(field) for field in fields])
@@ -100,7 +102,7 @@ class ChunkContentAttachedMapper:
 
         sql = f"""
                         INSERT INTO {connection.ops.quote_name(table_name)} ({fields_str})
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                         ON DUPLICATE KEY UPDATE {update_str};
                         """
 
@@ -147,9 +149,9 @@ class ChunkContentAttachedMapper:
         return ChunkContentAttached.objects.filter(source_id=source_id).delete()
 
     @staticmethod
-    def chunk_pos_increment(source_id: str, index: int):
+    def chunk_pos_increment(source_id: str, index: int, step: int = 1):
         ChunkContentAttached.objects.filter(source_id=source_id, chunk_pos__gte=index) \
-            .update(chunk_pos=models.F('chunk_pos') + 1)
+            .update(chunk_pos=models.F('chunk_pos') + step)
 
     @staticmethod
     def chunk_pos_decrement(source_id: str, index: int):
@@ -34,7 +34,8 @@ class FileSummaryProcessor(FilePostProcessor):
             "ak_code": payload.get('ak_code'),
             "ak_sha": payload.get('ak_sha'),
             "ucid": DEFAULT_USER}
-        async_send_kafka_message(knowledge_file_extractor_producer, json.dumps(knowledge_file_summary_extract_msg))
+        async_send_kafka_message(knowledge_file_extractor_producer, json.dumps(knowledge_file_summary_extract_msg),
+                                 wait=False)
         user_logger.info(f'send file summary task : {file_id}')
 
 
@@ -72,5 +73,5 @@ class FileIndexingProcessor(FilePostProcessor):
             "ak_code": payload.get('ak_code'),
             "ak_sha": payload.get('ak_sha'),
         }
-        async_send_kafka_message(knowledge_index_task_kafka_producer, json.dumps(indexing_data))
+        async_send_kafka_message(knowledge_index_task_kafka_producer, json.dumps(indexing_data), wait=False)
         user_logger.info(f'send file indexing task : {file_id}')
@@ -1,10 +1,10 @@
 import json
+import queue
 import threading
-import time
 import traceback
 from typing import List, Dict, Any, Generator
 
-from app.common.contexts import UserContext, OpenapiContext
+from app.common.contexts import UserContext, OpenapiContext, QueryEmbeddingMemo
 from app.plugin.plugins import Plugin
 from app.response.entity import Message, Content, Text
 from app.response.rag_response import OpenApiError
@@ -12,16 +12,18 @@ from app.services.rag_service import rag_streaming, rag
 from app.strategy.retrieval import RetrievalMode
 from app.utils.llm_response_util import get_response_json_str
 from bella_rag.handler.streaming_handler import BaseEventHandler
+from bella_rag.utils.thread_util import with_context
 from bella_rag.vector_stores.types import MetadataFilters
-from deep_rag.common.contexts import DeepRagContext
+from deep_rag.common.contexts import DeepRagContext, SearchedFiles
 from deep_rag.entity.exception import UnablePlanException
 from deep_rag.entity.memory import Memory, MemoryItem
 from deep_rag.entity.plan import Plan, StepStatus, Step, Action
 from deep_rag.entity.stream import StreamResponse, StreamEventType, MessageWithPlan
 from deep_rag.pipline.plan_and_solve_runner import run_deep_rag, review_plan, replan, get_llm, plan
+from deep_rag.pipline.scheduler import run_steps, execute_tool_calls, STEP_START
 from deep_rag.prompt.pipline import multi_step_planning_prompt, memory_combine_prompt, conclusion_prompt
 from deep_rag.tools.schemas import search_tool, read_tool, tool_list
-from init.settings import user_logger
+from init.settings import user_logger, STREAM
 
 logger = user_logger
 
@@ -47,9 +49,12 @@ class RagRunner:
                       retrieve_mode: RetrievalMode = RetrievalMode.SEMANTIC,
                       plugins: List[Plugin] = None,
                       show_quote: bool = False):
-        return rag_streaming(query=query, top_k=top_k, file_ids=file_ids, api_key=api_key,
-                             model=model, metadata_filters=metadata_filters, retrieve_mode=retrieve_mode,
-                             plugins=plugins, show_quote=show_quote, event_handler=self.event_handler, )
+        stream = rag_streaming(query=query, top_k=top_k, file_ids=file_ids, api_key=api_key,
+                               model=model, metadata_filters=metadata_filters, retrieve_mode=retrieve_mode,
+                               plugins=plugins, show_quote=show_quote, event_handler=self.event_handler, )
+        if STREAM['RAG_HEARTBEAT']:
+            return iter(HeartbeatStreamWrapper(stream, self.session_id))
+        return stream
 
     def rag(self, query: str,
             top_k: int = 3,
@@ -70,57 +75,89 @@ class RagRunner:
                    plugins=plugins, show_quote=show_quote, event_handler=self.event_handler, )
 
 
+# 主生成器结束标记
+_STREAM_END = object()
+
+
+class _StreamError:
+    """主生成器异常，转交消费端抛出"""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
 class HeartbeatStreamWrapper:
-    """心跳包流式包装器 - 真正的独立心跳发送"""
+    """
+    心跳包流式包装器：主生成器在独立线程中执行，产出项经有界队列即时转发，空闲超过心跳间隔时发送心跳包
+    队列满时主生成器阻塞（背压）；主生成器异常在消费端重新抛出；客户端断开时关闭主生成器，终止上游执行
+    """
 
-    def __init__(self, main_generator: Generator[str, None, None], session_id: str, heartbeat_interval: int = 10):
+    def __init__(self, main_generator: Generator[str, None, None], session_id: str,
+                 heartbeat_interval: int = None, buffer_size: int = None):
         self.main_generator = main_generator
         self.session_id = session_id
-        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_interval = heartbeat_interval or STREAM['HEARTBEAT_INTERVAL']
+        self.buffer_size = buffer_size or STREAM['BUFFER_SIZE']
 
     def __iter__(self):
-        """使用超时机制来实现心跳包"""
-
-        # 将主生成器转换为列表以便处理
-        main_items = []
-        main_thread = threading.Thread(target=self._collect_main_items, args=(main_items,))
-        main_thread.daemon = True
+        items = queue.Queue(maxsize=self.buffer_size)
+        cancelled = threading.Event()
+        main_thread = threading.Thread(target=with_context(self._collect_main_items), args=(items, cancelled),
+                                       daemon=True)
         main_thread.start()
 
-        last_heartbeat = time.time()
-        main_index = 0
-
-        while main_thread.is_alive() or main_index < len(main_items):
-            current_time = time.time()
-
-            # 检查是否有新的主流程项目
-            if main_index < len(main_items):
-                yield main_items[main_index]
-                main_index += 1
-                last_heartbeat = current_time
-            else:
-                # 检查是否需要发送心跳包
-                if current_time - last_heartbeat >= self.heartbeat_interval:
-                    heartbeat = StreamResponse(
-                        event=StreamEventType.HEARTBEAT,
-                        id=self.session_id,
-                        object=StreamEventType.HEARTBEAT.value,
-                    )
-                    yield f"event: {heartbeat.event.value}\n"
-                    yield f"data: {json.dumps(heartbeat.to_dict(), ensure_ascii=False)}\n\n"
-                    last_heartbeat = current_time
-                    logger.debug(f"Heartbeat sent for session {self.session_id}")
-
-                # 短暂等待避免忙等待
-                time.sleep(0.1)
-
-    def _collect_main_items(self, items_list):
-        """在独立线程中收集主生成器的项目"""
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=self.heartbeat_interval)
+                except queue.Empty:
+                    yield from self._heartbeat()
+                    continue
+
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+        finally:
+            # 正常结束时主线程已退出；客户端断开时通知主线程关闭主生成器
+            cancelled.set()
+
+    def _heartbeat(self) -> Generator[str, None, None]:
+        heartbeat = StreamResponse(
+            event=StreamEventType.HEARTBEAT,
+            id=self.session_id,
+            object=StreamEventType.HEARTBEAT.value,
+        )
+        yield f"event: {heartbeat.event.value}\n"
+        yield f"data: {json.dumps(heartbeat.to_dict(), ensure_ascii=False)}\n\n"
+        logger.debug(f"Heartbeat sent for session {self.session_id}")
+
+    def _collect_main_items(self, items: queue.Queue, cancelled: threading.Event):
+        """在独立线程中执行主生成器，产出项写入有界队列"""
         try:
             for item in self.main_generator:
-                items_list.append(item)
+                if not self._put(items, item, cancelled):
+                    logger.info(f"Stream cancelled for session {self.session_id}")
+                    # 在生成器所在线程关闭，上游在下一个yield处收到GeneratorExit并停止
+                    self.main_generator.close()
+                    return
         except Exception as e:
             logger.error(f"Error in main generator: {e}")
+            self._put(items, _StreamError(e), cancelled)
+            return
+        self._put(items, _STREAM_END, cancelled)
+
+    @staticmethod
+    def _put(items: queue.Queue, item, cancelled: threading.Event) -> bool:
+        """队列满时等待消费端，消费端已断开则放弃写入"""
+        while not cancelled.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
 
 
 class PlanAndSolveStreamRunner(RagRunner):
@@ -237,6 +274,8 @@ class PlanAndSolveStreamRunner(RagRunner):
             OpenapiContext.ak = ak
             UserContext.user_id = user
             DeepRagContext.clear_context()
+            # 会话内各步骤检索共享query向量，线程结束后随上下文释放
+            QueryEmbeddingMemo.begin()
             for stream_response in self.run_stream(query=query, file_ids=file_ids, model=model,
                                                    metadata_filters=metadata_filters,
                                                    retrieve_mode=retrieve_mode, plugins=plugins, **kwargs):
@@ -262,6 +301,7 @@ class PlanAndSolveStreamRunner(RagRunner):
             DeepRagContext.memory = Memory(conclusion_memory=[], plan_memory=[])
             DeepRagContext.query = query
             DeepRagContext.file_ids = file_ids
+            DeepRagContext.searched_files = SearchedFiles()
 
             # 工具参数加载到上下文
             file_search_params = {
@@ -317,37 +357,10 @@ class PlanAndSolveStreamRunner(RagRunner):
             traceback.print_exc()
             yield self._emit_error("internal_error", "server_error", str(e))
 
-    def _stream_step_execution(self, step_order: int, tool_calls: List[Dict[str, Any]]) -> Generator[
-        StreamResponse, None, str]:
-        """流式执行步骤"""
-        actions = self._convert_tool_calls_to_actions(tool_calls)
-
-        # 发送步骤开始事件
-        yield self._emit_plan_step_start(step_order, actions)
-
-        # 执行工具调用
-        past_steps = []
-        for tool_call in tool_calls:
-            tool_name = tool_call.get("name", "")
-            input_params = tool_call.get("params", {})
-
-            if tool_name in self.act_tool_mapping:
-                logger.info("工具执行开始：" + tool_name + str(input_params))
-                tool_result = self.act_tool_mapping[tool_name].call(*input_params.values()).raw_output
-                logger.info(f"工具执行结果：{tool_result}")
-
-                past_steps.append(
-                    f"""当前步骤结果：\n- 工具：{tool_name}\n- 输入：{str(input_params)}\n- 输出：{tool_result}""")
-            else:
-                past_steps.append(f"工具不存在：{tool_name}")
-
-        step_result = json.dumps(past_steps, ensure_ascii=False)
-
-        # 发送步骤完成事件
-        yield self._emit_plan_step_complete(step_order, actions, step_result)
-
-        # 返回步骤执行结果
-        return step_result
+    def _execute_step(self, tool_calls: List[Dict[str, Any]]) -> str:
+        """执行步骤内的工具调用，互不依赖的工具调用并发执行"""
+        past_steps = execute_tool_calls(tool_calls, self.act_tool_mapping)
+        return json.dumps(past_steps, ensure_ascii=False)
 
     def _execute_plan_stream(self, p: Plan, question: str):
         """流式执行计划"""
@@ -384,21 +397,16 @@ class PlanAndSolveStreamRunner(RagRunner):
         step_orders = set()
         step_results = []
 
-        # 执行任务
-        for data in parsed_data:
+        # 按依赖关系并发执行任务，步骤开始、完成事件按实际执行顺序发送
+        dependencies = {step.order: step._dependencies for step in p.get_all_steps()}
+        for event, data, step_result in run_steps(parsed_data, dependencies,
+                                                  lambda d: self._execute_step(d["tool_calls"])):
             task_order = data["task_order"]
-            tool_calls = data["tool_calls"]
-
-            # 流式执行步骤 - 处理生成器的返回值
-            step_generator = self._stream_step_execution(task_order, tool_calls)
-            step_result = None
-            try:
-                while True:
-                    event = next(step_generator)
-                    yield event
-            except StopIteration as e:
-                # 获取生成器的返回值
-                step_result = e.value
+            actions = self._convert_tool_calls_to_actions(data["tool_calls"])
+            if event == STEP_START:
+                yield self._emit_plan_step_start(task_order, actions)
+                continue
+            yield self._emit_plan_step_complete(task_order, actions, step_result)
 
             # 更新计划
             for step in p.get_all_steps():
@@ -409,7 +417,7 @@ class PlanAndSolveStreamRunner(RagRunner):
                     # 添加依赖的序号
                     for i in step._dependencies:
                         step_orders.add(i)
-                    step_results.append(f'任务{task_order}执行结果：{step.step_result}')
+                    step_results.append((task_order, f'任务{task_order}执行结果：{step.step_result}'))
 
         # 每次execute执行的结果及其依赖的结果，添加到结果里
         for step in p.get_all_steps():
@@ -417,6 +425,8 @@ class PlanAndSolveStreamRunner(RagRunner):
                 logger.info(f'添加任务step结果，任务序号：{step.order}')
                 task_steps.append(f'任务序号：{step.order}\n 任务执行情况：{step.step_result}\n')
 
+        # 完成事件按到达顺序发送，汇总结果按计划顺序排列
+        step_results = [r for _, r in sorted(step_results, key=lambda r: r[0])]
         plan_sum_prompt = memory_combine_prompt.replace('$question', question).replace('$step_result',
                                                                                        str(step_results)).replace(
             '$plan',
@@ -462,7 +472,11 @@ class PlanAndSolveStreamRunner(RagRunner):
         }
         DeepRagContext.file_search_params = file_search_params
 
-        # 执行pipline
-        answer = run_deep_rag(query, file_ids=file_ids, user=UserContext.user_id, model=model)
+        # 执行pipline，会话内各步骤检索共享query向量
+        memo_token = QueryEmbeddingMemo.begin()
+        try:
+            answer = run_deep_rag(query, file_ids=file_ids, user=UserContext.user_id, model=model)
+        finally:
+            QueryEmbeddingMemo.end(memo_token)
         message = self.event_handler.convert_query_res_to_rag_response(answer, [], [])
         return MessageWithPlan(content=message.content, plan=DeepRagContext.plan).to_dict()
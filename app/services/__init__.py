@@ -1,7 +1,11 @@
+import redis
+
 from app.schema.index import ChunkVectorIndex, QuestionVectorIndex
 from app.schema.index import EsIndex
-from init.settings import OPENAPI, VECTOR_DB_COMMON
+from common.tool.redis_tool import redis_pool
+from init.settings import OPENAPI, VECTOR_DB_COMMON, EMBEDDING_CACHE, RETRIEVAL, ANSWER_CACHE
 from bella_rag.llm.openapi import OpenAPIEmbedding
+from bella_rag.utils.cache_util import QueryEmbeddingCache, FileVersions, RetrievalResultCache
 
 ak = OPENAPI["AK"]
 EXTRA_DOC_TYPE_KEY = 'doc_type'
@@ -11,9 +15,33 @@ es_index_structure = EsIndex()
 
 question_vector_index_structure = QuestionVectorIndex()
 
+# query向量缓存，开启redis后多个worker间共享
+query_embedding_cache = QueryEmbeddingCache(
+    capacity=EMBEDDING_CACHE['CAPACITY'],
+    redis_client=redis.Redis(connection_pool=redis_pool) if EMBEDDING_CACHE['REDIS_ENABLE'] else None,
+    ttl=EMBEDDING_CACHE['REDIS_TTL'],
+) if EMBEDDING_CACHE['ENABLE'] else None
+
+# 文件版本号，文件内容变更时自增，用于失效检索结果及答案缓存
+# 过期时间需大于各缓存的过期时间，避免版本号过期归零后命中旧缓存；未开启相关缓存时不记录版本号
+file_versions = FileVersions(
+    redis_client=redis.Redis(connection_pool=redis_pool)
+    if RETRIEVAL['CACHE_ENABLE'] or ANSWER_CACHE['ENABLE'] else None,
+    ttl=2 * max(RETRIEVAL['CACHE_TTL'], ANSWER_CACHE['TTL']),
+)
+
+# 检索结果缓存，开启redis后多个worker间共享
+retrieval_cache = RetrievalResultCache(
+    capacity=RETRIEVAL['CACHE_CAPACITY'],
+    ttl=RETRIEVAL['CACHE_TTL'],
+    redis_client=redis.Redis(connection_pool=redis_pool) if RETRIEVAL['CACHE_REDIS_ENABLE'] else None,
+) if RETRIEVAL['CACHE_ENABLE'] else None
+
 embed_model = OpenAPIEmbedding(
     model=VECTOR_DB_COMMON.get("EMBEDDING_MODEL"),
     embedding_batch_size=VECTOR_DB_COMMON["EMBEDDING_BATCH_SIZE"],
     api_key=ak,
-    model_dimension=int(VECTOR_DB_COMMON["DIMENSION"])
+    model_dimension=int(VECTOR_DB_COMMON["DIMENSION"]),
+    query_cache=query_embedding_cache,
+    embedding_concurrency=VECTOR_DB_COMMON["EMBEDDING_CONCURRENCY"],
 )
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Set, Dict, NamedTuple, Optional
 
 from django.db import transaction
 
@@ -49,8 +49,8 @@ class ChunkContentAttachedService:
         return ChunkContentAttachedMapper.delete_by_chunk_ids(chunk_ids=chunk_ids)
 
     @staticmethod
-    def chunk_pos_increment(source_id: str, index: int):
-        ChunkContentAttachedMapper.chunk_pos_increment(source_id=source_id, index=index)
+    def chunk_pos_increment(source_id: str, index: int, step: int = 1):
+        ChunkContentAttachedMapper.chunk_pos_increment(source_id=source_id, index=index, step=step)
 
     @staticmethod
     def chunk_pos_decrement(source_id: str, index: int):
@@ -98,6 +98,20 @@ class ChunkContentAttachedService:
 
         return all_chunks
 
+    @staticmethod
+    def diff_source_chunks(source_id: str, chunks: List[ChunkContentAttached]) -> "ChunkDiff":
+        """比对文件新解析的切片与已有切片"""
+        return diff_chunks(ChunkContentAttachedService.get_all_chunks_by_source_id(source_id), chunks)
+
+    @staticmethod
+    @transaction.atomic
+    def replace_chunks(delete_chunk_ids: List[str], chunk_content_attached_list: List[ChunkContentAttached],
+                       connection=None):
+        """删除旧切片行并写入新切片行，chunk_id无唯一索引，覆盖写需先删除"""
+        if delete_chunk_ids:
+            ChunkContentAttachedService.delete_by_chunk_ids(delete_chunk_ids)
+        ChunkContentAttachedService.batch_save(chunk_content_attached_list, connection=connection)
+
     @staticmethod
     def find_structure_node(source_id: str, limit: int, offset: int) -> List[ChunkContentAttached]:
         return ChunkContentAttachedMapper.search_structure_nodes(source_id, limit, offset)
@@ -128,3 +142,58 @@ class ChunkContentAttachedService:
     @staticmethod
     def update_source_context_id(source_id: str, context_id: str):
         ChunkContentAttachedMapper.update_source_context_id(source_id, context_id)
+
+
+class ChunkDiff(NamedTuple):
+    # 需要重写的数据库行（按chunk_id比对，含仅位置、token变化的切片）
+    rewrite_chunks: List[ChunkContentAttached]
+    # 需要写入向量存储的chunk_id
+    write_ids: Set[str]
+    # 内容与旧切片相同、可复用旧向量的切片：新chunk_id -> 旧chunk_id
+    reuse_ids: Dict[str, str]
+    # 已移除的chunk_id
+    removed_ids: List[str]
+
+
+def diff_chunks(existing_chunks: List[ChunkContentAttached], chunks: List[ChunkContentAttached]) -> ChunkDiff:
+    """
+    chunk_id按位置编号，插入一个切片会使其后所有切片的id变化，因此按内容指纹（内容及层级路径，不含节点关系）匹配新旧切片：
+    匹配到的切片复用旧向量，不再重新embedding；数据库行仍按chunk_id比对，只重写位置等字段发生变化的行
+    切片增删、移动或层级变化时节点关系随之变化，全部切片重写向量存储（复用向量）；否则只写入内容变化的切片
+    """
+    existing = {chunk.chunk_id: chunk for chunk in existing_chunks}
+    by_content = {}
+    for chunk in existing_chunks:
+        if chunk.content_hash:
+            by_content.setdefault(chunk.content_hash, []).append(chunk)
+
+    rewrite_chunks = []
+    reuse_ids = {}
+    content_changed_ids = set()
+    structure_changed = False
+    for chunk in chunks:
+        old = existing.get(chunk.chunk_id)
+        if old is None or old.order_num != chunk.order_num:
+            structure_changed = True
+        if not _same_content(old, chunk) or (old.chunk_pos, old.token, old.order_num) != (chunk.chunk_pos, chunk.token,
+                                                                                          chunk.order_num):
+            rewrite_chunks.append(chunk)
+
+        # 优先匹配同位置的旧切片
+        matched = old if _same_content(old, chunk) else next(
+            (c for c in by_content.get(chunk.content_hash, []) if _same_content(c, chunk)), None)
+        if matched is None:
+            content_changed_ids.add(chunk.chunk_id)
+        else:
+            reuse_ids[chunk.chunk_id] = matched.chunk_id
+
+    new_ids = {chunk.chunk_id for chunk in chunks}
+    removed_ids = [chunk_id for chunk_id in existing if chunk_id not in new_ids]
+    write_ids = new_ids if structure_changed or removed_ids else content_changed_ids
+    return ChunkDiff(rewrite_chunks, write_ids, {k: v for k, v in reuse_ids.items() if k in write_ids}, removed_ids)
+
+
+def _same_content(old: Optional[ChunkContentAttached], chunk: ChunkContentAttached) -> bool:
+    # 旧数据没有指纹，或内容被单独编辑过，均视为不同
+    return old is not None and bool(old.content_hash) and old.content_hash == chunk.content_hash \
+        and old.content_title == chunk.content_title and old.content_data == chunk.content_data
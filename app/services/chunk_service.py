@@ -3,7 +3,7 @@ from typing import List
 from django.db import transaction
 from llama_index.core.indices.utils import embed_nodes
 
-from app.services import chunk_vector_index_structure, embed_model
+from app.services import chunk_vector_index_structure, embed_model, file_versions
 from app.services.chunk_content_attached_service import ChunkContentAttachedService
 from app.services.index_extend.db_transformation import set_node_content
 from app.strategy import es_store
@@ -46,6 +46,7 @@ def add_chunk(source_id: str, source_name: str, content_title: str, content_data
         logger.info("add_chunk success chunk_id = %s [step=插入向量库]", node_id)
         es_store.add([node])
         logger.info("add_chunk success chunk_id = %s [step=插入es索引]", node_id)
+        file_versions.bump(source_id)
         return node_id
     except Exception as e:
         logger.error("add_chunk failed: %s", str(e))
@@ -82,6 +83,7 @@ def delete_chunk(chunk_id: str):
 
     # 删除缓存数据
     node_cache.remove(file_id=chunk.source_id)
+    file_versions.bump(chunk.source_id)
     logger.info("delete_chunk cache success file_id = %s [step=清理缓存]", chunk.source_id)
 
     # 更新token量
@@ -122,6 +124,7 @@ def update_chunk(chunk_id: str, content_title: str, content_data: str, extra: di
         # 更新token量
         token_diff = count_tokens(content_data) - count_tokens(extend.content_data)
         ChunkContentAttachedService.update_chunks_token(extend.source_id, extend.order_num, token_diff)
+        file_versions.bump(extend.source_id)
     except Exception as e:
         logger.error("update_chunk failed: %s", str(e))
         # 手动回滚向量库数据
@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, NamedTuple
 
 import redis
 from django.db import transaction
 
-from app.services import EXTRA_DOC_TYPE_KEY
+from app.services import EXTRA_DOC_TYPE_KEY, file_versions
 from app.services.chunk_content_attached_service import ChunkContentAttachedService
 from app.strategy import es_store
 from app.utils.convert import _extra_data_from_dict_to_list, convert_chunk_content_attached
@@ -17,33 +17,56 @@ redis_key_prefix = "file_context_summary_success_"
 redis_client = redis.Redis(connection_pool=redis_pool)
 
 
-@transaction.atomic
+class ContextChunk(NamedTuple):
+    context_text: str
+    context_id: str
+    sub_ids: List[str]
+    extra: dict
+    embedding: List[float]
+    token: int = -911
+
+
 def save_context_chunk(source_id: str, source_name: str, context_text: str, context_id: str,
                        sub_ids: List[str], extra: dict, embedding: List[float], token: int = -911):
-    # todo 耗时可以优化
-    user_logger.info(f'start save context chunk. source_id: {source_id}, source_name: {source_name}, '
-                     f'context_text: {context_text}, context_id: {context_id}, extra: {extra}, token:{token}')
-    extra['context_id'] = context_id
-    # extra添加节点补充类型字段标识区分context节点
-    extra[EXTRA_DOC_TYPE_KEY] = 'contextual'
-    meta = {"source_id": source_id, "source_name": source_name, "node_type": NodeTypeEnum.TEXT.node_type_code,
-            "context_id": context_id, "extra": _extra_data_from_dict_to_list(extra)}
+    save_context_chunks(source_id, source_name,
+                        [ContextChunk(context_text, context_id, sub_ids, extra, embedding, token)])
+
+
+@transaction.atomic
+def save_context_chunks(source_id: str, source_name: str, chunks: List[ContextChunk]):
+    """
+    批量保存context节点，数据库、向量库、es各写入一次
+    节点位置与逐个保存一致：每个context节点依次插入到文件最前面
+    """
+    if not chunks:
+        return
+    user_logger.info(f'start save context chunks. source_id: {source_id}, source_name: {source_name}, '
+                     f'context_ids: {[chunk.context_id for chunk in chunks]}')
     id_pos = ChunkContentAttachedService.find_max_id_pos(source_id) + 1
-    node_id = source_id + '-' + str(id_pos)
-    node = TextNode(id_=node_id, text=context_text, metadata=meta)
-    node.embedding = embedding
-    node.token = token
-    ChunkContentAttachedService.chunk_pos_increment(source_id, 0)
-    ChunkContentAttachedService.save(convert_chunk_content_attached(0, node))
-    user_logger.info("save_context_chunk success chunk_id = %s [step=插入数据库]", node_id)
-
-    # 更新mysql数据库chunk表context_id
-    ChunkContentAttachedService.update_chunks_context_id(sub_ids, context_id)
-    user_logger.info("save_context_chunk success chunk_id = %s [step=更新chunk上下文id]", node_id)
-    vector_store.add([node])
-    user_logger.info("save_context_chunk success chunk_id = %s [step=插入向量库]", node_id)
-    es_store.add([node])
-    user_logger.info("save_context_chunk success chunk_id = %s [step=插入es索引]", node_id)
+    ChunkContentAttachedService.chunk_pos_increment(source_id, 0, len(chunks))
+
+    nodes = []
+    for i, chunk in enumerate(chunks):
+        extra = chunk.extra
+        extra['context_id'] = chunk.context_id
+        # extra添加节点补充类型字段标识区分context节点
+        extra[EXTRA_DOC_TYPE_KEY] = 'contextual'
+        meta = {"source_id": source_id, "source_name": source_name, "node_type": NodeTypeEnum.TEXT.node_type_code,
+                "context_id": chunk.context_id, "extra": _extra_data_from_dict_to_list(extra)}
+        node = TextNode(id_=source_id + '-' + str(id_pos + i), text=chunk.context_text, metadata=meta)
+        node.embedding = chunk.embedding
+        node.token = chunk.token
+        ChunkContentAttachedService.save(convert_chunk_content_attached(len(chunks) - 1 - i, node))
+        # 更新mysql数据库chunk表context_id
+        ChunkContentAttachedService.update_chunks_context_id(chunk.sub_ids, chunk.context_id)
+        nodes.append(node)
+    user_logger.info(f"save_context_chunks success source_id = {source_id}, size = {len(nodes)} [step=插入数据库]")
+
+    vector_store.add(nodes)
+    user_logger.info(f"save_context_chunks success source_id = {source_id}, size = {len(nodes)} [step=插入向量库]")
+    es_store.add(nodes)
+    user_logger.info(f"save_context_chunks success source_id = {source_id}, size = {len(nodes)} [step=插入es索引]")
+    file_versions.bump(source_id)
 
 
 @transaction.atomic
@@ -72,5 +95,6 @@ def clear_context_nodes(source_id: str):
     # 清空节点关联context id
     ChunkContentAttachedService.update_source_context_id(source_id, '')
     user_logger.info(f'finish clear context chunks. source_id: {source_id}')
+    file_versions.bump(source_id)
     # 删除redis记录
     redis_client.delete(redis_key_prefix + source_id)
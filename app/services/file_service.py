@@ -1,11 +1,14 @@
 import json
+from concurrent.futures import Future
 from io import IOBase
 from threading import Thread
-from typing import List, Optional
+from typing import List, Optional, Union
 
 import redis
 from llama_index.core import StorageContext, Document
+from django.db import connections
 from llama_index.core.graph_stores import SimpleGraphStore
+from llama_index.core.ingestion import IngestionPipeline
 from llama_index.core.storage.docstore import SimpleDocumentStore
 from llama_index.core.storage.index_store import SimpleIndexStore
 from llama_index.core.vector_stores import VectorStoreQuery
@@ -13,19 +16,20 @@ from llama_index.core.vector_stores.simple import DEFAULT_VECTOR_STORE
 
 from app.common.contexts import UserContext, TraceContext
 from app.handler.custom_error_handler import custom_exception_handler
-from app.services import chunk_vector_index_structure, embed_model, question_vector_index_structure
-from app.services.context_service import vector_store
+from app.services import chunk_vector_index_structure, embed_model, question_vector_index_structure, file_versions
+from app.services.chunk_content_attached_service import ChunkContentAttachedService
+from app.services.context_service import vector_store, clear_context_nodes
 from app.services.index_extend.db_transformation import ChunkContentAttachedIndexExtend, \
     QuestionAnswerAttachedIndexExtend
 from app.services.knowledge_file_meta_service import KnowledgeMetaService
 from app.services.qa_service import questions_vector_store
 from app.utils.convert import _extra_data_from_dict_to_list, logger
-from app.utils.convert import trans_metadata_to_extra
+from app.utils.convert import trans_metadata_to_extra, convert_chunk_content_attached_list
 from app.workers.producers.producers import knowledge_file_delete_producer, async_send_kafka_message
 from common.helper.exception import UnsupportedTypeError, FileCheckException
 from common.tool.redis_tool import redis_pool
 from common.tool.vector_db_tool import summary_question_vector_store
-from init.settings import user_logger
+from init.settings import user_logger, FILE_INDEX
 from bella_rag.callbacks.manager import init_callbacks
 from bella_rag.meta.meta_data import NodeTypeEnum
 from bella_rag.transformations.domtree import domtree_parser
@@ -34,6 +38,7 @@ from bella_rag.transformations.extractor.extractors import EXTRACTOR_CONTEXT
 from bella_rag.transformations.factory import TransformationFactory
 from bella_rag.utils.file_api_tool import file_api_client
 from bella_rag.utils.file_util import get_file_type, is_qa_knowledge
+from bella_rag.utils.schema_util import node_cache
 from bella_rag.utils.trace_log_util import trace
 from bella_rag.vector_stores.factory import has_index, get_index
 from bella_rag.vector_stores.types import MetadataFilter
@@ -45,7 +50,7 @@ deleted_files_key = "rag:deleted_file_ids"
 
 
 def run_index_file(file_id: str, file_name: str, documents: list, transforms: list,
-                   metadata: Optional[dict], callbacks: List[str], user: str):
+                   metadata: Optional[dict], callbacks: List[str], user: str, incremental: bool = False):
     """索引建立"""
     UserContext.user_id = user
     init_callbacks(callbacks)
@@ -58,28 +63,36 @@ def run_index_file(file_id: str, file_name: str, documents: list, transforms: li
         es_index = get_index("es_index")
         vector_stores['elasticsearch'] = es_index.vector_store
 
-    # 区分 QA 与知识文件
+    document_metadata = get_document_metadata(file_id=file_id, file_name=file_name, metadata=metadata)
+    # 区分 QA 与知识文件，QA文件的索引id由问答表生成，不支持增量
     if is_qa_knowledge(file_name):
         vector_stores[DEFAULT_VECTOR_STORE] = questions_vector_store
         transforms.append(QuestionAnswerAttachedIndexExtend())
+        incremental = False
     else:
         vector_stores[DEFAULT_VECTOR_STORE] = vector_store
-        transforms.append(ChunkContentAttachedIndexExtend())
+        if not incremental:
+            transforms.append(ChunkContentAttachedIndexExtend())
 
-    storage_context = StorageContext(
-        docstore=SimpleDocumentStore(),
-        index_store=SimpleIndexStore(),
-        vector_stores=vector_stores,
-        graph_store=SimpleGraphStore(),
-    )
+    if incremental:
+        run_incremental_index(file_id, documents, transforms, vector_stores, document_metadata)
+    else:
+        storage_context = StorageContext(
+            docstore=SimpleDocumentStore(),
+            index_store=SimpleIndexStore(),
+            vector_stores=vector_stores,
+            graph_store=SimpleGraphStore(),
+        )
 
-    ManyVectorStoreIndex.from_documents(
-        documents,
-        storage_context=storage_context,
-        transformations=transforms,
-        embed_model=embed_model,
-        metadata=get_document_metadata(file_id=file_id, file_name=file_name, metadata=metadata),
-    )
+        ManyVectorStoreIndex.from_documents(
+            documents,
+            storage_context=storage_context,
+            transformations=transforms,
+            embed_model=embed_model,
+            metadata=document_metadata,
+        )
+    # 文件内容变更，相关检索结果缓存失效
+    file_versions.bump(file_id)
 
     # 发送文件处理完成的消息
     from app.workers import knowledge_file_extractor_producer
@@ -92,22 +105,70 @@ def run_index_file(file_id: str, file_name: str, documents: list, transforms: li
         "ak_code": UserContext.usage_ak_code,
         "ak_sha": UserContext.usage_ak_sha,
     }
-    async_send_kafka_message(knowledge_file_extractor_producer, json.dumps(knowledge_file_index_done_msg))
+    async_send_kafka_message(knowledge_file_extractor_producer, json.dumps(knowledge_file_index_done_msg), wait=False)
     user_logger.info(f'finish indexing file : {file_id}')
 
 
+def run_incremental_index(file_id: str, documents: list, transforms: list, vector_stores: dict,
+                          document_metadata: dict):
+    """
+    增量索引：按切片内容指纹比对新旧解析结果，只对内容新增、变更的切片做embedding
+    内容未变但位置移动的切片复用旧向量写入新id，删除已移除的切片
+    """
+    # context节点的id与切片位置id共用编号，先清理，索引完成后由extractor重新生成
+    clear_context_nodes(file_id)
+
+    nodes = IngestionPipeline(transformations=transforms).run(documents=documents, metadata=document_metadata)
+    chunks = convert_chunk_content_attached_list(nodes)
+    diff = ChunkContentAttachedService.diff_source_chunks(file_id, chunks)
+    chunk_ids = {chunk.chunk_id for chunk in chunks}
+    write_nodes = [node for node in nodes if node.node_id not in chunk_ids or node.node_id in diff.write_ids]
+
+    # 先读取复用的旧向量，再写入（新id可能覆盖旧向量所在的点）
+    old_embeddings = vector_stores[DEFAULT_VECTOR_STORE].get_embeddings(sorted(set(diff.reuse_ids.values())))
+    for node in write_nodes:
+        old_id = diff.reuse_ids.get(node.node_id)
+        if old_id in old_embeddings:
+            node.embedding = old_embeddings[old_id]
+    user_logger.info(f'incremental indexing file : {file_id}, nodes : {len(nodes)}, write : {len(write_nodes)}, '
+                     f'reuse embeddings : {sum(node.embedding is not None for node in write_nodes)}, '
+                     f'rewrite chunks : {len(diff.rewrite_chunks)}, removed : {len(diff.removed_ids)}')
+
+    conn = connections['default']
+    try:
+        ChunkContentAttachedService.replace_chunks(
+            delete_chunk_ids=[chunk.chunk_id for chunk in diff.rewrite_chunks] + diff.removed_ids,
+            chunk_content_attached_list=diff.rewrite_chunks, connection=conn)
+    finally:
+        conn.close()
+
+    # 同id写入即覆盖，只需删除已移除的切片；已带向量的节点不再embedding
+    ManyVectorStoreIndex.add_nodes(nodes=write_nodes, vector_stores=list(vector_stores.values()),
+                                   embed_model=embed_model)
+    if diff.removed_ids:
+        vector_stores[DEFAULT_VECTOR_STORE].delete_documents(diff.removed_ids)
+        if 'elasticsearch' in vector_stores:
+            vector_stores['elasticsearch'].delete_nodes(node_ids=diff.removed_ids)
+
+    node_cache.remove(file_id=file_id)
+
+
 '''
 注意：这个函数不可重入，index中的node id和位置有关系，一旦文件或parser算法发生改变，都需要重建index & index-extend
+开启增量模式（incremental）时按切片指纹比对，仅重建变化的切片
 '''
 
 
 @custom_exception_handler()
 @trace(step='multi_index_construction', progress="file_indexing")
 def file_indexing(file_id: str, file_name: str, metadata: Optional[dict] = None,
-                  callbacks: List[str] = None, user: str = None, custom_parsers: Optional[dict] = None):
+                  callbacks: List[str] = None, user: str = None, custom_parsers: Optional[dict] = None,
+                  incremental: Optional[bool] = None):
     """
     结合fileapi，支持效果更优的domtree解析
     """
+    if incremental is None:
+        incremental = FILE_INDEX['INCREMENTAL']
     file_type = get_file_type(file_name)
 
     # 文件大小校验
@@ -126,7 +187,7 @@ def file_indexing(file_id: str, file_name: str, metadata: Optional[dict] = None,
         transforms.append(TransformationFactory.get_parser(file_type, custom_parsers))
         documents = reader.load_file(file_id=file_id)
 
-    run_index_file(file_id, file_name, documents, transforms, metadata, callbacks, user)
+    run_index_file(file_id, file_name, documents, transforms, metadata, callbacks, user, incremental)
 
 
 @trace(step='multi_index_construction', progress="file_stream_indexing")
@@ -147,12 +208,13 @@ def file_stream_indexing(file_id: str, file_name: str, file_stream: IOBase, meta
     run_index_file(file_id, file_name, documents, transforms, metadata, callbacks, user)
 
 
-def async_file_indexing(file_id: str, file_name: str, metadata: dict, callbacks: List[str] = None, user: str = None):
+def async_file_indexing(file_id: str, file_name: str, metadata: dict, callbacks: List[str] = None, user: str = None,
+                        incremental: Optional[bool] = None):
     if not file_name:
         return
     thread = Thread(
         target=lambda: file_indexing(file_id=file_id, file_name=file_name, metadata=metadata,
-                                     callbacks=callbacks, user=user))
+                                     callbacks=callbacks, user=user, incremental=incremental))
     thread.start()
 
 
@@ -165,6 +227,7 @@ def file_update(source_id: str, extra: dict):
     node_types = [NodeTypeEnum.TEXT.node_type_code]
     update_extra(source_id, node_types, extra_list)
     logger.info("batch_update_chunk success source_id = %s [step=更新向量库]", source_id)
+    file_versions.bump(source_id)
 
 
 def update_extra(
@@ -244,14 +307,15 @@ def filter_deleted_files(file_ids: List[str]) -> List[str]:
     return [file_id for file_id, exists in zip(file_ids, results) if not exists]
 
 
-def file_delete_submit_task(file_id: str) -> bool:
+def file_delete_submit_task(file_id: str, wait: bool = True) -> Union[bool, Future]:
     # 发送文件处理完成的消息
     knowledge_file_delete_msg = {
         "file_id": file_id,
     }
     # 记录文件的删除状态
     record_deleted_file(file_id)
-    return async_send_kafka_message(knowledge_file_delete_producer, json.dumps(knowledge_file_delete_msg))
+    file_versions.bump(file_id)
+    return async_send_kafka_message(knowledge_file_delete_producer, json.dumps(knowledge_file_delete_msg), wait=wait)
 
 
 def rename_file(file_id: str, file_name: str):
@@ -272,6 +336,7 @@ def rename_file(file_id: str, file_name: str):
             field_value=file_name
         )
         user_logger.info(f'rename file completed: {file_id} to {file_name}')
+        file_versions.bump(file_id)
     except Exception as e:
         user_logger.error(f'Failed to rename file: {file_id}, error: {e}')
         raise
@@ -89,7 +89,8 @@ class ChunkContentAttachedIndexExtend(IndexExtendTransformComponent):
                 continue
             set_node_content(node, chunk.content_title, chunk.content_data)
             node.pos = chunk.chunk_pos
-            node.context_id = chunk.context_id
+            if not is_contextual_node(node):
+                node.context_id = chunk.context_id
             if chunk.order_num:
                 node.order_num_str = chunk.order_num
 
@@ -1,8 +1,12 @@
+import functools
 import random
 import string
 import time
 import uuid
-from typing import List
+from hashlib import sha1
+from typing import List, Optional, Tuple
+
+import redis
 
 from llama_index.core import QueryBundle, Response
 from llama_index.core.base.llms.types import ChatResponse
@@ -13,28 +17,51 @@ from openai import APIError
 from openai._types import Headers
 
 from app import openapi_trace_handler as trace_handler
-from app.common.contexts import query_embedding_context, UserContext, TraceContext
+from app.common.contexts import query_embedding_context, UserContext, TraceContext, QueryEmbeddingMemo
 from app.controllers import default_event_handler
 from app.plugin.factory import build_postprocessor_from_retrieve_param, \
     get_components_from_plugins
 from app.plugin.plugins import Plugin
 from app.prompts.rag import get_rag_template
-from app.services import file_service
-from app.strategy.retrieval import RetrievalMode, create_retriever_by_mode
-from init.settings import OPENAPI, user_logger, RETRIEVAL
+from app.services import file_service, file_versions, retrieval_cache, embed_model
+from app.strategy.retrieval import RetrievalMode, create_retriever_by_mode, get_builtin_filters
+from common.tool.redis_tool import redis_pool
+from init.settings import OPENAPI, user_logger, RETRIEVAL, ANSWER_CACHE
 from bella_rag import callback_manager
 from bella_rag.handler.streaming_handler import BaseEventHandler, RAGStreamingHandler
 from bella_rag.llm.openapi import OpenAPI
 from bella_rag.llm.types import Sensitive
 from bella_rag.preprocessor.ProcessorGenerators import StandardAnswerGenerator
 from bella_rag.response_synthesizers.response_synthesizer_factory import get_llm_response_synthesizer
+from bella_rag.retrievals.retriever import CallableRetriever
 from bella_rag.schema.nodes import NodeWithScore
+from bella_rag.utils.answer_cache import SemanticAnswerCache, CachedAnswer
+from bella_rag.utils.cache_util import QueryEmbeddingCache
+from bella_rag.utils.node_graph import dump_score_nodes, load_score_nodes
 from bella_rag.utils.openapi_util import MOCK_MODEL
+from bella_rag.utils.single_flight import SingleFlight
 from bella_rag.utils.trace_log_util import trace
 from bella_rag.vector_stores.types import MetadataFilters
 
 logger = user_logger
 
+# 相同检索请求合并执行，生成阶段仍按请求独立
+retrieval_flight = SingleFlight(
+    name='retrieval',
+    redis_client=redis.Redis(connection_pool=redis_pool) if RETRIEVAL['SINGLE_FLIGHT_REDIS'] else None,
+    dumps=dump_score_nodes,
+    loads=load_score_nodes,
+    wait_timeout=RETRIEVAL['SINGLE_FLIGHT_TIMEOUT'],
+)
+
+# 语义答案缓存，相似问题直接复用答案
+answer_cache = SemanticAnswerCache(
+    max_distance=ANSWER_CACHE['MAX_DISTANCE'],
+    capacity=ANSWER_CACHE['CAPACITY'],
+    scope_capacity=ANSWER_CACHE['SCOPE_CAPACITY'],
+    ttl=ANSWER_CACHE['TTL'],
+) if ANSWER_CACHE['ENABLE'] else None
+
 
 def rag(query: str,
         top_k: int = 3,
@@ -52,18 +79,34 @@ def rag(query: str,
         show_quote: bool = False,
         event_handler: BaseEventHandler = default_event_handler):
     token = query_embedding_context.set([])
-    file_ids = file_service.filter_deleted_files(file_ids)
-    query_engine = build_rag_engine(query=query, top_k=top_k, file_ids=file_ids, score=score, api_key=api_key,
-                                    model=model, instructions=instructions,
-                                    metadata_filters=metadata_filters,
-                                    top_p=top_p, temperature=temperature, max_tokens=max_tokens, stream=False,
-                                    retrieve_mode=retrieve_mode, plugins=plugins, show_quote=show_quote)
-    res = query_engine.query(query)
-    query_embedding_context.reset(token)
+    memo_token = QueryEmbeddingMemo.begin()
+    try:
+        answer_scope = answer_cache_scope(file_ids, top_k, score, model, instructions, metadata_filters,
+                                          retrieve_mode, plugins, show_quote,
+                                          top_p=top_p, temperature=temperature, max_tokens=max_tokens)
+        # 向量写入请求内备忘，检索阶段直接复用
+        query_embedding = embed_model.get_query_embedding(query) if answer_scope else None
+        cached = _get_cached_answer(answer_scope, query_embedding)
+        if cached is not None:
+            text, source_nodes = cached
+            return event_handler.convert_query_res_to_rag_response(text, source_nodes, []).to_dict()
+
+        query_engine = build_rag_engine(query=query, top_k=top_k, file_ids=file_ids, score=score, api_key=api_key,
+                                        model=model, instructions=instructions,
+                                        metadata_filters=metadata_filters,
+                                        top_p=top_p, temperature=temperature, max_tokens=max_tokens, stream=False,
+                                        retrieve_mode=retrieve_mode, plugins=plugins, show_quote=show_quote)
+        res = query_engine.query(query)
+    finally:
+        QueryEmbeddingMemo.end(memo_token)
+        query_embedding_context.reset(token)
     if isinstance(res, Response):
+        _put_cached_answer(answer_scope, query_embedding, res.response, res.source_nodes)
         return event_handler.convert_query_res_to_rag_response(res.response, res.source_nodes, []).to_dict()
     else:
         text = res.message.content or ""
+        if not res.message.sensitives:
+            _put_cached_answer(answer_scope, query_embedding, text, res.source_nodes)
         return event_handler.convert_query_res_to_rag_response(text, res.source_nodes, res.message.sensitives).to_dict()
 
 
@@ -90,58 +133,85 @@ def rag_streaming(
     trace_locals.pop('api_key', None)
     trace_args = list(trace_locals.values())
     embedding_token = query_embedding_context.set([])
-    start = int(time.time() * 1000)
-
-    file_ids = file_service.filter_deleted_files(file_ids)
-    query_engine = build_rag_engine(query=query, top_k=top_k, file_ids=file_ids, score=score, api_key=api_key,
-                                    model=model, instructions=instructions,
-                                    metadata_filters=metadata_filters,
-                                    top_p=top_p, temperature=temperature, max_tokens=max_tokens, stream=True,
-                                    retrieve_mode=retrieve_mode, plugins=plugins, show_quote=show_quote)
-
-    streaming_response = query_engine.query(query)
-    aid = str(uuid.uuid4()) if not TraceContext.trace_id else TraceContext.trace_id
-    retrieval_send = False
-
-    llm_response = ""
-    user_logger.info(f"rag request id: {TraceContext.trace_id} start receive stream delta")
-    error_request = False
-    for item in streaming_response.response_gen:
-        user_logger.info(f"rag request id: {TraceContext.trace_id} message delta: {item}")
-        if not retrieval_send:
-            retrieval_send = True
+    memo_token = QueryEmbeddingMemo.begin()
+    try:
+        start = int(time.time() * 1000)
+        aid = str(uuid.uuid4()) if not TraceContext.trace_id else TraceContext.trace_id
+
+        answer_scope = answer_cache_scope(file_ids, top_k, score, model, instructions, metadata_filters,
+                                          retrieve_mode, plugins, show_quote,
+                                          top_p=top_p, temperature=temperature, max_tokens=max_tokens)
+        query_embedding = embed_model.get_query_embedding(query) if answer_scope else None
+        cached = _get_cached_answer(answer_scope, query_embedding)
+        if cached is not None:
+            # 命中答案缓存，按正常生成的事件顺序一次性返回
+            text, source_nodes = cached
             yield from streaming_handler.create_retrieval_stream(
-                id=aid,
-                nodes=streaming_response.source_nodes,
-                event_type='retrieval.completed',
-            )
-
-        if isinstance(item, APIError):
-            error_request = True
-            trace_handler.log_trace('rag_streaming', TraceContext.trace_id, int(time.time() * 1000) - start, start, '', item,
-                      trace_args)
-            yield from streaming_handler.create_error_stream(
-                id=aid, event_type='error', error=item,
-            )
-        elif isinstance(item, list) and item and isinstance(item[0], Sensitive):
-            # 敏感词事件透传
-            yield from streaming_handler.create_sensitive_stream(
-                id=aid, sensitives=item, event_type='message.sensitives'
-            )
-        else:
-            llm_response += item
-            yield from streaming_handler.create_msg_stream(
-                id=aid, value=item, event_type='message.delta'
-            )
-    msg_complete_event = streaming_handler.create_msg_stream(id=aid, value=llm_response,
-                                                             nodes=streaming_response.source_nodes,
-                                                             event_type='message.completed')
-    if not error_request:
-        trace_handler.log_trace('rag_streaming', TraceContext.trace_id, int(time.time() * 1000) - start, start,
-                  llm_response, '', trace_args)
-        yield from msg_complete_event
-
-    query_embedding_context.reset(embedding_token)
+                id=aid, nodes=source_nodes, event_type='retrieval.completed')
+            yield from streaming_handler.create_msg_stream(id=aid, value=text, event_type='message.delta')
+            yield from streaming_handler.create_msg_stream(id=aid, value=text, nodes=source_nodes,
+                                                           event_type='message.completed')
+            trace_handler.log_trace('rag_streaming', TraceContext.trace_id, int(time.time() * 1000) - start, start,
+                                    text, '', trace_args)
+            return
+
+        query_engine = build_rag_engine(query=query, top_k=top_k, file_ids=file_ids, score=score, api_key=api_key,
+                                        model=model, instructions=instructions,
+                                        metadata_filters=metadata_filters,
+                                        top_p=top_p, temperature=temperature, max_tokens=max_tokens, stream=True,
+                                        retrieve_mode=retrieve_mode, plugins=plugins, show_quote=show_quote)
+
+        streaming_response = query_engine.query(query)
+        retrieval_send = False
+
+        llm_response = ""
+        user_logger.info(f"rag request id: {TraceContext.trace_id} start receive stream delta")
+        error_request = False
+        sensitive_request = False
+        for item in streaming_response.response_gen:
+            user_logger.info(f"rag request id: {TraceContext.trace_id} message delta: {item}")
+            if not retrieval_send:
+                retrieval_send = True
+                yield from streaming_handler.create_retrieval_stream(
+                    id=aid,
+                    nodes=streaming_response.source_nodes,
+                    event_type='retrieval.completed',
+                )
+
+            if isinstance(item, APIError):
+                error_request = True
+                trace_handler.log_trace('rag_streaming', TraceContext.trace_id, int(time.time() * 1000) - start, start, '', item,
+                          trace_args)
+                yield from streaming_handler.create_error_stream(
+                    id=aid, event_type='error', error=item,
+                )
+            elif isinstance(item, list) and item and isinstance(item[0], Sensitive):
+                # 敏感词事件透传
+                sensitive_request = True
+                yield from streaming_handler.create_sensitive_stream(
+                    id=aid, sensitives=item, event_type='message.sensitives'
+                )
+            else:
+                llm_response += item
+                yield from streaming_handler.create_msg_stream(
+                    id=aid, value=item, event_type='message.delta'
+                )
+        msg_complete_event = streaming_handler.create_msg_stream(id=aid, value=llm_response,
+                                                                 nodes=streaming_response.source_nodes,
+                                                                 event_type='message.completed')
+        if not error_request:
+            trace_handler.log_trace('rag_streaming', TraceContext.trace_id, int(time.time() * 1000) - start, start,
+                      llm_response, '', trace_args)
+            if not sensitive_request:
+                _put_cached_answer(answer_scope, query_embedding, llm_response, streaming_response.source_nodes)
+            yield from msg_complete_event
+    finally:
+        # 客户端断开（GeneratorExit）或异常时同样释放请求内备忘
+        QueryEmbeddingMemo.end(memo_token)
+        try:
+            query_embedding_context.reset(embedding_token)
+        except ValueError:
+            query_embedding_context.set([])
 
 
 def build_rag_engine(
@@ -167,14 +237,10 @@ def build_rag_engine(
     llm = OpenAPI(temperature=temperature, api_base=OPENAPI["URL"], api_key=api_key, timeout=300,
                   system_prompt=instructions, additional_kwargs={"top_p": top_p}, model=model)
 
-    # 构建检索器
-    retriever = create_retriever_by_mode(metadata_filters=metadata_filters, score=score, file_ids=file_ids,
-                                         retrieve_mode=retrieve_mode, plugins=plugins)
-
-    # 根据提供插件构建后置处理器
-    node_postprocessors = get_components_from_plugins(plugins, BaseNodePostprocessor)
-    # 添加默认后置处理器
-    node_postprocessors.extend(build_postprocessor_from_retrieve_param(score, top_k, retrieve_mode))
+    # 检索及后置处理整体作为检索器，相同检索请求合并执行
+    retriever = CallableRetriever(functools.partial(retrieve_nodes, file_ids=file_ids, top_k=top_k, score=score,
+                                                    metadata_filters=metadata_filters,
+                                                    retrieve_mode=retrieve_mode, plugins=plugins))
 
     response_synthesizer = get_llm_response_synthesizer(
         llm=llm,
@@ -194,7 +260,6 @@ def build_rag_engine(
     return RetrieverQueryEngine(
         retriever=retriever,
         response_synthesizer=response_synthesizer,
-        node_postprocessors=node_postprocessors,
     )
 
 
@@ -204,25 +269,152 @@ def retrieval(file_ids: List[str], query: str, top_k: int, score: float, metadat
               plugins: List[Plugin] = None,
               ) -> List[NodeWithScore]:
     user_logger.info(f"retrieval start, query : {query}, file_ids : {file_ids}, top_k : {top_k}")
-    token = query_embedding_context.set([])
-    file_ids = file_service.filter_deleted_files(file_ids)
-    # 构建多路检索器
-    retriever = create_retriever_by_mode(metadata_filters=metadata_filters, score=score, file_ids=file_ids,
-                                         retrieve_mode=retrieve_mode, plugins=plugins)
+    return retrieve_nodes(query, file_ids=file_ids, top_k=top_k, score=score, metadata_filters=metadata_filters,
+                          retrieve_mode=retrieve_mode, plugins=plugins)
+
 
-    # 检索
-    with callback_manager.as_trace("retrieve"):
-        score_nodes = retriever._retrieve(query_bundle=QueryBundle(query_str=query))
+def retrieve_nodes(query: str, file_ids: List[str], top_k: int, score: float, metadata_filters: MetadataFilters,
+                   retrieve_mode: RetrievalMode = RetrievalMode.SEMANTIC,
+                   plugins: List[Plugin] = None) -> List[NodeWithScore]:
+    """
+    检索及后置处理，相同检索请求（query、文件范围、过滤条件、检索模式及插件一致）并发时合并执行
+    开启检索结果缓存时先查缓存，缓存key包含文件版本号，文件变更后自动失效
+    各请求拿到独立的结果列表
+    """
+    key = retrieval_key(query, file_ids, top_k, score, metadata_filters, retrieve_mode, plugins)
+    cache_key = _retrieval_cache_key(key, file_ids)
+    if cache_key:
+        data = retrieval_cache.get(cache_key)
+        score_nodes = load_score_nodes(data) if data is not None else None
+        if score_nodes is not None:
+            return score_nodes
+
+    do_retrieve = functools.partial(_retrieve_nodes, file_ids, query, top_k, score, metadata_filters,
+                                    retrieve_mode, plugins)
+    if RETRIEVAL['SINGLE_FLIGHT']:
+        score_nodes = [score_node.copy() for score_node in retrieval_flight.do(key, do_retrieve)]
+    else:
+        score_nodes = do_retrieve()
+
+    if cache_key:
+        try:
+            retrieval_cache.put(cache_key, dump_score_nodes(score_nodes))
+        except Exception as e:
+            user_logger.warning(f'retrieval cache put failed: {e}')
+    return score_nodes
+
+
+def retrieval_key(query: str, file_ids: List[str], top_k: int, score: float, metadata_filters: MetadataFilters,
+                  retrieve_mode: RetrievalMode, plugins: List[Plugin]) -> str:
+    """检索请求标识：归一化query、文件集合、过滤条件（含内置过滤）、检索模式、插件及检索参数"""
+    parts = [
+        QueryEmbeddingCache.normalize_query(query),
+        sha1(','.join(sorted(set(file_ids or []))).encode('utf-8')).hexdigest(),
+        repr(metadata_filters),
+        repr(get_builtin_filters()),
+        RetrievalMode(retrieve_mode).value,
+        repr(plugins or []),
+        top_k,
+        score,
+    ]
+    return sha1('\n'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _retrieval_cache_key(key: str, file_ids: List[str]):
+    """检索请求标识 + 检索范围内各文件版本号，未开启缓存或版本号查询失败时返回None"""
+    if retrieval_cache is None:
+        return None
+    versions_key = _file_versions_key(file_ids)
+    return f'{key}:{versions_key}' if versions_key else None
+
+
+def answer_cache_scope(file_ids: List[str], top_k: int, score: float, model: str, instructions: str,
+                       metadata_filters: MetadataFilters, retrieve_mode: RetrievalMode, plugins: List[Plugin],
+                       show_quote: bool, top_p: float = 1, temperature: float = 0.01,
+                       max_tokens: Optional[int] = None) -> Optional[str]:
+    """答案缓存作用域：文件范围及版本号、模型、指令、检索参数及生成参数，未开启缓存或版本号查询失败时返回None"""
+    if answer_cache is None or TraceContext.is_mock_request or model == MOCK_MODEL:
+        return None
+    versions_key = _file_versions_key(file_ids)
+    if not versions_key:
+        return None
+    parts = [
+        versions_key,
+        model,
+        instructions,
+        repr(metadata_filters),
+        repr(get_builtin_filters()),
+        RetrievalMode(retrieve_mode).value,
+        repr(plugins or []),
+        top_k,
+        score,
+        show_quote,
+        # 生成参数不同时答案长度、风格可能不同，不共享答案
+        top_p,
+        temperature,
+        max_tokens,
+    ]
+    return sha1('\n'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _file_versions_key(file_ids: List[str]) -> Optional[str]:
+    """检索范围内各文件版本号摘要，文件为空或版本号查询失败时返回None"""
+    if not file_ids:
+        return None
+    file_ids = sorted(set(file_ids))
+    versions = file_versions.get_versions(file_ids)
+    if versions is None:
+        return None
+    version_str = ','.join(f'{file_id}:{version}' for file_id, version in zip(file_ids, versions))
+    return sha1(version_str.encode("utf-8")).hexdigest()
+
+
+def _get_cached_answer(scope: Optional[str], query_embedding: List[float]) \
+        -> Optional[Tuple[str, List[NodeWithScore]]]:
+    if not scope:
+        return None
+    cached = answer_cache.get(scope, query_embedding)
+    source_nodes = load_score_nodes(cached.source_nodes) if cached is not None else None
+    if source_nodes is None:
+        return None
+    return cached.text, source_nodes
+
+
+def _put_cached_answer(scope: Optional[str], query_embedding: List[float], text: str,
+                       source_nodes: List[NodeWithScore]):
+    if not scope or not text:
+        return
+    try:
+        answer_cache.put(scope, query_embedding, CachedAnswer(text, dump_score_nodes(source_nodes)))
+    except Exception as e:
+        user_logger.warning(f'answer cache put failed: {e}')
+
+
+def _retrieve_nodes(file_ids: List[str], query: str, top_k: int, score: float, metadata_filters: MetadataFilters,
+                    retrieve_mode: RetrievalMode, plugins: List[Plugin]) -> List[NodeWithScore]:
+    token = query_embedding_context.set([])
+    # deep rag多次调用时复用会话内的query向量
+    memo_token = QueryEmbeddingMemo.begin()
+    try:
+        file_ids = file_service.filter_deleted_files(file_ids)
+        # 构建多路检索器
+        retriever = create_retriever_by_mode(metadata_filters=metadata_filters, score=score, file_ids=file_ids,
+                                             retrieve_mode=retrieve_mode, plugins=plugins)
 
-    # 根据提供插件构建后置处理器
-    node_postprocessors = get_components_from_plugins(plugins, BaseNodePostprocessor)
-    # 添加默认后置处理器
-    node_postprocessors.extend(build_postprocessor_from_retrieve_param(score, top_k, retrieve_mode))
+        # 检索
+        with callback_manager.as_trace("retrieve"):
+            score_nodes = retriever._retrieve(query_bundle=QueryBundle(query_str=query))
 
-    for postprocessor in node_postprocessors:
-        score_nodes = postprocessor.postprocess_nodes(nodes=score_nodes, query_str=query)
+        # 根据提供插件构建后置处理器
+        node_postprocessors = get_components_from_plugins(plugins, BaseNodePostprocessor)
+        # 添加默认后置处理器
+        node_postprocessors.extend(build_postprocessor_from_retrieve_param(score, top_k, retrieve_mode))
 
-    query_embedding_context.reset(token)
+        for postprocessor in node_postprocessors:
+            score_nodes = postprocessor.postprocess_nodes(nodes=score_nodes, query_str=query)
+    finally:
+        QueryEmbeddingMemo.end(memo_token)
+        query_embedding_context.reset(token)
     return score_nodes
 
 
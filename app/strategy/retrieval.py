@@ -106,7 +106,9 @@ def create_retriever_by_mode(metadata_filters: MetadataFilters,
                                       similarity_cutoff=score)]
 
     vector_retriever = SimilarQueryFusionRetriever(retrievers=retrievers,
-                                                   similarity_top_k=int(RETRIEVAL['RETRIEVAL_NUM']))
+                                                   similarity_top_k=int(RETRIEVAL['RETRIEVAL_NUM']),
+                                                   use_parallel=RETRIEVAL['PARALLEL'],
+                                                   route_timeout=RETRIEVAL['ROUTE_TIMEOUT'])
 
     fusion_retrievers = [vector_retriever]
     if RetrievalMode.FUSION == retrieve_mode and has_index("es_index"):
@@ -119,7 +121,9 @@ def create_retriever_by_mode(metadata_filters: MetadataFilters,
     return MultiRecallFusionRetriever(retrievers=fusion_retrievers,
                                       similarity_top_k=int(RETRIEVAL['RETRIEVAL_NUM']),
                                       use_async=False,
-                                      mode=fusion_mode)
+                                      mode=fusion_mode,
+                                      use_parallel=RETRIEVAL['PARALLEL'],
+                                      route_timeout=RETRIEVAL['ROUTE_TIMEOUT'])
 
 
 def _create_base_vector_retriever(vector_store_index: VectorStoreIndex,
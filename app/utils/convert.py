@@ -1,3 +1,4 @@
+import hashlib
 import json
 from typing import List, Dict, Union, Any
 from typing import cast
@@ -10,6 +11,7 @@ from app.response.entity import RagSearchData, RagSearchAnnotation, RagSearchDoc
 from app.services import chunk_vector_index_structure
 from init.settings import user_logger
 from bella_rag.schema.nodes import TextNode, QaNode, ImageNode, DocumentNodeRelationship, RelatedNode, NodeWithScore
+from bella_rag.vector_stores.index import FIELD_RELATIONSHIPS
 
 logger = user_logger
 
@@ -152,6 +154,24 @@ def convert_chunk_content_attached_list(nodes: List[BaseNode]) -> List[ChunkCont
 
 
 def convert_chunk_content_attached(index: int, node: BaseNode) -> Union[ChunkContentAttached, None]:
+    chunk = _convert_chunk_content_attached(index, node)
+    if chunk:
+        chunk.content_hash = chunk_fingerprint(chunk, node)
+    return chunk
+
+
+def chunk_fingerprint(chunk: ChunkContentAttached, node: BaseNode) -> str:
+    """
+    切片内容指纹：节点类型、层级路径、内容及元数据
+    不含节点关系（相邻节点id随位置变化），插入、删除切片不影响其余切片的指纹
+    """
+    metadata = {k: v for k, v in node.metadata.items() if k != FIELD_RELATIONSHIPS}
+    fingerprint = json.dumps([type(node).__name__, chunk.order_num, chunk.content_title, chunk.content_data,
+                              metadata], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def _convert_chunk_content_attached(index: int, node: BaseNode) -> Union[ChunkContentAttached, None]:
     if isinstance(node, TextNode):
         text_node: TextNode = node
         return ChunkContentAttached(
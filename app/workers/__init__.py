@@ -1,31 +1,46 @@
 from concurrent.futures import ThreadPoolExecutor
-from typing import List
+from typing import List, Dict, Optional
 
 from app.workers.listeners.file_api_listener import FileApiTaskListener
 from app.workers.listeners.knowledge_file_context_task_listener import KnowledgeFileContextTaskListener
 from app.workers.listeners.knowledge_file_delete_listener import KnowledgeFileDeleteListener
 from app.workers.listeners.knowledge_file_index_done_listener import KnowledgeFileIndexDoneListener
 from app.workers.listeners.knowledge_index_task_listener import KnowledgeIndexTaskListener
-from app.workers.producers.producers import knowledge_index_task_kafka_producer, knowledge_file_extractor_producer
+from app.workers.producers.producers import knowledge_index_task_kafka_producer, knowledge_file_extractor_producer, \
+    close_producers
 from common.tool.kafka_tool import KafkaConsumer
 from init.settings import user_logger
 
 logger = user_logger
 
+# 消费者注册表，key为独立worker进程启动时使用的消费者名称
+LISTENERS = {
+    'knowledge_index': KnowledgeIndexTaskListener,
+    'knowledge_file_index_done': KnowledgeFileIndexDoneListener,
+    'file_api': FileApiTaskListener,
+    'knowledge_file_delete': KnowledgeFileDeleteListener,
+    'knowledge_file_context': KnowledgeFileContextTaskListener,
+}
+
 consumers: List[KafkaConsumer] = []
-consumers.extend(KnowledgeIndexTaskListener.get_instance(1))
-consumers.extend(KnowledgeFileIndexDoneListener.get_instance(1))
-consumers.extend(FileApiTaskListener.get_instance(1))
-consumers.extend(KnowledgeFileDeleteListener.get_instance(1))
-consumers.extend(KnowledgeFileContextTaskListener.get_instance(1))
 
 # 线程池最大工作线程数
 executor = None
-if len(consumers) > 0:
-    executor = ThreadPoolExecutor(max_workers=len(consumers))
 
 
-def start_workers():
+def start_workers(instance_nums: Optional[Dict[str, int]] = None):
+    """
+    创建并启动kafka消费者，instance_nums为各消费者的实例（线程）数，默认全部消费者各启动一个实例
+    """
+    global executor
+    if instance_nums is None:
+        instance_nums = {name: 1 for name in LISTENERS}
+    for name, instance_num in instance_nums.items():
+        consumers.extend(LISTENERS[name].get_instance(instance_num))
+    if not consumers:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=len(consumers))
     # 提交任务到线程池
     for i, consumer in enumerate(consumers):
         logger.info("启动kafka消费者 topic=%s group_id=%s 实例【%s】", consumer.topic, consumer.group_id, i)
@@ -35,7 +50,11 @@ def start_workers():
 def stop_workers():
     for consumer in consumers:
         consumer.stop()
-    executor.shutdown()
+    if executor:
+        executor.shutdown()
+    # 消费者停止后发送完缓冲中的消息
+    close_producers()
 
 
-__all__ = ['knowledge_index_task_kafka_producer', 'knowledge_file_extractor_producer', 'start_workers', 'stop_workers','consumers','executor']
+__all__ = ['knowledge_index_task_kafka_producer', 'knowledge_file_extractor_producer', 'start_workers', 'stop_workers',
+           'consumers', 'executor', 'LISTENERS']
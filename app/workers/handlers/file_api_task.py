@@ -11,8 +11,8 @@ from bella_rag.utils.file_api_tool import file_api_client
 file_api_postprocessors = [FileIndexingProcessor(), FileSummaryProcessor()]
 valid_file_purposes = {'assistants', 'assistants-chat'}
 file_event_handlers = {
-    # 发送删除事件
-    "file.deleted": lambda file_id: file_delete_submit_task(file_id),
+    # 发送删除事件，批量删除时不逐条等待发送结果
+    "file.deleted": lambda file_id: file_delete_submit_task(file_id, wait=False),
     # 更新文件状态为消息入队
     "file.created": lambda file_id: file_api_client.update_processing_status(
         'queued', 0, file_id, '', "file_indexing"
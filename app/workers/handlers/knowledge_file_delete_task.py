@@ -1,7 +1,8 @@
 import redis
 from redis_lock import Lock
 
-from app.services import es_index_structure, chunk_vector_index_structure, question_vector_index_structure, file_service
+from app.services import es_index_structure, chunk_vector_index_structure, question_vector_index_structure, file_service, \
+    file_versions
 from app.services.chunk_content_attached_service import ChunkContentAttachedService
 from app.services.knowledge_file_meta_service import KnowledgeMetaService
 from app.services.question_answer_attached_service import QuestionAnswerIndexAttachedService
@@ -41,6 +42,7 @@ def knowledge_file_delete_callback(payload: dict) -> bool:
         logger.info("delete_file success file_id = %s [step=更新es索引]", file_id)
         # 删除缓存数据
         node_cache.remove(file_id=file_id)
+        file_versions.bump(file_id)
         logger.info("delete_file success file_id = %s [step=清理缓存]", file_id)
         file_service.remove_deleted_files_record([file_id])
 
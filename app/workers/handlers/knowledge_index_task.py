@@ -18,6 +18,7 @@ def knowledge_index_task_callback(payload: dict) -> bool:
     callbacks = payload.get('callbacks', [])
     user = payload.get('user', DEFAULT_USER)
     request_id = payload.get('request_id')
+    incremental = payload.get('incremental')
 
     lock = Lock(redis_client=redis.Redis(connection_pool=redis_pool),
                 name=f"file_indexing_lock_{file_id}",
@@ -52,7 +53,7 @@ def knowledge_index_task_callback(payload: dict) -> bool:
 
         file_indexing(file_id=file_id, file_name=file_name,
                       metadata=metadata, callbacks=callbacks, user=user,
-                      custom_parsers=custom_parsers)
+                      custom_parsers=custom_parsers, incremental=incremental)
         redis_client.setex(redis_key_prefix + file_id, 86400, "done")
     finally:
         if lock.locked():
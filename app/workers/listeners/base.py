@@ -16,8 +16,8 @@ class BaseListener(KafkaConsumer):
             self._enable = False
         else:
             super().__init__(**task_config)
-            # callback执行线程池，工作线程数设置需适当高于kafka消费线程数
-            self.callback_executor = ThreadPoolExecutor(max_workers=3 * instance_num)
+            # callback执行线程池，工作线程数设置需适当高于kafka消费线程数（含并发消费的消息数）
+            self.callback_executor = ThreadPoolExecutor(max_workers=3 * instance_num * self.concurrency)
 
     @classmethod
     def get_instance(cls, instance_num: int):
@@ -9,6 +9,7 @@ knowledge_index_task_config = {
     "topic": KAFKA.get("KNOWLEDGE_INDEX_TASK_TOPIC", None),
     "callback": knowledge_index_task_callback,
     "callback_timeout": 2300,  # 执行超时时间（秒）
+    "concurrency": KAFKA.get("KNOWLEDGE_INDEX_TASK_CONCURRENCY", 1),  # 并发索引的文件数
     "producer": knowledge_index_task_kafka_producer,  # 消息重试producer
     'max.poll.interval.ms': 2400000,  # 40分钟,避免_MAX_POLL_EXCEEDED
 }
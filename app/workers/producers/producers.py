@@ -1,4 +1,6 @@
-from typing import Optional, Dict
+import atexit
+from concurrent.futures import Future
+from typing import Optional, Dict, Union
 
 from common.tool.kafka_tool import KafkaProducer
 from init.settings import KAFKA, user_logger
@@ -45,7 +47,10 @@ def get_kafka_producer(producer_type: str) -> Optional[KafkaProducer]:
     try:
         return KafkaProducer(
             bootstrap_servers=bootstrap_servers,
-            topic=topic
+            topic=topic,
+            linger_ms=KAFKA['PRODUCER_LINGER_MS'],
+            batch_num_messages=KAFKA['PRODUCER_BATCH_NUM_MESSAGES'],
+            buffer_max_messages=KAFKA['PRODUCER_BUFFER_MAX_MESSAGES'],
         )
     except Exception as e:
         logger.error(f"Kafka生产者初始化失败 ({producer_type}): {str(e)}",
@@ -61,9 +66,36 @@ knowledge_index_task_kafka_producer = producers["knowledge_index_task"]
 knowledge_file_extractor_producer = producers["knowledge_file_extractor"]
 knowledge_file_delete_producer = producers["knowledge_file_delete"]
 
-def async_send_kafka_message(producer: KafkaProducer, data: str):
+
+def async_send_kafka_message(producer: KafkaProducer, data: str, wait: bool = True) -> Union[bool, Future]:
+    """
+    wait为False时消息进入本地缓冲即返回发送结果的future，由后台批量发送，发送失败记录日志
+    """
     if not producer:
         logger.warn(f'producer is none, can not send message: {data}')
         return False
 
+    if not wait:
+        try:
+            future = producer.send_message(data)
+        except BufferError:
+            return False
+        future.add_done_callback(lambda f: _log_send_failure(f, producer, data))
+        return future
     return producer.sync_send_message(data)
+
+
+def _log_send_failure(future: Future, producer: KafkaProducer, data: str):
+    if future.exception() is not None or not future.result():
+        logger.error(f'async send kafka message failed, topic: {producer.topic}, message: {data}')
+
+
+def close_producers():
+    """发送完所有生产者缓冲中的消息"""
+    for producer in producers.values():
+        if producer:
+            producer.close()
+
+
+# web进程未启动消费者时也需在退出前发送完缓冲消息
+atexit.register(close_producers)
@@ -1,9 +1,11 @@
 import json
 import random
+import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
-from typing import Any, Optional, List, Dict, Sequence, cast, Generator, Union, BinaryIO, Tuple
+from typing import Any, Optional, List, Dict, Sequence, cast, Generator, Union, BinaryIO, Tuple, Callable
 
 import requests
 from bella_openapi import StandardDomTree
@@ -11,6 +13,7 @@ from bella_openapi.bella_trace import TRACE_ID
 from llama_index.core import BasePromptTemplate
 from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
 from llama_index.core.base.llms.types import LLMMetadata, CompletionResponseGen
+from llama_index.core.callbacks import CBEventType, EventPayload
 from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.core.instrumentation.events.llm import LLMPredictStartEvent, LLMPredictEndEvent
 from llama_index.core.llms.callbacks import llm_chat_callback
@@ -20,19 +23,21 @@ from llama_index.legacy.llms.konko_utils import to_openai_message_dicts
 from llama_index.llms.openai import OpenAI as Llama_OpenAI
 from llama_index.llms.openai.base import llm_retry_decorator
 from llama_index_client import MessageRole
-from openai import OpenAI as LlamaOpenAI, AsyncOpenAI as LlamaAsyncOpenAI, APIError
+from openai import OpenAI as LlamaOpenAI, AsyncOpenAI as LlamaAsyncOpenAI, APIError, RateLimitError
 from openai._types import Headers
 from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall, ChoiceDelta, ChatCompletionChunk
 from pydantic import Field
 from requests import RequestException
 from requests_toolbelt import MultipartEncoder
 
-from app.common.contexts import query_embedding_context, TraceContext, UserContext
+from app.common.contexts import query_embedding_context, TraceContext, UserContext, QueryEmbeddingMemo
 from app.utils.metric_util import increment_counter_with_tag
 from bella_rag.llm.types import RerankResponse, dict_to_sensitive, ChatMessage, ChatResponse, Sensitive
+from bella_rag.utils.cache_util import QueryEmbeddingCache
 from bella_rag.utils.file_util import create_standard_dom_tree_from_json
 from bella_rag.utils.openapi_util import openapi_modelname_to_contextsize, openapi_is_function_calling_model, \
     openapi_model_supported_params
+from bella_rag.utils.thread_util import with_context
 from bella_rag.utils.trace_log_util import trace
 from bella_rag.utils.user_util import get_user_info
 from common.helper.exception import FileNotFoundException
@@ -117,6 +122,85 @@ async def aget_embedding(client: AsyncOpenAI, texts: List[str], model: str) -> L
     return await aget_embeddings(client, texts, model)
 
 
+class EmbeddingBatchDispatcher:
+    """
+    embedding批次并发调度器
+    按batch_size切分文本并发请求，输出顺序与输入一致；
+    批次遇到429限流时收缩在途并发数并退避重试，请求成功后逐步恢复
+    """
+
+    def __init__(self, embed_func: Callable[[List[str]], List[Embedding]], batch_size: int,
+                 max_concurrency: int, max_rate_limit_retries: int = 5,
+                 backoff_seconds: float = 1.0, max_backoff_seconds: float = 30.0):
+        self.embed_func = embed_func
+        self.batch_size = batch_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        # 当前允许的在途批次数，限流时减半，成功时加一
+        self._limit = self.max_concurrency
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def dispatch(self, texts: List[str]) -> List[Embedding]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._run_batch(batches[0]) if batches else []
+
+        results: List[Optional[List[Embedding]]] = [None] * len(batches)
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            futures = {executor.submit(with_context(self._run_batch), batch): i
+                       for i, batch in enumerate(batches)}
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+    def _run_batch(self, batch: List[str]) -> List[Embedding]:
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                embeddings = self.embed_func(batch)
+            except RateLimitError:
+                self._release(rate_limited=True)
+                attempt += 1
+                if attempt > self.max_rate_limit_retries:
+                    raise
+                backoff = min(self.backoff_seconds * 2 ** (attempt - 1), self.max_backoff_seconds)
+                backoff = random.uniform(backoff / 2, backoff)
+                logger.warning(f'embedding batch rate limited, retry {attempt} after {backoff:.2f}s, '
+                               f'concurrency limit : {self._limit}')
+                time.sleep(backoff)
+                continue
+            except Exception:
+                self._release()
+                raise
+            self._release()
+            return embeddings
+
+    def _acquire(self):
+        with self._condition:
+            while self._in_flight >= self._limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def _release(self, rate_limited: bool = False):
+        with self._condition:
+            self._in_flight -= 1
+            if rate_limited:
+                self._limit = max(1, self._limit // 2)
+            elif self._limit < self.max_concurrency:
+                self._limit += 1
+            self._condition.notify_all()
+
+
 def stream_completion_response_to_tokens(
         completion_response_gen: CompletionResponseGen,
 ) -> TokenGen:
@@ -155,10 +239,13 @@ class OpenAPIEmbedding(BaseEmbedding):
     api_key: str = Field(description="The OpenAI API key.")
     _client: Optional[OpenAI] = PrivateAttr()
     _aclient: Optional[AsyncOpenAI] = PrivateAttr()
+    _query_cache: Optional[QueryEmbeddingCache] = PrivateAttr()
+    _dispatcher: Optional[EmbeddingBatchDispatcher] = PrivateAttr()
     user: str = Field(default_factory=get_user_info, description="user")
     model_dimension: int = Field(description="embedding模型维数")
 
-    def __init__(self, model: str, api_key: str, embedding_batch_size: int, model_dimension: int = 1024, **kwargs):
+    def __init__(self, model: str, api_key: str, embedding_batch_size: int, model_dimension: int = 1024,
+                 query_cache: Optional[QueryEmbeddingCache] = None, embedding_concurrency: int = 1, **kwargs):
         super().__init__(
             model_name=model,
             embed_batch_size=embedding_batch_size,
@@ -168,14 +255,24 @@ class OpenAPIEmbedding(BaseEmbedding):
         )
         self._client = None
         self._aclient = None
+        self._query_cache = query_cache
+        # 并发数大于1时，批量embedding通过调度器并发请求
+        self._dispatcher = EmbeddingBatchDispatcher(
+            embed_func=self._get_text_embeddings,
+            batch_size=embedding_batch_size,
+            max_concurrency=embedding_concurrency,
+        ) if embedding_concurrency > 1 else None
 
     def _get_query_embedding(self, query: str) -> Embedding:
         if TraceContext.is_mock_request:
             time.sleep(random.uniform(0.1, 0.3))
             logger.info(f'mock request _get_query_embedding, query: {query}')
             return [random.uniform(0, 1) for _ in range(self.model_dimension)]
-        client = self._get_client(self.api_key)
-        embedding = get_embedding(client, [query], self.model_name)[0]
+        embedding = self._get_cached_query_embedding(query)
+        if embedding is None:
+            client = self._get_client(self.api_key)
+            embedding = get_embedding(client, [query], self.model_name)[0]
+            self._put_cached_query_embedding(query, embedding)
         query_embedding_context.set(embedding)
         return embedding
 
@@ -184,9 +281,27 @@ class OpenAPIEmbedding(BaseEmbedding):
             time.sleep(random.uniform(0.1, 0.3))
             logger.info(f'mock request _aget_query_embedding, query: {query}')
             return [random.uniform(0, 1) for _ in range(self.model_dimension)]
-        aclient = self._get_aclient(self.api_key)
-        embeddings = await aget_embedding(aclient, [query], self.model_name)
-        return embeddings[0]
+        embedding = self._get_cached_query_embedding(query)
+        if embedding is None:
+            aclient = self._get_aclient(self.api_key)
+            embedding = (await aget_embedding(aclient, [query], self.model_name))[0]
+            self._put_cached_query_embedding(query, embedding)
+        return embedding
+
+    def _get_cached_query_embedding(self, query: str) -> Optional[Embedding]:
+        # 优先复用当前请求内已生成的向量，其次查询跨请求缓存
+        memo_query = QueryEmbeddingCache.normalize_query(query)
+        embedding = QueryEmbeddingMemo.get(self.model_name, memo_query)
+        if embedding is not None or self._query_cache is None:
+            return embedding
+        embedding = self._query_cache.get(self.model_name, self.model_dimension, query)
+        QueryEmbeddingMemo.put(self.model_name, memo_query, embedding)
+        return embedding
+
+    def _put_cached_query_embedding(self, query: str, embedding: Embedding):
+        QueryEmbeddingMemo.put(self.model_name, QueryEmbeddingCache.normalize_query(query), embedding)
+        if self._query_cache is not None:
+            self._query_cache.put(self.model_name, self.model_dimension, query, embedding)
 
     def _get_text_embedding(self, text: str) -> Embedding:
         if TraceContext.is_mock_request:
@@ -221,6 +336,28 @@ class OpenAPIEmbedding(BaseEmbedding):
             self._aclient = AsyncOpenAI(api_key=api_key, base_url=OPENAPI["URL"])
         return self._aclient
 
+    def get_text_embedding_batch(
+            self,
+            texts: List[str],
+            show_progress: bool = False,
+            **kwargs: Any,
+    ) -> List[Embedding]:
+        if self._dispatcher is None or len(texts) <= self.embed_batch_size:
+            return super().get_text_embedding_batch(texts, show_progress=show_progress, **kwargs)
+
+        with self.callback_manager.event(
+                CBEventType.EMBEDDING,
+                payload={EventPayload.SERIALIZED: self.to_dict()},
+        ) as event:
+            embeddings = self._dispatcher.dispatch(texts)
+            event.on_end(
+                payload={
+                    EventPayload.CHUNKS: texts,
+                    EventPayload.EMBEDDINGS: embeddings,
+                },
+            )
+        return embeddings
+
 
 class OpenAPI(Llama_OpenAI):
 
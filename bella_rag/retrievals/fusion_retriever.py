@@ -1,3 +1,6 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Tuple, Optional
 
 from llama_index.core import QueryBundle
@@ -9,15 +12,44 @@ from llama_index.core.retrievers import QueryFusionRetriever as LlamaQueryFusion
 from llama_index.core.retrievers.fusion_retriever import FUSION_MODES
 from llama_index.core.schema import IndexNode
 
+from app.common.contexts import query_embedding_context
+from app.utils.metric_util import increment_counter_with_tag
+from init.settings import RETRIEVAL, user_logger
 from bella_rag.schema.nodes import QaNode
 from bella_rag.schema.nodes import StructureNode, NodeWithScore
+from bella_rag.utils.thread_util import with_context
 from bella_rag.utils.trace_log_util import trace
 
+# 多路检索线程池按嵌套层级区分，每层限制单进程内同时执行的检索路数
+# 外层检索任务会阻塞等待内层检索，共用同一线程池时并发打满后外层任务占满线程，内层任务排队无法执行
+_retrieval_executors: Dict[int, ThreadPoolExecutor] = {}
+_retrieval_executors_lock = threading.Lock()
+# 当前检索所处的嵌套层级，线程池任务内为提交层级+1
+_retrieval_depth = contextvars.ContextVar('retrieval_depth', default=0)
+
+
+def get_retrieval_executor(depth: int) -> ThreadPoolExecutor:
+    with _retrieval_executors_lock:
+        executor = _retrieval_executors.get(depth)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=int(RETRIEVAL['PARALLEL_WORKERS']),
+                                          thread_name_prefix=f'retrieval-{depth}')
+            _retrieval_executors[depth] = executor
+    return executor
+
+
+def _run_route(depth: int, retriever: BaseRetriever, query: QueryBundle) -> List[NodeWithScore]:
+    _retrieval_depth.set(depth + 1)
+    return retriever.retrieve(query)
+
 
 class QueryFusionRetriever(LlamaQueryFusionRetriever):
     """
     需要实现一个QueryFusionRetriever，支持文档去重唯一键（源码里默认为text）
+    use_parallel开启后各路检索器在共享线程池内并发执行，超时或失败的路由不影响其余结果的融合
     """
+    use_parallel: bool = False
+    route_timeout: Optional[float] = None
 
     def __init__(
             self,
@@ -33,7 +65,11 @@ class QueryFusionRetriever(LlamaQueryFusionRetriever):
             objects: Optional[List[IndexNode]] = None,
             object_map: Optional[dict] = None,
             retriever_weights: Optional[List[float]] = None,
+            use_parallel: bool = False,
+            route_timeout: Optional[float] = None,
     ) -> None:
+        self.use_parallel = use_parallel
+        self.route_timeout = route_timeout
         super().__init__(
             retrievers=retrievers,
             llm=llm, similarity_top_k=similarity_top_k,
@@ -46,6 +82,62 @@ class QueryFusionRetriever(LlamaQueryFusionRetriever):
             verbose=verbose,
         )
 
+    def _run_sync_queries(
+            self, queries: List[QueryBundle]
+    ) -> Dict[Tuple[str, int], List[NodeWithScore]]:
+        if self.use_parallel:
+            return self._run_parallel_queries(queries)
+        return super()._run_sync_queries(queries)
+
+    def _run_parallel_queries(
+            self, queries: List[QueryBundle]
+    ) -> Dict[Tuple[str, int], List[NodeWithScore]]:
+        """
+        各路检索并发执行，整体耗时取决于最慢的一路
+        超时或失败的路由按空结果参与融合，全部失败时抛出首个异常
+        """
+        # 相同query只检索一次
+        unique_queries: Dict[str, QueryBundle] = {}
+        for query in queries:
+            unique_queries.setdefault(query.query_str, query)
+
+        depth = _retrieval_depth.get()
+        executor = get_retrieval_executor(depth)
+        futures = {}
+        for query in unique_queries.values():
+            for i, retriever in enumerate(self._retrievers):
+                future = executor.submit(with_context(_run_route), depth, retriever, query)
+                futures[future] = ((query.query_str, i), type(retriever).__name__)
+
+        done, not_done = wait(futures.keys(), timeout=self.route_timeout)
+
+        results = {}
+        errors = []
+        for future, (key, route) in futures.items():
+            if future in not_done:
+                # 未开始执行的任务直接取消，释放线程池
+                future.cancel()
+                user_logger.warning(f'retrieval route timeout : {route}, timeout : {self.route_timeout}s')
+                increment_counter_with_tag('retrieval_route', 'status', 'timeout')
+                errors.append(TimeoutError(f'retrieval route timeout : {route}'))
+                results[key] = []
+            elif future.exception() is not None:
+                user_logger.error(f'retrieval route failed : {route}, error : {future.exception()}')
+                increment_counter_with_tag('retrieval_route', 'status', 'failed')
+                errors.append(future.exception())
+                results[key] = []
+            else:
+                results[key] = future.result()
+
+        if errors and len(errors) == len(futures):
+            raise errors[0]
+
+        # 子线程内生成的query向量回写到当前请求上下文，供后续补全等环节使用
+        for query in unique_queries.values():
+            if query.embedding and not query_embedding_context.get():
+                query_embedding_context.set(query.embedding)
+        return results
+
     def _reciprocal_rerank_fusion(
             self, results: Dict[Tuple[str, int], List[NodeWithScore]]
     ) -> List[NodeWithScore]:
@@ -114,9 +206,13 @@ class SimilarQueryFusionRetriever(QueryFusionRetriever):
             retrievers: List[BaseRetriever],
             similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
             use_async: bool = False,
+            use_parallel: bool = False,
+            route_timeout: Optional[float] = None,
     ) -> None:
         self.similarity_top_k = similarity_top_k
         self.use_async = use_async
+        self.use_parallel = use_parallel
+        self.route_timeout = route_timeout
         self._retrievers = retrievers
 
     @trace(step="similar_fusion_retriever")
@@ -182,6 +278,8 @@ class MultiRecallFusionRetriever(QueryFusionRetriever):
             objects: Optional[List[IndexNode]] = None,
             object_map: Optional[dict] = None,
             retriever_weights: Optional[List[float]] = None,
+            use_parallel: bool = False,
+            route_timeout: Optional[float] = None,
     ) -> None:
         super().__init__(
             retrievers=retrievers,
@@ -193,6 +291,8 @@ class MultiRecallFusionRetriever(QueryFusionRetriever):
             object_map=object_map,
             objects=objects,
             verbose=verbose,
+            use_parallel=use_parallel,
+            route_timeout=route_timeout,
         )
 
     def get_node_unique_key(self, node: NodeWithScore) -> str:
@@ -1,4 +1,4 @@
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Callable
 
 from llama_index.core import VectorStoreIndex
 from llama_index.core.base.base_retriever import BaseRetriever
@@ -11,9 +11,17 @@ from llama_index.core.indices.vector_store import VectorIndexRetriever as LlamaV
 from llama_index.core.schema import ObjectType, QueryBundle, IndexNode
 from llama_index.core.vector_stores.types import VectorStoreQueryMode, MetadataFilters, VectorStoreQueryResult
 
+from init.settings import RETRIEVAL
 from bella_rag.schema.nodes import NodeWithScore
 from bella_rag.utils.trace_log_util import trace
 from bella_rag.vector_stores.elasticsearch import ElasticsearchStore
+from bella_rag.vector_stores.search_batcher import VectorSearchBatcher, supports_batch_query
+
+# 并发的向量检索合并为批量检索，减少向量库请求次数
+search_batcher = VectorSearchBatcher(
+    window=RETRIEVAL['SEARCH_BATCH_WINDOW'],
+    max_batch_size=RETRIEVAL['SEARCH_BATCH_SIZE'],
+) if RETRIEVAL['SEARCH_BATCH'] else None
 
 
 class VectorIndexRetriever(LlamaVectorIndexRetriever):
@@ -67,6 +75,15 @@ class VectorIndexRetriever(LlamaVectorIndexRetriever):
     ) -> List[NodeWithScore]:
         return super()._retrieve(query_bundle)
 
+    def _get_nodes_with_embeddings(
+        self, query_bundle_with_embeddings: QueryBundle
+    ) -> List[NodeWithScore]:
+        if search_batcher is None or not supports_batch_query(self._vector_store):
+            return super()._get_nodes_with_embeddings(query_bundle_with_embeddings)
+        query = self._build_vector_store_query(query_bundle_with_embeddings)
+        query_result = search_batcher.query(self._vector_store, query, **self._kwargs)
+        return self._build_node_list_from_query_result(query_result)
+
     def _build_node_list_from_query_result(
         self, query_result: VectorStoreQueryResult
     ) -> List[NodeWithScore]:
@@ -141,3 +158,21 @@ class EmptyRetriever(BaseRetriever):
 
     def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
         return []
+
+
+class CallableRetriever(BaseRetriever):
+    """由检索函数构建的检索器，检索函数内已完成后置处理"""
+
+    def __init__(
+            self,
+            retrieve_func: Callable[[str], List[NodeWithScore]],
+            callback_manager: Optional[CallbackManager] = None,
+            object_map: Optional[Dict] = None,
+            objects: Optional[List[IndexNode]] = None,
+            verbose: bool = False,
+    ) -> None:
+        self._retrieve_func = retrieve_func
+        super().__init__(callback_manager, object_map, objects, verbose)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._retrieve_func(query_bundle.query_str)
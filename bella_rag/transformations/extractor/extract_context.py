@@ -1,13 +1,15 @@
 import json
 import sys
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Tuple, List
 
 from llama_index.core.prompts import PromptType
 
 from app.services import chunk_vector_index_structure, embed_model
 from app.services.chunk_content_attached_service import ChunkContentAttachedService
-from app.services.context_service import redis_client, redis_key_prefix, save_context_chunk
+from app.services.context_service import redis_client, redis_key_prefix, save_context_chunks, ContextChunk, \
+    clear_context_nodes
 from app.utils.llm_response_util import get_response_json_str
 from common.tool.vector_db_tool import query_all_by_source
 from init.settings import user_logger, CONTEXT_SUMMARY, OPENAPI
@@ -17,10 +19,15 @@ from bella_rag.schema.nodes import StructureNode, TabelNode, DocumentNodeRelatio
 from bella_rag.utils.complete_util import _complete_table, complete_all_sub_nodes
 from bella_rag.utils.openapi_util import count_tokens, DEFAULT_MODEL
 from bella_rag.utils.schema_util import rebuild_nodes_from_index
+from bella_rag.utils.thread_util import with_context
 from bella_rag.utils.trace_log_util import trace
 
 llm = OpenAPI(model="gpt-4o", temperature=0, api_base=OPENAPI["URL"], api_key=OPENAPI["AK"], timeout=300, top_p=1,)
 
+# 各批次summary并发执行，进程内共享
+summary_executor = ThreadPoolExecutor(max_workers=int(CONTEXT_SUMMARY['SUMMARY_CONCURRENCY']),
+                                      thread_name_prefix='context-summary')
+
 # todo summary prompt配到apollo里
 contextual_prompt = '''
 你是一个背景补全专家，你擅长结合整个文档对文档的每一部分补充一个背景信息，让文档的每一部分单独出现的时候信息都是完整的。
@@ -105,52 +112,86 @@ def context_summary(source_id: str):
     background_info_lis = get_background_info(grouped_nodes, source_id, 100000, 0)    # overlap设置为0，不允许重叠
     user_logger.info(f'finish get background info : {source_id}, background size: {len(background_info_lis)}')
 
-    context_texts = []
-    group_texts = []
-    all_group_nodes = []
-    # 进行summary分段总结
+    # 按文档顺序切分summary批次：(批次文本, 批次节点组)
+    batches = []
+    # 模型总结每批最大大小
+    summary_max_batch_size = int(CONTEXT_SUMMARY['SUMMARY_MAX_BATCH_SIZE'])
     for background_info in background_info_lis:
         nodes_to_summary = background_info[1]
-        all_group_nodes.extend(background_info[1])
-        user_logger.info(f'start summary contexts : {source_id}, context node size: {len(nodes_to_summary)}')
-        # 模型总结每批最大大小
-        summary_max_batch_size = int(CONTEXT_SUMMARY['SUMMARY_MAX_BATCH_SIZE'])
-        batch_nodes = [nodes_to_summary[i:i + summary_max_batch_size]
-                       for i in range(0, len(nodes_to_summary), summary_max_batch_size)]
-        for batch in batch_nodes:
-            cont_list = []
-            for i, ready_nodes in enumerate(batch):
-                # 拼接所有文本信息
-                context_part = ''
-                for ready_node in ready_nodes:
-                    context_part += ready_node.get_complete_content()
-                # llama-index内部模型调用对prompt做format，可能会识别到文档内部{}为变量导致冲突，替换为双括号
-                cont_list.append(f'文档第{i + 1}部分：{context_part.replace("{", "{{").replace("}", "}}").strip()}')
-            summary_res = summary_nodes(cont_list, file_name, source_id)
+        for i in range(0, len(nodes_to_summary), summary_max_batch_size):
+            batch = nodes_to_summary[i:i + summary_max_batch_size]
+            batches.append((build_summary_texts(batch), batch))
+
+    # 进行summary分段总结：各批次并发执行、单独重试，结果按批次顺序依次落库，保证context序号与分组顺序一致
+    user_logger.info(f'start summary contexts : {source_id}, batch size: {len(batches)}')
+    futures = {summary_executor.submit(with_context(summary_nodes), texts, file_name, source_id): i
+               for i, (texts, _) in enumerate(batches)}
+    summary_results = {}
+    next_batch = 0
+    order = 0
+    try:
+        for future in as_completed(futures):
+            summary_res = future.result()
             if not summary_res:
+                user_logger.error(f'context summary failed: {source_id}, batch: {futures[future]}')
+                _rollback_context_summary(source_id, futures, order)
                 return
-            context_texts.extend(summary_res)
-            group_texts.extend(cont_list)
+            summary_results[futures[future]] = summary_res
+
+            while next_batch in summary_results:
+                texts, batch = batches[next_batch]
+                order = save_summary_batch(source_id, file_name, summary_results.pop(next_batch), texts, batch,
+                                           order)
+                next_batch += 1
+    except Exception:
+        _rollback_context_summary(source_id, futures, order)
+        raise
+
+    user_logger.info(f'finish context summary: {source_id}, context size: {order}')
+    redis_client.set(redis_key_prefix + source_id, "done")
 
-    order = 0
-    # 构建context节点
+
+def build_summary_texts(batch: List[List[StructureNode]]) -> List[str]:
+    cont_list = []
+    for i, ready_nodes in enumerate(batch):
+        # 拼接所有文本信息
+        context_part = ''
+        for ready_node in ready_nodes:
+            context_part += ready_node.get_complete_content()
+        # llama-index内部模型调用对prompt做format，可能会识别到文档内部{}为变量导致冲突，替换为双括号
+        cont_list.append(f'文档第{i + 1}部分：{context_part.replace("{", "{{").replace("}", "}}").strip()}')
+    return cont_list
+
+
+def save_summary_batch(source_id: str, file_name: str, context_texts: List[str], group_texts: List[str],
+                       group_nodes: List[List[StructureNode]], order: int) -> int:
+    """
+    批量embedding并保存一个批次的context节点，返回下一个context序号
+    """
     embeddings = embed_model.get_text_embedding_batch(context_texts)
+    chunks = []
     for i, context_text in enumerate(context_texts):
         sub_ids = []
         extra = {}
-        for node in all_group_nodes[i]:
+        for node in group_nodes[i]:
             if not extra:
                 extra = node.extra_info
             sub_ids.append(node.node_id)
 
-        context_id = f'{source_id}-context-{order}'
-        save_context_chunk(source_id, file_name, context_text, context_id, sub_ids,
-                           extra, embeddings[i], count_tokens(group_texts[i]))
-        user_logger.info(f'save context chunk: {source_id}, context_id: {context_id}, content: {context_text}')
-        order += 1
+        context_id = f'{source_id}-context-{order + i}'
+        chunks.append(ContextChunk(context_text, context_id, sub_ids, extra, embeddings[i],
+                                   count_tokens(group_texts[i])))
+    save_context_chunks(source_id, file_name, chunks)
+    user_logger.info(f'save context chunks: {source_id}, context ids: {[chunk.context_id for chunk in chunks]}')
+    return order + len(chunks)
 
-    user_logger.info(f'finish context summary: {source_id}')
-    redis_client.set(redis_key_prefix + source_id, "done")
+
+def _rollback_context_summary(source_id: str, futures, saved_size: int):
+    """summary失败时取消未开始的批次，并清理已保存的context节点，避免重试时重复生成"""
+    for future in futures:
+        future.cancel()
+    if saved_size:
+        clear_context_nodes(source_id)
 
 
 def summary_nodes(texts: List[str], file_name: str, source_id: str) -> List[str]:
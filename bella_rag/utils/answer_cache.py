@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from app.utils.metric_util import increment_counter_with_tag
+from bella_rag.utils.embedding_util import compute_cosine_similarities
+
+
+class CachedAnswer(NamedTuple):
+    text: str
+    # dump_score_nodes序列化后的引用节点
+    source_nodes: bytes
+
+
+class _AnswerScope:
+    """同一作用域下的历史答案，query向量按行存储为矩阵，查找时一次计算全部相似度"""
+
+    def __init__(self, dimension: int):
+        self.embeddings = np.zeros((0, dimension), dtype=np.float32)
+        self.expires: List[float] = []
+        self.answers: List[CachedAnswer] = []
+
+    def evict(self, now: float, capacity: int):
+        keep = [i for i, expire in enumerate(self.expires) if expire > now][-capacity:]
+        if len(keep) == len(self.expires):
+            return
+        self.embeddings = self.embeddings[keep]
+        self.expires = [self.expires[i] for i in keep]
+        self.answers = [self.answers[i] for i in keep]
+
+
+class SemanticAnswerCache:
+    """
+    语义答案缓存，进程内lru
+    作用域由调用方计算（需包含文件范围及版本号、模型、指令等），作用域内query向量与历史query余弦距离不超过阈值时复用答案
+    """
+    METRIC_KEY = 'answer_cache'
+
+    def __init__(self, max_distance: float, capacity: int, scope_capacity: int, ttl: int):
+        self.min_similarity = 1 - max_distance
+        # 作用域数量上限
+        self.capacity = capacity
+        # 单个作用域内答案数量上限
+        self.scope_capacity = scope_capacity
+        self.ttl = ttl
+        self.scopes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, scope: str, query_embedding: List[float]) -> Optional[CachedAnswer]:
+        now = time.time()
+        with self.lock:
+            answer_scope = self.scopes.get(scope)
+            if answer_scope is not None:
+                self.scopes.move_to_end(scope)
+                answer_scope.evict(now, self.scope_capacity)
+                embeddings, answers = answer_scope.embeddings, answer_scope.answers
+        if answer_scope is None or not answers:
+            increment_counter_with_tag(self.METRIC_KEY, 'result', 'miss')
+            return None
+
+        similarities = compute_cosine_similarities(query_embedding, embeddings)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.min_similarity:
+            increment_counter_with_tag(self.METRIC_KEY, 'result', 'miss')
+            return None
+        increment_counter_with_tag(self.METRIC_KEY, 'result', 'hit')
+        return answers[best]
+
+    def put(self, scope: str, query_embedding: List[float], answer: CachedAnswer):
+        if not query_embedding:
+            return
+        now = time.time()
+        embedding = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        with self.lock:
+            answer_scope = self.scopes.get(scope)
+            if answer_scope is None or answer_scope.embeddings.shape[1] != embedding.shape[1]:
+                answer_scope = _AnswerScope(embedding.shape[1])
+                self.scopes[scope] = answer_scope
+            self.scopes.move_to_end(scope)
+            # 重新赋值而非原地修改，读取方持有的旧矩阵不受影响
+            answer_scope.embeddings = np.vstack([answer_scope.embeddings, embedding])
+            answer_scope.expires = answer_scope.expires + [now + self.ttl]
+            answer_scope.answers = answer_scope.answers + [answer]
+            answer_scope.evict(now, self.scope_capacity)
+            while len(self.scopes) > self.capacity:
+                self.scopes.popitem(last=False)
@@ -1,15 +1,24 @@
+import json
+import threading
+import time
 from collections import OrderedDict
-from typing import List
+from hashlib import sha1
+from typing import List, Optional, Tuple, Dict
 
+import numpy as np
 from llama_index.core.schema import NodeWithScore
+from redis import Redis, RedisError
 
+from app.utils.metric_util import increment_counter_with_tag
 from init.settings import user_logger
 from bella_rag.schema.nodes import BaseNode
+from bella_rag.utils.node_graph import CompactNodeGraph
 
 
 class NodeLRUCache:
     """
     使用lru缓存记录热点文件节点关系
+    文件节点以紧凑的数组图存储，读取时按需实例化节点，容量按节点数计算
     """
     def __init__(self, capacity: int):
         self.capacity = capacity
@@ -21,37 +30,411 @@ class NodeLRUCache:
         return file_id in self.cache
 
     def get(self, file_id: str, node_id: str):
-        if file_id in self.cache and node_id in self.cache[file_id]:
-            node = self.cache[file_id][node_id]
+        return self.get_nodes(file_id, [node_id]).get(node_id)
+
+    def get_nodes(self, file_id: str, node_ids: List[str]) -> Dict[str, BaseNode]:
+        """同一文件的多个节点在同一视图内实例化，共享关联节点"""
+        graph = self.get_graph(file_id)
+        if graph is None:
+            return {}
+        view = graph.view()
+        res = {}
+        for node_id in node_ids:
+            node = view.get(node_id)
+            if node is not None:
+                res[node_id] = node
+        return res
+
+    def get_graph(self, file_id: str) -> Optional[CompactNodeGraph]:
+        graph = self.cache.get(file_id)
+        if graph is not None:
             self.cache.move_to_end(file_id)
-            return node
-        return None
+        return graph
 
     def put(self, file_id: str, nodes: List[BaseNode]):
-        user_logger.info(f'put file nodes into cache:{file_id}, count:{len(nodes)}')
-        if nodes and len(nodes) > self.capacity:
-            user_logger.warn(f'file nodes too much to put cache:{file_id}, count:{len(nodes)}')
+        self.put_graph(file_id, CompactNodeGraph.from_nodes(nodes))
+
+    def put_graph(self, file_id: str, graph: CompactNodeGraph):
+        user_logger.info(f'put file nodes into cache:{file_id}, count:{len(graph)}')
+        if len(graph) > self.capacity:
+            user_logger.warn(f'file nodes too much to put cache:{file_id}, count:{len(graph)}')
             return
 
         if file_id in self.cache:
             self.node_count -= len(self.cache[file_id])
 
-        node_map = {node.node_id: node for node in nodes}
-        self.cache[file_id] = node_map
-        self.node_count += len(nodes)
+        self.cache[file_id] = graph
+        self.node_count += len(graph)
         self.cache.move_to_end(file_id)
 
         # 如果节点数量超出容量限制，则删除最久未使用的文件
         while self.node_count > self.capacity:
-            oldest_file_id, oldest_nodes = self.cache.popitem(last=False)
+            oldest_file_id, oldest_graph = self.cache.popitem(last=False)
 
-            self.node_count -= len(oldest_nodes)
+            self.node_count -= len(oldest_graph)
 
     def remove(self, file_id: str):
         if file_id in self.cache:
             user_logger.info(f'remove file from cache : {file_id}')
-            removed_nodes = self.cache.pop(file_id)
-            self.node_count -= len(removed_nodes)
+            removed_graph = self.cache.pop(file_id)
+            self.node_count -= len(removed_graph)
 
     def __str__(self):
         return str(self.cache)
+
+
+class SharedNodeCache:
+    """
+    文件节点关系缓存，进程内lru + 可选的redis共享层
+    redis内保存序列化后的节点关系图，并为每个文件维护版本号
+    文件失效时版本号自增，其他worker读取时发现版本不一致即丢弃本地缓存
+    """
+    REDIS_KEY_PREFIX = 'bella_rag:node_graph:'
+    METRIC_KEY = 'node_graph_cache'
+
+    def __init__(self, capacity: int, redis_client: Optional[Redis] = None, ttl: int = 24 * 60 * 60):
+        self.capacity = capacity
+        self.local_cache = NodeLRUCache(capacity=capacity)
+        self.redis_client = redis_client
+        self.ttl = ttl
+        # 本地缓存的文件对应的版本号
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def file_cached(self, file_id: str) -> bool:
+        with self.lock:
+            return self.local_cache.file_cached(file_id)
+
+    def get(self, file_id: str, node_id: str):
+        return self.get_nodes(file_id, [node_id]).get(node_id)
+
+    def get_nodes(self, file_id: str, node_ids: List[str]) -> Dict[str, BaseNode]:
+        with self.lock:
+            graph = self.local_cache.get_graph(file_id)
+        if graph is None:
+            return {}
+        # 节点实例化在锁外进行
+        view = graph.view()
+        return {node_id: view.get(node_id) for node_id in node_ids if node_id in graph}
+
+    def load(self, file_ids: List[str]) -> Dict[str, int]:
+        """
+        校验文件的本地缓存版本，过期的本地缓存丢弃，本地未命中时从redis加载
+        返回各文件当前版本号，重建节点后随put写回，避免把失效前的数据写成新版本
+        """
+        if self.redis_client is None or not file_ids:
+            return {}
+        try:
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for file_id in file_ids:
+                    pipe.get(self._version_key(file_id))
+                    pipe.hmget(self._graph_key(file_id), 'version', 'graph')
+                results = pipe.execute()
+        except RedisError as e:
+            user_logger.warning(f'node graph cache redis load failed: {e}')
+            return {}
+
+        versions = {}
+        for i, file_id in enumerate(file_ids):
+            version = int(results[2 * i] or 0)
+            graph_version, graph = results[2 * i + 1]
+            versions[file_id] = version
+            with self.lock:
+                if self.local_cache.file_cached(file_id):
+                    if self.versions.get(file_id) == version:
+                        increment_counter_with_tag(self.METRIC_KEY, 'result', 'local_hit')
+                        continue
+                    # 其他worker已使该文件失效
+                    self._local_remove(file_id)
+
+            if graph and graph_version is not None and int(graph_version) == version:
+                compact_graph = CompactNodeGraph.loads(graph)
+                if compact_graph is not None:
+                    increment_counter_with_tag(self.METRIC_KEY, 'result', 'redis_hit')
+                    self._local_put(file_id, compact_graph, version)
+                    continue
+            increment_counter_with_tag(self.METRIC_KEY, 'result', 'miss')
+        return versions
+
+    def put(self, file_id: str, nodes: List[BaseNode], version: Optional[int] = None):
+        graph = CompactNodeGraph.from_nodes(nodes)
+        if len(graph) > self.capacity:
+            user_logger.warn(f'file nodes too much to put cache:{file_id}, count:{len(graph)}')
+            return
+        if self.redis_client is None:
+            self._local_put(file_id, graph, version)
+            return
+
+        try:
+            if version is None:
+                version = int(self.redis_client.get(self._version_key(file_id)) or 0)
+            graph_key = self._graph_key(file_id)
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(graph_key, mapping={'version': version, 'graph': graph.dumps()})
+                pipe.expire(graph_key, self.ttl)
+                pipe.execute()
+        except RedisError as e:
+            user_logger.warning(f'node graph cache redis put failed: {e}')
+        self._local_put(file_id, graph, version)
+
+    def remove(self, file_id: str):
+        """使文件缓存失效，通过版本号通知所有worker"""
+        self._local_remove(file_id)
+        if self.redis_client is None:
+            return
+        try:
+            version_key = self._version_key(file_id)
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.incr(version_key)
+                # 版本号比节点图多保留一个周期，过期前写入的旧节点图已先行过期
+                pipe.expire(version_key, 2 * self.ttl)
+                pipe.delete(self._graph_key(file_id))
+                pipe.execute()
+        except RedisError as e:
+            user_logger.warning(f'node graph cache redis invalidate failed: {e}')
+
+    def _local_put(self, file_id: str, graph: CompactNodeGraph, version: Optional[int]):
+        with self.lock:
+            self.local_cache.put_graph(file_id, graph)
+            self.versions[file_id] = version or 0
+            # 清理已被lru淘汰的文件版本号
+            if len(self.versions) > len(self.local_cache.cache):
+                self.versions = {k: v for k, v in self.versions.items() if k in self.local_cache.cache}
+
+    def _local_remove(self, file_id: str):
+        with self.lock:
+            self.local_cache.remove(file_id)
+            self.versions.pop(file_id, None)
+
+    def _version_key(self, file_id: str) -> str:
+        return f'{self.REDIS_KEY_PREFIX}version:{file_id}'
+
+    def _graph_key(self, file_id: str) -> str:
+        return f'{self.REDIS_KEY_PREFIX}graph:{file_id}'
+
+
+class QueryEmbeddingCache:
+    """
+    query向量缓存，进程内lru + 可选的redis共享层
+    key为(模型, 维数, 归一化后的query)，redis内以float32字节存储向量并设置过期时间
+    """
+    REDIS_KEY_PREFIX = 'bella_rag:query_embedding:'
+    METRIC_KEY = 'query_embedding_cache'
+
+    def __init__(self, capacity: int, redis_client: Optional[Redis] = None, ttl: int = 24 * 60 * 60):
+        self.capacity = capacity
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        # 合并空白字符，避免首尾空格、换行差异导致缓存失效
+        return ' '.join(query.split())
+
+    def get(self, model: str, dimension: int, query: str) -> Optional[List[float]]:
+        key = (model, dimension, self.normalize_query(query))
+        with self.lock:
+            embedding = self.cache.get(key)
+            if embedding is not None:
+                self.cache.move_to_end(key)
+        if embedding is not None:
+            increment_counter_with_tag(self.METRIC_KEY, 'result', 'local_hit')
+            return embedding
+
+        embedding = self._redis_get(key)
+        if embedding is not None:
+            increment_counter_with_tag(self.METRIC_KEY, 'result', 'redis_hit')
+            self._local_put(key, embedding)
+            return embedding
+
+        increment_counter_with_tag(self.METRIC_KEY, 'result', 'miss')
+        return None
+
+    def put(self, model: str, dimension: int, query: str, embedding: List[float]):
+        if not embedding:
+            return
+        key = (model, dimension, self.normalize_query(query))
+        self._local_put(key, embedding)
+        self._redis_put(key, embedding)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def _local_put(self, key: Tuple, embedding: List[float]):
+        with self.lock:
+            self.cache[key] = embedding
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.capacity:
+                self.cache.popitem(last=False)
+
+    def _redis_key(self, key: Tuple) -> str:
+        model, dimension, query = key
+        return f'{self.REDIS_KEY_PREFIX}{model}:{dimension}:{sha1(query.encode("utf-8")).hexdigest()}'
+
+    def _redis_get(self, key: Tuple) -> Optional[List[float]]:
+        if self.redis_client is None:
+            return None
+        try:
+            value = self.redis_client.get(self._redis_key(key))
+        except RedisError as e:
+            user_logger.warning(f'query embedding cache redis get failed: {e}')
+            return None
+        if not value:
+            return None
+        embedding = np.frombuffer(value, dtype=np.float32)
+        # 维数不一致说明是脏数据，直接忽略
+        if len(embedding) != key[1]:
+            return None
+        return embedding.tolist()
+
+    def _redis_put(self, key: Tuple, embedding: List[float]):
+        if self.redis_client is None:
+            return
+        try:
+            value = np.asarray(embedding, dtype=np.float32).tobytes()
+            self.redis_client.set(self._redis_key(key), value, ex=self.ttl)
+        except RedisError as e:
+            user_logger.warning(f'query embedding cache redis set failed: {e}')
+
+
+class ContentLRUCache:
+    """
+    按内容哈希缓存大模型处理结果（如检索内容压缩），进程内lru
+    key由调用方给出的全部输入计算sha1，输入不变即可复用结果
+    """
+
+    def __init__(self, capacity: int, metric_key: str):
+        self.capacity = capacity
+        self.metric_key = metric_key
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def content_key(*parts) -> str:
+        return sha1(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            value = self.cache.get(key)
+            if value is not None:
+                self.cache.move_to_end(key)
+        increment_counter_with_tag(self.metric_key, 'result', 'hit' if value is not None else 'miss')
+        return value
+
+    def put(self, key: str, value: str):
+        if not value:
+            return
+        with self.lock:
+            self.cache[key] = value
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.capacity:
+                self.cache.popitem(last=False)
+
+
+class FileVersions:
+    """
+    文件版本号，文件重建索引、重命名、元数据或切片变更、删除时自增
+    依赖文件内容的缓存将版本号作为key的一部分，版本变化即不再命中；版本号存于redis，所有worker共享
+    未配置redis（未开启依赖版本号的缓存）时不记录版本号，避免每次文件变更多一次redis往返
+    """
+    REDIS_KEY_PREFIX = 'bella_rag:file_version:'
+
+    def __init__(self, redis_client: Optional[Redis] = None, ttl: int = 24 * 60 * 60):
+        self.redis_client = redis_client
+        self.ttl = ttl
+
+    def bump(self, file_id: str):
+        if not file_id or self.redis_client is None:
+            return
+        try:
+            key = self._version_key(file_id)
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.incr(key)
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+        except RedisError as e:
+            user_logger.warning(f'file version bump failed: {file_id}, {e}')
+
+    def get_versions(self, file_ids: List[str]) -> Optional[List[int]]:
+        """查询失败时返回None，调用方应跳过缓存"""
+        if not file_ids:
+            return []
+        if self.redis_client is None:
+            return None
+        try:
+            values = self.redis_client.mget([self._version_key(file_id) for file_id in file_ids])
+        except RedisError as e:
+            user_logger.warning(f'file version get failed: {e}')
+            return None
+        return [int(value or 0) for value in values]
+
+    def _version_key(self, file_id: str) -> str:
+        return f'{self.REDIS_KEY_PREFIX}{file_id}'
+
+
+class RetrievalResultCache:
+    """
+    检索结果缓存，进程内lru + 可选的redis共享层，均按ttl过期
+    value为序列化后的检索结果，key由调用方计算（需包含文件版本号）
+    """
+    REDIS_KEY_PREFIX = 'bella_rag:retrieval:'
+    METRIC_KEY = 'retrieval_cache'
+
+    def __init__(self, capacity: int, ttl: int, redis_client: Optional[Redis] = None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.redis_client = redis_client
+        # key -> (过期时间, value)
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self.lock:
+            item = self.cache.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self.cache.move_to_end(key)
+                else:
+                    del self.cache[key]
+                    item = None
+        if item is not None:
+            increment_counter_with_tag(self.METRIC_KEY, 'result', 'local_hit')
+            return item[1]
+
+        value = self._redis_get(key)
+        if value is not None:
+            increment_counter_with_tag(self.METRIC_KEY, 'result', 'redis_hit')
+            self._local_put(key, value)
+            return value
+
+        increment_counter_with_tag(self.METRIC_KEY, 'result', 'miss')
+        return None
+
+    def put(self, key: str, value: bytes):
+        self._local_put(key, value)
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.set(self.REDIS_KEY_PREFIX + key, value, ex=self.ttl)
+        except RedisError as e:
+            user_logger.warning(f'retrieval cache redis set failed: {e}')
+
+    def _local_put(self, key: str, value: bytes):
+        with self.lock:
+            self.cache[key] = (time.time() + self.ttl, value)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.capacity:
+                self.cache.popitem(last=False)
+
+    def _redis_get(self, key: str) -> Optional[bytes]:
+        if self.redis_client is None:
+            return None
+        try:
+            return self.redis_client.get(self.REDIS_KEY_PREFIX + key)
+        except RedisError as e:
+            user_logger.warning(f'retrieval cache redis get failed: {e}')
+            return None
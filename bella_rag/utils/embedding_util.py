@@ -31,3 +31,14 @@ def compute_cosine_similarity(query_embedding: List[float], embedding: List[floa
     if not embedding:
         return 0
     return float(np.dot(query_embedding, embedding) / (norm(query_embedding) * norm(embedding)))
+
+
+def compute_cosine_similarities(query_embedding: List[float], embeddings: np.ndarray) -> np.ndarray:
+    """
+    批量余弦相似度计算，embeddings为按行排列的向量矩阵
+    """
+    if not len(embeddings):
+        return np.zeros(0)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norms = norm(embeddings, axis=1) * norm(query)
+    return np.divide(embeddings @ query, norms, out=np.zeros(len(embeddings), dtype=np.float32), where=norms > 0)
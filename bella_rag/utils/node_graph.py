@@ -0,0 +1,356 @@
+import functools
+import json
+import zlib
+from array import array
+from typing import List, Optional, Iterable, Dict, Callable, Tuple
+
+from bella_rag.schema.nodes import StructureNode, TextNode, TabelNode, ImageNode, DocumentNodeRelationship, QaNode, \
+    BaseNode, NodeWithScore
+
+# 序列化格式版本，格式变更时递增，旧数据直接视为未命中
+NODE_GRAPH_FORMAT = 2
+
+# 补全阶段产生的请求级关系，不进入缓存
+_SKIP_RELATIONSHIPS = {DocumentNodeRelationship.COMPLETE_GROUP, DocumentNodeRelationship.HEAD_CHILD}
+
+# 节点类型编码，下标即类型码
+_NODE_CLASSES = [TextNode, TabelNode, ImageNode]
+
+
+def _node_type(node: StructureNode) -> int:
+    if isinstance(node, TabelNode):
+        return 1
+    if isinstance(node, ImageNode):
+        return 2
+    return 0
+
+
+def _int_value(value: Optional[int]) -> int:
+    # 未设置的位置、token统一按字段默认值存储
+    return value if value is not None else -911
+
+
+def _related_nodes(value) -> List[StructureNode]:
+    values = value if isinstance(value, (list, set, tuple)) else [value]
+    return [n for n in values if isinstance(n, StructureNode)]
+
+
+def collect_graph_nodes(nodes: Iterable[StructureNode]) -> List[StructureNode]:
+    """收集节点及关系可达的全部节点（包括mock的表格父节点）"""
+    res = []
+    seen = set()
+    stack = list(reversed(list(nodes)))
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, StructureNode) or node.node_id in seen:
+            continue
+        seen.add(node.node_id)
+        res.append(node)
+        for relation, value in (node.doc_relationships or {}).items():
+            if relation not in _SKIP_RELATIONSHIPS:
+                stack.extend(_related_nodes(value))
+    return res
+
+
+class LazyRelationships(dict):
+    """
+    按需还原的节点关系，首次访问时才实例化关联节点
+    """
+
+    def __init__(self, resolver: Callable[[], Dict]):
+        super().__init__()
+        self._resolver = resolver
+
+    def _resolve(self):
+        if self._resolver is not None:
+            resolver, self._resolver = self._resolver, None
+            dict.update(self, resolver())
+
+    def __getitem__(self, key):
+        self._resolve()
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self._resolve()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._resolve()
+        dict.__delitem__(self, key)
+
+    def __contains__(self, key):
+        self._resolve()
+        return dict.__contains__(self, key)
+
+    def __iter__(self):
+        self._resolve()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._resolve()
+        return dict.__len__(self)
+
+    def __repr__(self):
+        self._resolve()
+        return dict.__repr__(self)
+
+    def get(self, key, default=None):
+        self._resolve()
+        return dict.get(self, key, default)
+
+    def keys(self):
+        self._resolve()
+        return dict.keys(self)
+
+    def values(self):
+        self._resolve()
+        return dict.values(self)
+
+    def items(self):
+        self._resolve()
+        return dict.items(self)
+
+    def pop(self, key, *args):
+        self._resolve()
+        return dict.pop(self, key, *args)
+
+    def setdefault(self, key, default=None):
+        self._resolve()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self._resolve()
+        dict.update(self, *args, **kwargs)
+
+    def copy(self):
+        self._resolve()
+        return dict(dict.items(self))
+
+
+class CompactNodeGraph:
+    """
+    数组存储的文档节点关系图，用于缓存rebuild_nodes_from_index的还原结果
+    节点以整数下标表示，属性按列存储
+    单值关系（父、前后、上下左右、上下文）为下标数组，-1表示无该关系
+    多值关系（子节点、上下文节点组）为CSR结构：offsets + targets，并用标记位区分空列表与无该关系
+    节点对象通过view按需实例化，缓存内不持有pydantic对象
+    """
+
+    def __init__(self, ids: List[str], types: array, texts: List[str], pos: array, tokens: array,
+                 orders: List[str], contexts: List[str], metadata: List[dict], mocks: set, images: Dict[int, list],
+                 single: Dict[DocumentNodeRelationship, array],
+                 multi: Dict[DocumentNodeRelationship, Tuple[array, array, bytearray]]):
+        self.ids = ids
+        self.index = {node_id: i for i, node_id in enumerate(ids)}
+        self.types = types
+        self.texts = texts
+        self.pos = pos
+        self.tokens = tokens
+        self.orders = orders
+        self.contexts = contexts
+        self.metadata = metadata
+        self.mocks = mocks
+        self.images = images
+        self.single = single
+        self.multi = multi
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id: str):
+        return node_id in self.index
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[StructureNode]) -> 'CompactNodeGraph':
+        graph_nodes = collect_graph_nodes(nodes)
+        size = len(graph_nodes)
+        index = {node.node_id: i for i, node in enumerate(graph_nodes)}
+
+        single = {}
+        multi_lists = {}
+        images = {}
+        for i, node in enumerate(graph_nodes):
+            if isinstance(node, ImageNode):
+                images[i] = [node.image_url, node.image_ocr_result]
+            for relation, value in (node.doc_relationships or {}).items():
+                if relation in _SKIP_RELATIONSHIPS:
+                    continue
+                targets = [index[n.node_id] for n in _related_nodes(value)]
+                if isinstance(value, (list, set, tuple)):
+                    multi_lists.setdefault(relation, [None] * size)[i] = targets
+                elif targets:
+                    single.setdefault(relation, array('i', [-1]) * size)[i] = targets[0]
+
+        return cls(ids=[node.node_id for node in graph_nodes],
+                   types=array('b', [_node_type(node) for node in graph_nodes]),
+                   texts=[node.text for node in graph_nodes],
+                   pos=array('i', [_int_value(node.pos) for node in graph_nodes]),
+                   tokens=array('i', [_int_value(node.token) for node in graph_nodes]),
+                   orders=[node.order_num_str for node in graph_nodes],
+                   contexts=[node.context_id for node in graph_nodes],
+                   metadata=[node.metadata for node in graph_nodes],
+                   mocks={i for i, node in enumerate(graph_nodes) if node.is_mock},
+                   images=images,
+                   single=single,
+                   multi={relation: cls._to_csr(lists) for relation, lists in multi_lists.items()})
+
+    @staticmethod
+    def _to_csr(lists: List[Optional[List[int]]]) -> Tuple[array, array, bytearray]:
+        offsets = array('i', [0])
+        targets = array('i')
+        present = bytearray(len(lists))
+        for i, items in enumerate(lists):
+            if items is not None:
+                present[i] = 1
+                targets.extend(items)
+            offsets.append(len(targets))
+        return offsets, targets, present
+
+    def dumps(self) -> bytes:
+        graph = {
+            'format': NODE_GRAPH_FORMAT,
+            'ids': self.ids,
+            'types': self.types.tolist(),
+            'texts': self.texts,
+            'pos': self.pos.tolist(),
+            'tokens': self.tokens.tolist(),
+            'orders': self.orders,
+            'contexts': self.contexts,
+            'metadata': self.metadata,
+            'mocks': sorted(self.mocks),
+            'images': {str(i): image for i, image in self.images.items()},
+            'single': {relation.value: targets.tolist() for relation, targets in self.single.items()},
+            'multi': {relation.value: [offsets.tolist(), targets.tolist(), list(present)]
+                      for relation, (offsets, targets, present) in self.multi.items()},
+        }
+        return zlib.compress(json.dumps(graph, ensure_ascii=False).encode('utf-8'))
+
+    @classmethod
+    def loads(cls, data: bytes) -> Optional['CompactNodeGraph']:
+        """反序列化节点关系图，格式不兼容时返回None"""
+        graph = json.loads(zlib.decompress(data).decode('utf-8'))
+        if graph.get('format') != NODE_GRAPH_FORMAT:
+            return None
+        return cls(ids=graph['ids'],
+                   types=array('b', graph['types']),
+                   texts=graph['texts'],
+                   pos=array('i', graph['pos']),
+                   tokens=array('i', graph['tokens']),
+                   orders=graph['orders'],
+                   contexts=graph['contexts'],
+                   metadata=graph['metadata'],
+                   mocks=set(graph['mocks']),
+                   images={int(i): image for i, image in graph['images'].items()},
+                   single={DocumentNodeRelationship(relation): array('i', targets)
+                           for relation, targets in graph['single'].items()},
+                   multi={DocumentNodeRelationship(relation): (array('i', offsets), array('i', targets),
+                                                              bytearray(present))
+                          for relation, (offsets, targets, present) in graph['multi'].items()})
+
+    def view(self) -> 'NodeGraphView':
+        return NodeGraphView(self)
+
+    def build_node(self, i: int, view: 'NodeGraphView') -> StructureNode:
+        kwargs = dict(id_=self.ids[i], text=self.texts[i], pos=self.pos[i], token=self.tokens[i],
+                      order_num_str=self.orders[i], context_id=self.contexts[i],
+                      metadata=dict(self.metadata[i] or {}), is_mock=i in self.mocks)
+        image = self.images.get(i)
+        if image:
+            kwargs.update(image_url=image[0], image_ocr_result=image[1])
+        node = _NODE_CLASSES[self.types[i]](**kwargs)
+        # 绕过pydantic赋值校验，避免关系字典被立即展开
+        object.__setattr__(node, 'doc_relationships',
+                           LazyRelationships(functools.partial(self.relationships, i, view)))
+        return node
+
+    def relationships(self, i: int, view: 'NodeGraphView') -> Dict[DocumentNodeRelationship, object]:
+        res = {}
+        for relation, targets in self.single.items():
+            if targets[i] >= 0:
+                res[relation] = view.node(targets[i])
+        for relation, (offsets, targets, present) in self.multi.items():
+            if present[i]:
+                res[relation] = [view.node(j) for j in targets[offsets[i]:offsets[i + 1]]]
+        return res
+
+
+class NodeGraphView:
+    """
+    节点关系图的请求级视图，同一视图内每个节点只实例化一次，关系在访问时才展开
+    补全过程对节点的修改只作用于当前视图，不会污染缓存
+    """
+
+    def __init__(self, graph: CompactNodeGraph):
+        self.graph = graph
+        self.nodes = {}
+
+    def node(self, i: int) -> StructureNode:
+        node = self.nodes.get(i)
+        if node is None:
+            node = self.graph.build_node(i, self)
+            self.nodes[i] = node
+        return node
+
+    def get(self, node_id: str) -> Optional[StructureNode]:
+        i = self.graph.index.get(node_id)
+        return self.node(i) if i is not None else None
+
+
+def dump_node_graph(nodes: Iterable[StructureNode]) -> bytes:
+    return CompactNodeGraph.from_nodes(nodes).dumps()
+
+
+def load_node_graph(data: bytes) -> Optional[List[StructureNode]]:
+    """反序列化并实例化全部节点，格式不兼容时返回None"""
+    graph = CompactNodeGraph.loads(data)
+    if graph is None:
+        return None
+    view = graph.view()
+    return [view.node(i) for i in range(len(graph))]
+
+
+# 检索结果快照支持的节点类型
+_SNAPSHOT_CLASSES = {cls.__name__: cls for cls in [TextNode, TabelNode, ImageNode, QaNode]}
+_SNAPSHOT_SCORES = {'score', 'similarity_score', 'rerank_score', 'es_score', 'pass_rerank'}
+
+
+def _node_snapshot(node: BaseNode) -> dict:
+    node_type = type(node).__name__
+    if node_type not in _SNAPSHOT_CLASSES:
+        raise ValueError(f'unsupported snapshot node type: {node_type}')
+    return {'type': node_type, 'data': node.dict(exclude={'embedding', 'relationships'})}
+
+
+def _load_node_snapshot(snapshot: dict) -> BaseNode:
+    return _SNAPSHOT_CLASSES[snapshot['type']](**snapshot['data'])
+
+
+def dump_score_nodes(score_nodes: List[NodeWithScore]) -> bytes:
+    """
+    检索结果快照：节点内容、各项分数及补全节点组，不含其他节点关系
+    用于跨进程共享后置处理完成的检索结果
+    """
+    items = []
+    for score_node in score_nodes:
+        node = score_node.node
+        group = node.get_complete_group_nodes() if isinstance(node, StructureNode) else []
+        items.append({'node': _node_snapshot(node),
+                      'scores': score_node.dict(include=_SNAPSHOT_SCORES),
+                      'complete_group': [_node_snapshot(n) for n in group]})
+    res = {'format': NODE_GRAPH_FORMAT, 'nodes': items}
+    return zlib.compress(json.dumps(res, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def load_score_nodes(data: bytes) -> Optional[List[NodeWithScore]]:
+    """反序列化检索结果快照，格式不兼容时返回None"""
+    res = json.loads(zlib.decompress(data).decode('utf-8'))
+    if res.get('format') != NODE_GRAPH_FORMAT:
+        return None
+    score_nodes = []
+    for item in res['nodes']:
+        node = _load_node_snapshot(item['node'])
+        if item['complete_group']:
+            node.doc_relationships = {DocumentNodeRelationship.COMPLETE_GROUP:
+                                      {_load_node_snapshot(n) for n in item['complete_group']}}
+        score_nodes.append(NodeWithScore(node=node, **item['scores']))
+    return score_nodes
@@ -2,21 +2,25 @@ import concurrent.futures
 import functools
 import re
 import uuid
-from typing import List, Union, Dict
+from typing import List, Union, Dict, Optional
 
+import redis
 from bella_openapi.entity.standard_domtree import StandardDomTree, StandardNode
 from llama_index.core.schema import BaseNode
 
+from common.tool.redis_tool import redis_pool
 from common.tool.vector_db_tool import query_all_by_source
 from init.settings import user_logger, CACHE
 from bella_rag.schema.nodes import NodeWithScore
 from bella_rag.schema.nodes import StructureNode, ImageNode, TabelNode, TextNode, DocumentNodeRelationship
 from bella_rag.schema.nodes import is_contextual_node
-from bella_rag.utils.cache_util import NodeLRUCache
+from bella_rag.utils.cache_util import SharedNodeCache
 from bella_rag.utils.trace_log_util import trace
 from bella_rag.vector_stores.index import FIELD_RELATIONSHIPS
 
-node_cache = NodeLRUCache(capacity=int(CACHE['CAPACITY']))
+node_cache = SharedNodeCache(capacity=int(CACHE['CAPACITY']),
+                             redis_client=redis.Redis(connection_pool=redis_pool) if CACHE['REDIS_ENABLE'] else None,
+                             ttl=CACHE['REDIS_TTL'])
 EMPTY_OCR_RESULT = '[图片OCR内容]\n无文字'
 
 
@@ -166,10 +170,10 @@ def build_table_relationships(matrix):
                 matrix[i][j + 1].doc_relationships[DocumentNodeRelationship.LEFT] = matrix[i][j]
 
 
-def query_and_rebuild_nodes(key, value, nodes):
+def query_and_rebuild_nodes(key, value, nodes, version: Optional[int] = None):
     # 读取文件下全部节点
     index_nodes = query_all_by_source(source_id=key)
-    rebuild_node_dic = rebuild_nodes_from_index(key, index_nodes=index_nodes, origin_nodes=value)
+    rebuild_node_dic = rebuild_nodes_from_index(key, index_nodes=index_nodes, origin_nodes=value, version=version)
 
     for i, node in enumerate(nodes):
         if node.node_id in rebuild_node_dic.keys():
@@ -191,14 +195,19 @@ def restore_relationships(nodes: List[NodeWithScore]):
             relation_nodes.append(node)
             relation_node_docs[source_id] = relation_nodes
 
+    # 校验缓存版本，本地未命中的文件尝试从共享缓存加载
+    versions = node_cache.load(list(relation_node_docs.keys()))
+
     # 从热点缓存中读取
     cached_keys = []
     for key, value in relation_node_docs.items():
         if node_cache.file_cached(file_id=key):
             user_logger.info(f'restore_relationships from cache : {key}')
+            # 同一文件的节点在同一视图内实例化，关联节点只构建一次
+            cache_nodes = node_cache.get_nodes(key, [node.node_id for node in nodes])
             for node in nodes:
                 metadata = node.metadata
-                cache_node = node_cache.get(key, node.node_id)
+                cache_node = cache_nodes.get(node.node_id)
                 if cache_node:
                     # 原始metadata信息赋值
                     cache_node.metadata = metadata
@@ -215,17 +224,18 @@ def restore_relationships(nodes: List[NodeWithScore]):
         with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(relation_node_docs.items()), 100)) as executor:
             for key, value in relation_node_docs.items():
                 user_logger.info(f'restore_relationships task : {key}')
-                futures.append(executor.submit(query_and_rebuild_nodes, key, value, nodes))
+                futures.append(executor.submit(query_and_rebuild_nodes, key, value, nodes, versions.get(key)))
 
     # 等待所有任务完成
     concurrent.futures.wait(futures)
 
 
 @trace(step="rebuild_nodes_from_index", log_enabled=False)
-def rebuild_nodes_from_index(source_id: str, index_nodes: List[BaseNode], origin_nodes: List[BaseNode]) -> Dict[
-    str, BaseNode]:
+def rebuild_nodes_from_index(source_id: str, index_nodes: List[BaseNode], origin_nodes: List[BaseNode],
+                             version: Optional[int] = None) -> Dict[str, BaseNode]:
     """
     从向量库索引内还原节点relation
+    version为读取索引前的缓存版本号，为空时以写入缓存时的版本为准
     """
     res = {}
     # 构建原始节点字典
@@ -332,7 +342,7 @@ def rebuild_nodes_from_index(source_id: str, index_nodes: List[BaseNode], origin
 
     # 还原节点加到缓存里
     user_logger.info(f'query_and_rebuild_node put node into cache : {source_id}, size : {len(index_nodes)}')
-    node_cache.put(source_id, [node for node in node_map.values()])
+    node_cache.put(source_id, [node for node in node_map.values()], version=version)
 
     return res
 
@@ -0,0 +1,138 @@
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Any, Dict
+
+from redis import Redis, RedisError
+
+from app.utils.metric_util import increment_counter_with_tag
+from init.settings import user_logger
+
+
+class _Call:
+    """进行中的一次执行，等待者共享其结果或异常"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    请求合并：相同key的并发调用只执行一次，其余调用等待并共享结果
+    进程内通过共享的进行中调用合并；配置redis后跨进程合并：
+    通过redis锁选出执行进程，结果短暂写入redis，其他进程轮询读取，锁释放仍无结果时自行执行
+    锁的值为本次执行的token，结果按token写入，等待者只读取当前执行的结果，不会读到上一次执行的残留结果
+    """
+    REDIS_KEY_PREFIX = 'bella_rag:single_flight:'
+
+    def __init__(self, name: str,
+                 redis_client: Optional[Redis] = None,
+                 dumps: Callable[[Any], bytes] = None,
+                 loads: Callable[[bytes], Any] = None,
+                 wait_timeout: float = 30,
+                 result_ttl: int = 5,
+                 poll_interval: float = 0.05):
+        self.name = name
+        self.metric_key = f'{name}_single_flight'
+        self.redis_client = redis_client
+        self.dumps = dumps
+        self.loads = loads
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.calls: Dict[str, _Call] = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+
+        if not leader:
+            if call.done.wait(self.wait_timeout):
+                increment_counter_with_tag(self.metric_key, 'result', 'local_shared')
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # 等待超时，不再等待执行者
+            user_logger.warning(f'single flight wait timeout: {self.name}, key: {key}')
+            return func()
+
+        try:
+            call.result = self._do_shared(key, func)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+
+    def _do_shared(self, key: str, func: Callable[[], Any]) -> Any:
+        if self.redis_client is None:
+            increment_counter_with_tag(self.metric_key, 'result', 'execute')
+            return func()
+
+        lock_key = f'{self.REDIS_KEY_PREFIX}{self.name}:lock:{key}'
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.redis_client.set(lock_key, token, nx=True, ex=max(int(self.wait_timeout), 1))
+        except RedisError as e:
+            user_logger.warning(f'single flight redis lock failed: {e}')
+            return func()
+
+        if acquired:
+            increment_counter_with_tag(self.metric_key, 'result', 'execute')
+            try:
+                result = func()
+                self._redis_put(self._result_key(key, token), result)
+                return result
+            finally:
+                self._redis_delete(lock_key)
+
+        # 其他进程执行中，按其token等待结果
+        deadline = time.time() + self.wait_timeout
+        token = None
+        try:
+            while time.time() < deadline:
+                # 先读锁再读结果，避免执行进程在两次读取之间完成导致漏读
+                running = self.redis_client.get(lock_key)
+                if running is not None:
+                    token = running.decode('utf-8') if isinstance(running, bytes) else str(running)
+                if token is not None:
+                    data = self.redis_client.get(self._result_key(key, token))
+                    # 反序列化返回None表示格式不兼容，按未命中处理
+                    result = self.loads(data) if data is not None else None
+                    if result is not None:
+                        increment_counter_with_tag(self.metric_key, 'result', 'redis_shared')
+                        return result
+                if running is None:
+                    # 执行进程已结束但未写入结果（执行失败），自行执行
+                    break
+                time.sleep(self.poll_interval)
+        except RedisError as e:
+            user_logger.warning(f'single flight redis get failed: {e}')
+
+        increment_counter_with_tag(self.metric_key, 'result', 'execute')
+        return func()
+
+    def _result_key(self, key: str, token: str) -> str:
+        return f'{self.REDIS_KEY_PREFIX}{self.name}:result:{key}:{token}'
+
+    def _redis_put(self, result_key: str, result: Any):
+        try:
+            self.redis_client.set(result_key, self.dumps(result), ex=self.result_ttl)
+        except Exception as e:
+            user_logger.warning(f'single flight redis set failed: {e}')
+
+    def _redis_delete(self, lock_key: str):
+        try:
+            self.redis_client.delete(lock_key)
+        except RedisError as e:
+            user_logger.warning(f'single flight redis delete failed: {e}')
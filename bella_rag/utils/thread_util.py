@@ -0,0 +1,22 @@
+import contextvars
+from typing import Callable
+
+from bella_rag.callbacks.manager import get_callbacks, init_callbacks, clear_callbacks
+
+
+def with_context(func: Callable) -> Callable:
+    """
+    捕获当前线程的contextvars上下文（trace、用户信息等）及回调配置，使函数提交到线程池后仍可使用
+    每次提交都需要单独包装，同一个上下文不能被多个线程同时进入
+    """
+    ctx = contextvars.copy_context()
+    callbacks = get_callbacks()
+
+    def wrapper(*args, **kwargs):
+        init_callbacks(callbacks)
+        try:
+            return ctx.run(func, *args, **kwargs)
+        finally:
+            clear_callbacks()
+
+    return wrapper
@@ -1,9 +1,16 @@
 from llama_index.vector_stores.tencentvectordb import CollectionParams
 from tcvectordb.model.enum import ReadConsistency
 
+from typing import Dict
+
 from init.settings import QDRANT_VECTOR_DB
 from init.settings import TENCENT_VECTOR_DB, user_logger
-from bella_rag.vector_stores.qdrant import QdrantVectorDB
+
+from qdrant_client import QdrantClient
+
+from bella_rag.vector_stores.index import VectorIndex
+from bella_rag.vector_stores.qdrant import QdrantVectorDB, AsyncQdrantClientPool, build_client_kwargs
+from bella_rag.vector_stores.sharding import ShardRouter
 from bella_rag.vector_stores.tencentvectordb import TencentVectorDB, FilterField
 
 
@@ -112,17 +119,25 @@ class QdrantStoreManager:
         """初始化Qdrant存储实例"""
         user_logger.info("Initializing Qdrant vector stores")
 
+        # 各集合共享同一组连接：同步客户端，以及按事件循环复用的异步客户端
+        client_kwargs = build_client_kwargs(
+            url=QDRANT_VECTOR_DB["URL"] if QDRANT_VECTOR_DB["URL"] else None,
+            host=QDRANT_VECTOR_DB["HOST"] if not QDRANT_VECTOR_DB["URL"] else None,
+            port=QDRANT_VECTOR_DB["PORT"] if not QDRANT_VECTOR_DB["URL"] else None,
+            grpc_port=QDRANT_VECTOR_DB["GRPC_PORT"],
+            prefer_grpc=QDRANT_VECTOR_DB["PREFER_GRPC"],
+            api_key=QDRANT_VECTOR_DB["API_KEY"] if QDRANT_VECTOR_DB["API_KEY"] else None,
+        )
+
         # 公共配置
         common_config = {
             'stores_text': False,
-            'url': QDRANT_VECTOR_DB["URL"] if QDRANT_VECTOR_DB["URL"] else None,
-            'host': QDRANT_VECTOR_DB["HOST"] if not QDRANT_VECTOR_DB["URL"] else None,
-            'port': QDRANT_VECTOR_DB["PORT"] if not QDRANT_VECTOR_DB["URL"] else None,
-            'grpc_port': QDRANT_VECTOR_DB["GRPC_PORT"],
-            'prefer_grpc': QDRANT_VECTOR_DB["PREFER_GRPC"],
-            'api_key': QDRANT_VECTOR_DB["API_KEY"] if QDRANT_VECTOR_DB["API_KEY"] else None,
             'vector_size': QDRANT_VECTOR_DB["DIMENSION"],
             'batch_size': 100,
+            'client': QdrantClient(**client_kwargs),
+            'aclient_pool': AsyncQdrantClientPool(**client_kwargs),
+            # 按租户分片读写，集合需先通过migrate_vector_shards迁移为custom分片方式
+            'shard_router': ShardRouter(QDRANT_VECTOR_DB["SHARD_NUM"]) if QDRANT_VECTOR_DB["SHARDING"] else None,
         }
 
         self._stores['chunk'] = QdrantVectorDB(
@@ -140,8 +155,26 @@ class QdrantStoreManager:
             **common_config
         )
 
+        if QDRANT_VECTOR_DB["SHARDING"]:
+            for store in self._stores.values():
+                try:
+                    store.check_sharding()
+                except Exception as e:
+                    user_logger.warning(f'check sharding failed: {store.collection_name}, error: {e}')
+
         user_logger.info(f"Qdrant stores initialized: {list(self._stores.keys())}")
 
+    def ensure_payload_indexes(self, indexes: Dict[str, VectorIndex]):
+        """按各集合的索引结构创建过滤字段的payload索引，失败不影响服务启动"""
+        for name, index in indexes.items():
+            store = self._stores.get(name)
+            if store is None:
+                continue
+            try:
+                store.ensure_payload_indexes(index)
+            except Exception as e:
+                user_logger.warning(f'ensure payload indexes failed: {store.collection_name}, error: {e}')
+
     def get_chunk_store(self) -> QdrantVectorDB:
         """获取文档块存储"""
         return self._stores['chunk']
@@ -1,8 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from llama_index.core.vector_stores import VectorStoreQuery, VectorStoreQueryResult
 
 from bella_rag.schema.nodes import BaseNode
 from bella_rag.transformations.index_extend.index_extend_transform_component import IndexExtendTransformComponent
+from bella_rag.utils.thread_util import with_context
 from bella_rag.vector_stores.index import VectorIndex
 from bella_rag.vector_stores.types import MetadataFilters
 
@@ -15,6 +19,9 @@ class BellaVectorStore(ABC):
     - 条件更新向量和元数据
     - 条件删除向量
     - 条件查询向量
+    - 多个查询批量检索
+    - 按批次遍历向量
+    - 按id读取已存储的向量
     - 文档到节点的转换
     """
 
@@ -22,14 +29,16 @@ class BellaVectorStore(ABC):
     def update_vector(
             self,
             metadata_filters: MetadataFilters,
-            document: Any
+            document: Any,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
     ) -> None:
         """
-        根据元数据过滤器更新向量
+        根据元数据过滤器更新向量，匹配的向量需全部更新
         
         Args:
             metadata_filters: 元数据过滤器，用于指定要更新的向量
             document: 要更新的文档数据
+            progress_callback: 进度回调，参数为(已更新数, 总数)
         """
         pass
 
@@ -90,6 +99,90 @@ class BellaVectorStore(ABC):
         """
         pass
 
+    def batch_query(
+            self,
+            queries: List[VectorStoreQuery],
+            index: Optional[VectorIndex] = None,
+            index_extend: Optional[IndexExtendTransformComponent] = None,
+            **kwargs: Any
+    ) -> List[VectorStoreQueryResult]:
+        """
+        多个查询批量检索，结果与查询一一对应
+        默认逐个查询，支持批量检索的存储应覆盖该方法，一次请求完成全部查询
+
+        Args:
+            queries: 查询列表
+            index: 向量索引配置
+            index_extend: 索引扩展组件
+            **kwargs: 其他查询参数
+
+        Returns:
+            List[VectorStoreQueryResult]: 各查询的检索结果
+        """
+        return [self.query(query, index=index, index_extend=index_extend, **kwargs) for query in queries]
+
+    def scan_by_filter(
+            self,
+            filter_condition: Optional[Any] = None,
+            batch_size: int = 5000,
+            index: Optional[VectorIndex] = None,
+            index_extend: Optional[IndexExtendTransformComponent] = None,
+            **kwargs: Any
+    ) -> Iterator[List[BaseNode]]:
+        """
+        按批次遍历过滤条件匹配的全部节点
+        索引扩展组件补全内容与下一批次的拉取并行执行
+
+        Args:
+            filter_condition: 过滤条件，支持MetadataFilters或原生filter类型
+            batch_size: 每批节点数
+            index: 向量索引配置
+            index_extend: 索引扩展组件
+            **kwargs: 其他查询参数
+
+        Returns:
+            Iterator[List[BaseNode]]: 节点批次
+        """
+        pages = self._scan_pages(filter_condition, batch_size, index, **kwargs)
+        if index_extend is None:
+            yield from pages
+            return
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='scan-hydrate') as executor:
+            pending = None
+            for nodes in pages:
+                future = executor.submit(with_context(index_extend.batch_set_node_contents), nodes)
+                if pending is not None:
+                    yield pending.result()
+                pending = future
+            if pending is not None:
+                yield pending.result()
+
+    def _scan_pages(
+            self,
+            filter_condition: Optional[Any],
+            batch_size: int,
+            index: Optional[VectorIndex] = None,
+            **kwargs: Any
+    ) -> Iterator[List[BaseNode]]:
+        """按offset翻页拉取未补全内容的节点，支持游标翻页的存储应覆盖该方法"""
+        offset = 0
+        while True:
+            nodes = self.query_by_filter(limit=batch_size, offset=offset, filter_condition=filter_condition,
+                                         index=index, **kwargs)
+            if nodes:
+                yield nodes
+            if len(nodes) < batch_size:
+                return
+            offset += len(nodes)
+
+    def get_embeddings(self, node_ids: List[str]) -> Dict[str, List[float]]:
+        """
+        按节点id读取已存储的向量，用于内容未变化的节点复用向量
+        默认不支持，返回空字典（调用方重新embedding）
+        """
+        return {}
+
     @abstractmethod
     def doc2node(
             self,
@@ -107,3 +200,23 @@ class BellaVectorStore(ABC):
             BaseNode: 转换后的节点对象
         """
         pass
+
+
+def set_batch_node_contents(results: List[VectorStoreQueryResult],
+                            index_extend: Optional[IndexExtendTransformComponent] = None
+                            ) -> List[VectorStoreQueryResult]:
+    """多个检索结果的节点内容一次补全，未找到内容的节点从对应结果中移除"""
+    if index_extend is None:
+        return results
+    nodes = [node for result in results for node in result.nodes]
+    if not nodes:
+        return results
+    hydrated = {id(node) for node in index_extend.batch_set_node_contents(nodes=nodes)}
+
+    filtered = []
+    for result in results:
+        keep = [i for i, node in enumerate(result.nodes) if id(node) in hydrated]
+        filtered.append(VectorStoreQueryResult(nodes=[result.nodes[i] for i in keep],
+                                               similarities=[result.similarities[i] for i in keep],
+                                               ids=[result.ids[i] for i in keep]))
+    return filtered
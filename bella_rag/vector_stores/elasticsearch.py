@@ -23,6 +23,8 @@ class ElasticsearchStore(BasePydanticVectorStore):
     index_name: str = "es_store"
     es_client: Any = None
     batch_size: int = 200
+    # 全文检索存储，写入时不需要节点embedding
+    requires_embedding: bool = False
 
     class Config:
         arbitrary_types_allowed = True
@@ -362,6 +364,7 @@ class EmptyElasticsearchStore(BasePydanticVectorStore):
 
     # Define Pydantic fields
     index_name: str = "es_store"
+    requires_embedding: bool = False
 
     class Config:
         arbitrary_types_allowed = True
@@ -1,10 +1,13 @@
-from typing import Union, List
+from typing import Union, List, Dict
 
 from llama_index.core.vector_stores.utils import DEFAULT_TEXT_KEY, DEFAULT_DOC_ID_KEY
 
 NODE_TYPE = "node_type"
 FIELD_RELATIONSHIPS = 'relationships'
 EXTRA = "extra"
+# payload索引类型
+PAYLOAD_KEYWORD = "keyword"
+PAYLOAD_INTEGER = "integer"
 
 class BaseIndex:
 
@@ -45,4 +48,9 @@ class VectorIndex(BaseIndex):
     @property
     def vector_key(self) -> Union[str, None]:
         """部分向量库内置该字段"""
-        return None
\ No newline at end of file
+        return None
+
+    def payload_index_schema(self) -> Dict[str, str]:
+        """需要建立payload索引的过滤字段及索引类型，默认为除文本、关系外的全部索引字段，按keyword索引"""
+        return {key: PAYLOAD_KEYWORD for key in self.index_keys()
+                if key and key not in (self.text_key, self.relationships_key)}
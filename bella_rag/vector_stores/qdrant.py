@@ -1,20 +1,28 @@
+import asyncio
 import json
+import threading
+import time
 import uuid
-from typing import Any, List, Optional
+import weakref
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from llama_index.core.vector_stores import VectorStoreQuery, VectorStoreQueryResult
 from llama_index.core.vector_stores.utils import DEFAULT_DOC_ID_KEY
 from llama_index.vector_stores.qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http.models import (
     Distance, PointStruct,
-    Filter, FieldCondition, MatchValue, MatchAny, MatchExcept
+    Filter, FieldCondition, MatchValue, MatchAny, MatchExcept, FilterSelector, QueryRequest, PayloadSchemaType,
+    ShardingMethod
 )
 
 from bella_rag.utils.trace_log_util import trace
 
 # Qdrant命名空间UUID，用于生成确定性的UUID
 QDRANT_NAMESPACE = uuid.UUID('12345678-1234-5678-1234-123456789abc')
+# qdrant建议的最大单次查询量
+MAX_SCROLL_LIMIT = 10000
 
 
 def string_to_uuid(text: str) -> str:
@@ -22,19 +30,61 @@ def string_to_uuid(text: str) -> str:
     return str(uuid.uuid5(QDRANT_NAMESPACE, text))
 
 
+def build_client_kwargs(url: Optional[str] = None, host: Optional[str] = "localhost", port: Optional[int] = 6333,
+                        grpc_port: Optional[int] = 6334, prefer_grpc: bool = False, https: Optional[bool] = None,
+                        api_key: Optional[str] = None, timeout: Optional[float] = None,
+                        path: Optional[str] = None, force_disable_check_same_thread: bool = True) -> dict:
+    """Qdrant客户端连接参数，同步与异步客户端共用；配置url时同样支持grpc"""
+    if path:
+        return {'path': path, 'force_disable_check_same_thread': force_disable_check_same_thread}
+    client_kwargs = {'grpc_port': grpc_port, 'prefer_grpc': prefer_grpc, 'https': https,
+                     'api_key': api_key, 'timeout': timeout}
+    if url:
+        client_kwargs['url'] = url
+    else:
+        client_kwargs.update(host=host, port=port)
+    return client_kwargs
+
+
+class AsyncQdrantClientPool:
+    """
+    AsyncQdrantClient按事件循环复用
+    grpc异步通道与创建时的事件循环绑定，不能跨事件循环使用；事件循环回收后对应客户端随之释放
+    """
+
+    def __init__(self, **client_kwargs: Any):
+        self.client_kwargs = client_kwargs
+        self.clients = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def get(self) -> AsyncQdrantClient:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            client = self.clients.get(loop)
+            if client is None:
+                client = AsyncQdrantClient(**self.client_kwargs)
+                self.clients[loop] = client
+        return client
+
+
 from init.settings import user_logger
 from bella_rag.meta.meta_data import NodeTypeEnum
 from bella_rag.schema.nodes import TextNode, QaNode, BaseNode, ImageNode, DocumentNodeRelationship
 from bella_rag.transformations.index_extend.index_extend_transform_component import IndexExtendTransformComponent
-from bella_rag.vector_stores.index import FIELD_RELATIONSHIPS, VectorIndex
+from bella_rag.vector_stores.index import FIELD_RELATIONSHIPS, VectorIndex, PAYLOAD_KEYWORD
 from bella_rag.vector_stores.types import FilterOperator, MetadataFilters, MetadataFilter
-from bella_rag.vector_stores.bella_vector_store import BellaVectorStore
+from bella_rag.vector_stores.bella_vector_store import BellaVectorStore, set_batch_node_contents
+from bella_rag.vector_stores.sharding import ShardRouter, SOURCE_ID_KEY
 
 
 class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
     """
     Qdrant向量数据库客户端
     """
+    # 支持一次请求完成多个查询
+    supports_batch_query: bool = True
+    # 检索涉及的分片key不在缓存中时从集群信息刷新，两次刷新的最小间隔（秒）
+    SHARD_KEYS_REFRESH_INTERVAL = 30
 
     def __init__(
             self,
@@ -52,37 +102,28 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
             path: Optional[str] = None,
             force_disable_check_same_thread: bool = True,
             batch_size: int = 100,
+            update_batch_size: int = 1000,
             vector_size: int = 1024,
             distance: Distance = Distance.COSINE,
+            client: Optional[QdrantClient] = None,
+            aclient_pool: Optional[AsyncQdrantClientPool] = None,
+            shard_router: Optional[ShardRouter] = None,
             **kwargs: Any,
     ):
         """
         初始化Qdrant客户端
+        多个集合可传入同一个client与aclient_pool共享连接
+        传入shard_router时按租户分片读写，集合需以custom分片方式创建
         """
-
+        client_kwargs = build_client_kwargs(url=url, host=host, port=port, grpc_port=grpc_port,
+                                            prefer_grpc=prefer_grpc, https=https, api_key=api_key, timeout=timeout,
+                                            path=path,
+                                            force_disable_check_same_thread=force_disable_check_same_thread)
         # 初始化Qdrant客户端
-        if url:
-            client = QdrantClient(
-                url=url,
-                api_key=api_key,
-                timeout=timeout,
-                https=https,
-            )
-        elif path:
-            client = QdrantClient(
-                path=path,
-                force_disable_check_same_thread=force_disable_check_same_thread,
-            )
-        else:
-            client = QdrantClient(
-                host=host,
-                port=port,
-                grpc_port=grpc_port,
-                prefer_grpc=prefer_grpc,
-                https=https,
-                api_key=api_key,
-                timeout=timeout,
-            )
+        if client is None:
+            client = QdrantClient(**client_kwargs)
+        if aclient_pool is None:
+            aclient_pool = AsyncQdrantClientPool(**client_kwargs)
 
         from init.settings import user_logger
 
@@ -94,9 +135,16 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
         )
 
         object.__setattr__(self, 'batch_size', batch_size)
+        object.__setattr__(self, 'update_batch_size', update_batch_size)
         object.__setattr__(self, 'vector_size', vector_size)
         object.__setattr__(self, 'distance', distance)
         object.__setattr__(self, '_collection_initialized', False)
+        object.__setattr__(self, '_aclient_pool', aclient_pool)
+        object.__setattr__(self, '_shard_router', shard_router)
+        # 已存在的分片key，写入时创建的key随之加入，检索时缺失则从集群信息刷新
+        object.__setattr__(self, '_shard_keys', set())
+        object.__setattr__(self, '_shard_keys_refreshed_at', None)
+        object.__setattr__(self, '_shard_keys_lock', threading.Lock())
 
         user_logger.info(f"Initialized QdrantVectorDB for collection: {self.collection_name}")
 
@@ -120,9 +168,107 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
         Returns:
             节点ID列表
         """
+        ids, points = self._build_points(nodes)
+        for shard_key, shard_points in self._group_points_by_shard(points).items():
+            if shard_key is not None and shard_key not in self._shard_keys:
+                self._create_shard_key(shard_key, self.client.create_shard_key)
+            # 批量插入
+            for i in range(0, len(shard_points), self.batch_size):
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=shard_points[i:i + self.batch_size],
+                    shard_key_selector=shard_key
+                )
+        return ids
+
+    async def aadd(
+            self,
+            nodes: List[BaseNode],
+            **add_kwargs: Any,
+    ) -> List[str]:
+        """异步添加节点到索引"""
+        ids, points = self._build_points(nodes)
+        aclient = self._aclient_pool.get()
+        for shard_key, shard_points in self._group_points_by_shard(points).items():
+            if shard_key is not None and shard_key not in self._shard_keys:
+                try:
+                    await aclient.create_shard_key(collection_name=self.collection_name, shard_key=shard_key)
+                except Exception as e:
+                    user_logger.info(f'create shard key skipped: {self.collection_name}.{shard_key}, {e}')
+                self._shard_keys.add(shard_key)
+            for i in range(0, len(shard_points), self.batch_size):
+                await aclient.upsert(
+                    collection_name=self.collection_name,
+                    points=shard_points[i:i + self.batch_size],
+                    shard_key_selector=shard_key
+                )
+        return ids
+
+    def _group_points_by_shard(self, points: List[PointStruct]) -> Dict[Optional[str], List[PointStruct]]:
+        """按分片key分组写入，未开启分片时全部归入None"""
+        if self._shard_router is None:
+            return {None: points}
+        groups = defaultdict(list)
+        for point in points:
+            groups[self._shard_router.shard_key(point.payload.get(SOURCE_ID_KEY))].append(point)
+        return groups
+
+    def _create_shard_key(self, shard_key: str, create: Callable[..., Any]):
+        """创建分片key，已存在时qdrant返回错误，忽略即可；真正失败时后续写入会报错"""
+        try:
+            create(collection_name=self.collection_name, shard_key=shard_key)
+        except Exception as e:
+            user_logger.info(f'create shard key skipped: {self.collection_name}.{shard_key}, {e}')
+        self._shard_keys.add(shard_key)
+
+    def _shard_key_selector(self, query: VectorStoreQuery, **kwargs: Any) -> Optional[List[str]]:
+        """
+        检索涉及的分片，无法确定文件范围或传入自定义过滤器时访问全部分片
+        只保留集合中已存在的分片key（文件未写入过数据时其分片可能不存在），无法确认时访问全部分片
+        """
+        if self._shard_router is None or isinstance(kwargs.get("filter"), Filter):
+            return None
+        shard_keys = self._shard_router.shard_keys_from_filters(query.doc_ids, query.filters)
+        if not shard_keys:
+            return None
+        if any(k not in self._shard_keys for k in shard_keys) and not self._refresh_shard_keys():
+            # 缓存可能落后于其他进程创建的分片，本次未能刷新时不做路由
+            return None
+        # 涉及的分片均不存在时文件都没有数据，访问全部分片由过滤条件返回空结果
+        return [k for k in shard_keys if k in self._shard_keys] or None
+
+    def _refresh_shard_keys(self) -> bool:
+        """从集群信息刷新已存在的分片key，距上次刷新不足间隔或刷新失败时返回False"""
+        with self._shard_keys_lock:
+            now = time.monotonic()
+            if (self._shard_keys_refreshed_at is not None
+                    and now - self._shard_keys_refreshed_at < self.SHARD_KEYS_REFRESH_INTERVAL):
+                return False
+            object.__setattr__(self, '_shard_keys_refreshed_at', now)
+        try:
+            info = self.client.collection_cluster_info(collection_name=self.collection_name)
+        except Exception as e:
+            user_logger.warning(f'refresh shard keys failed: {self.collection_name}, error: {e}')
+            return False
+        shards = list(info.local_shards or []) + list(info.remote_shards or [])
+        self._shard_keys.update(str(shard.shard_key) for shard in shards if shard.shard_key is not None)
+        return True
+
+    def check_sharding(self):
+        """开启分片但集合不是custom分片方式时关闭分片路由，避免写入失败"""
+        if self._shard_router is None:
+            return
+        params = self.client.get_collection(collection_name=self.collection_name).config.params
+        if params.sharding_method != ShardingMethod.CUSTOM:
+            user_logger.warning(f'collection {self.collection_name} is not custom sharded, shard routing disabled')
+            object.__setattr__(self, '_shard_router', None)
+            return
+        self._refresh_shard_keys()
+
+    @staticmethod
+    def _build_points(nodes: List[BaseNode]) -> Tuple[List[str], List[PointStruct]]:
         ids = []
         points = []
-
         for node in nodes:
             payload = node.metadata.copy() if node.metadata else {}
 
@@ -140,23 +286,33 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
             )
             points.append(point)
             ids.append(node.node_id)  # 返回原始ID
+        return ids, points
 
-            # 批量插入
-            if len(points) >= self.batch_size:
-                self.client.upsert(
+    def ensure_payload_indexes(self, index: VectorIndex) -> None:
+        """
+        为索引结构声明的过滤字段及original_node_id创建payload索引，可重复执行，已存在且类型一致的索引跳过
+        已存在但类型不一致（schema漂移）时只告警不重建，重建需在低峰期人工处理
+        """
+        schema = dict(index.payload_index_schema())
+        # 按原始node_id查询（query_by_ids）
+        schema['original_node_id'] = PAYLOAD_KEYWORD
+
+        existing = self.client.get_collection(collection_name=self.collection_name).payload_schema or {}
+        for field_name, field_type in schema.items():
+            current = existing.get(field_name)
+            if current is None:
+                self.client.create_payload_index(
                     collection_name=self.collection_name,
-                    points=points
+                    field_name=field_name,
+                    field_schema=PayloadSchemaType(field_type),
+                    wait=True
                 )
-                points = []
-
-        # 插入剩余的点
-        if points:
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=points
-            )
-
-        return ids
+                user_logger.info(f'created payload index: {self.collection_name}.{field_name} ({field_type})')
+                continue
+            current_type = getattr(current.data_type, 'value', current.data_type)
+            if current_type != field_type:
+                user_logger.warning(f'payload index schema drift: {self.collection_name}.{field_name}, '
+                                    f'expected {field_type}, actual {current_type}')
 
     def _metadata_filters_to_qdrant_filter(self, metadata_filters: MetadataFilters) -> Optional[Filter]:
         """将MetadataFilters转换为Qdrant Filter对象"""
@@ -185,7 +341,8 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
     def update_vector(
             self,
             metadata_filters: MetadataFilters,
-            document: Any
+            document: Any,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
     ) -> None:
         """
         更新向量 - 使用统一的MetadataFilters接口
@@ -193,97 +350,112 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
         Args:
             metadata_filters: 元数据过滤器，用于指定要更新的向量
             document: 文档对象，包含要更新的数据
+            progress_callback: 进度回调，参数为(已更新数, 总数)
         """
+        payload = self._build_update_payload(document)
+        # 如果没有有效的更新数据，直接返回
+        if not payload:
+            user_logger.warning("No valid data to update in document")
+            return
+
+        # 将MetadataFilters转换为Qdrant Filter
+        qdrant_filter = self._metadata_filters_to_qdrant_filter(metadata_filters)
+        if qdrant_filter is None:
+            user_logger.warning("No valid filter provided for update_vector")
+            return
+
         try:
-            # 构建更新的payload
-            payload = {}
-
-            # 从document.__dict__中提取数据（兼容rename_file的使用方式）
-            if hasattr(document, '__dict__'):
-                payload.update(document.__dict__)
-
-            # 从document中提取其他数据
-            if hasattr(document, 'extra') and document.extra:
-                payload['extra'] = document.extra
-            if hasattr(document, 'text') and document.text:
-                payload['text'] = document.text
-            if hasattr(document, 'metadata') and document.metadata:
-                payload.update(document.metadata)
-
-            # 移除不需要的字段
-            payload.pop('doc_id', None)
-            payload.pop('id_', None)
-
-            # 如果没有有效的更新数据，直接返回
-            if not payload:
-                user_logger.warning("No valid data to update in document")
-                return
+            self.set_payload_by_filter(qdrant_filter, payload, progress_callback)
+        except Exception as e:
+            user_logger.error(f"Failed to update vector: {e}")
+            raise
 
-            # 将MetadataFilters转换为Qdrant Filter
-            qdrant_filter = self._metadata_filters_to_qdrant_filter(metadata_filters)
+    def set_payload_by_filter(
+            self,
+            qdrant_filter: Filter,
+            payload: dict,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        基于过滤条件批量更新payload，只覆盖payload中出现的字段，返回更新的点数
+        匹配点数不超过一页时由服务端按filter一次更新，否则按id分页更新并上报进度
+        """
+        total = self.client.count(
+            collection_name=self.collection_name,
+            count_filter=qdrant_filter,
+            exact=True
+        ).count
+        if not total:
+            user_logger.warning(f"No points found to update with filter: {qdrant_filter}")
+            return 0
 
-            # 由于Qdrant不支持基于filter的批量更新，我们需要先查询再更新
-            user_logger.info(f"Updating vectors with filter: {qdrant_filter}")
-            user_logger.info(f"Update payload: {payload}")
+        user_logger.info(f"Updating {total} points with filter: {qdrant_filter}, payload: {payload}")
 
-            # 先查询匹配的点
-            scroll_result = self.client.scroll(
+        if total <= self.update_batch_size:
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload=payload,
+                points=FilterSelector(filter=qdrant_filter),
+                wait=True
+            )
+            self._report_update_progress(total, total, progress_callback)
+            return total
+
+        # 分页按id更新，scroll按id顺序翻页，更新过滤字段本身也不会漏点
+        updated = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
                 collection_name=self.collection_name,
                 scroll_filter=qdrant_filter,
-                limit=1000,  # 批量更新，一次处理1000个
-                with_payload=False,  # 只需要ID
+                limit=self.update_batch_size,
+                offset=offset,
+                with_payload=False,
                 with_vectors=False
             )
-
-            points_to_update = scroll_result[0]
-            if not points_to_update:
-                user_logger.warning(f"No points found to update with filter: {metadata_filters}")
-                return
-
-            user_logger.info(f"Found {len(points_to_update)} points to update")
-
-            # 批量更新点的payload
-            update_points = []
-            for point in points_to_update:
-                # 获取现有的payload
-                existing_point = self.client.retrieve(
+            if points:
+                self.client.set_payload(
                     collection_name=self.collection_name,
-                    ids=[point.id],
-                    with_payload=True,
-                    with_vectors=False
-                )[0]
-
-                # 合并更新的payload
-                updated_payload = existing_point.payload.copy() if existing_point.payload else {}
-                updated_payload.update(payload)
-
-                # 创建更新的点结构
-                from qdrant_client.http.models import PointStruct
-                update_points.append(PointStruct(
-                    id=point.id,
-                    payload=updated_payload
-                ))
-
-                # 批量处理
-                if len(update_points) >= self.batch_size:
-                    self.client.upsert(
-                        collection_name=self.collection_name,
-                        points=update_points
-                    )
-                    update_points = []
-
-            # 处理剩余的点
-            if update_points:
-                self.client.upsert(
-                    collection_name=self.collection_name,
-                    points=update_points
+                    payload=payload,
+                    points=[point.id for point in points],
+                    wait=True
                 )
-
-            user_logger.info(f"Successfully updated {len(points_to_update)} vectors")
-
-        except Exception as e:
-            user_logger.error(f"Failed to update vector: {e}")
-            raise
+                updated += len(points)
+                self._report_update_progress(updated, max(total, updated), progress_callback)
+            if not points or offset is None:
+                break
+        return updated
+
+    @staticmethod
+    def _report_update_progress(updated: int, total: int,
+                                progress_callback: Optional[Callable[[int, int], None]] = None):
+        user_logger.info(f"Update vector progress: {updated}/{total}")
+        if progress_callback:
+            progress_callback(updated, total)
+
+    @staticmethod
+    def _build_update_payload(document: Any) -> dict:
+        """从document中提取要更新的payload"""
+        payload = {}
+
+        # 从document.__dict__中提取数据（兼容rename_file的使用方式）
+        if hasattr(document, '__dict__'):
+            # llama Document只取动态设置的字段，避免模型默认字段（embedding、text等）覆盖原有payload
+            model_fields = getattr(type(document), '__fields__', {})
+            payload.update({k: v for k, v in document.__dict__.items() if k not in model_fields})
+
+        # 从document中提取其他数据
+        if hasattr(document, 'extra') and document.extra:
+            payload['extra'] = document.extra
+        if hasattr(document, 'text') and document.text:
+            payload['text'] = document.text
+        if hasattr(document, 'metadata') and document.metadata:
+            payload.update(document.metadata)
+
+        # 移除不需要的字段
+        payload.pop('doc_id', None)
+        payload.pop('id_', None)
+        return payload
 
     def update_field_by_filter(self, filter_key: str, filter_value: str, field_name: str, field_value: str) -> None:
         """
@@ -397,30 +569,80 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
             query_filter=query_filter,
             limit=query.similarity_top_k,
             with_payload=True,
-            with_vectors=kwargs.get("retrieve_vector", False)
+            with_vectors=kwargs.get("retrieve_vector", False),
+            shard_key_selector=self._shard_key_selector(query, **kwargs)
         )
 
-        if not search_result:
-            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        result = self._scored_points_to_result(search_result, index)
+        # 使用索引扩展组件设置节点内容
+        if index_extend is not None:
+            result.nodes = index_extend.batch_set_node_contents(nodes=result.nodes)
+        return result
 
-        # 转换结果
+    async def aquery(
+            self,
+            query: VectorStoreQuery,
+            index: VectorIndex,
+            index_extend: IndexExtendTransformComponent = None,
+            **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        """异步查询向量，使用与当前事件循环绑定的异步客户端"""
+        response = await self._aclient_pool.get().query_points(
+            collection_name=self.collection_name,
+            query=query.query_embedding,
+            query_filter=self._build_query_filter(query, **kwargs),
+            limit=query.similarity_top_k,
+            with_payload=True,
+            with_vectors=kwargs.get("retrieve_vector", False),
+            shard_key_selector=self._shard_key_selector(query, **kwargs)
+        )
+
+        result = self._scored_points_to_result(response.points, index)
+        if index_extend is not None:
+            result.nodes = await index_extend.async_batch_set_node_contents(nodes=result.nodes)
+        return result
+
+    def _scored_points_to_result(self, scored_points: List[Any],
+                                 index: Optional[VectorIndex] = None) -> VectorStoreQueryResult:
         nodes = []
         similarities = []
         ids = []
-
-        for i, scored_point in enumerate(search_result):
+        for scored_point in scored_points or []:
             # 使用原始node_id而不是UUID
-            original_node_id = scored_point.payload.get('original_node_id', str(scored_point.id))
-            ids.append(original_node_id)
+            ids.append(scored_point.payload.get('original_node_id', str(scored_point.id)))
             similarities.append(scored_point.score)
-            node = self._point_to_node(scored_point, index)
-            nodes.append(node)
+            nodes.append(self._point_to_node(scored_point, index))
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
 
-        # 使用索引扩展组件设置节点内容
-        if index_extend is not None:
-            nodes = index_extend.batch_set_node_contents(nodes=nodes)
+    @trace("vector_batch_query")
+    def batch_query(
+            self,
+            queries: List[VectorStoreQuery],
+            index: Optional[VectorIndex] = None,
+            index_extend: Optional[IndexExtendTransformComponent] = None,
+            **kwargs: Any
+    ) -> List[VectorStoreQueryResult]:
+        """多个查询通过query_batch_points一次请求完成，节点内容一次补全"""
+        if not queries:
+            return []
+        requests = [
+            QueryRequest(
+                query=query.query_embedding,
+                filter=self._build_query_filter(query, **kwargs),
+                limit=query.similarity_top_k,
+                with_payload=True,
+                with_vector=kwargs.get("retrieve_vector", False),
+                shard_key=self._shard_key_selector(query, **kwargs)
+            )
+            for query in queries
+        ]
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=requests
+        )
 
-        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
+        results = [self._scored_points_to_result(response.points, index) for response in responses]
+        return set_batch_node_contents(results, index_extend)
 
     def _build_query_filter(self, query: VectorStoreQuery, **kwargs: Any) -> Optional[Filter]:
         """构建查询过滤器"""
@@ -594,27 +816,10 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
             **kwargs: Any
     ) -> List[BaseNode]:
         """通过过滤器查询 - 支持 MetadataFilters 和原生 Filter"""
-        
-        # 智能转换过滤器类型
-        query_filter = filter_condition
-        if filter_condition and hasattr(filter_condition, 'filters'):
-            # 如果是 MetadataFilters 类型，转换为 Qdrant Filter
-            query_filter = self._metadata_filters_to_qdrant_filter(filter_condition)
-        if document_ids:
-            id_condition = FieldCondition(
-                key="id",
-                match=MatchValue(value=document_ids if len(document_ids) > 1 else document_ids[0])
-            )
-            if query_filter:
-                query_filter = Filter(
-                    must=[query_filter, id_condition]
-                )
-            else:
-                query_filter = Filter(must=[id_condition])
+        query_filter = self._build_scroll_filter(filter_condition, document_ids)
 
         # 安全的limit限制，避免内存问题
-        MAX_LIMIT = 10000  # qdrant建议的最大单次查询量
-        safe_limit = min(limit or 100, MAX_LIMIT)
+        safe_limit = min(limit or 100, MAX_SCROLL_LIMIT)
         
         # 兼容offset/limit分页：安全地跳过offset条记录
         if offset and offset > 0:
@@ -623,7 +828,7 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
             next_cursor = None
             
             while current_offset < offset:
-                skip_batch = min(offset - current_offset, MAX_LIMIT)
+                skip_batch = min(offset - current_offset, MAX_SCROLL_LIMIT)
                 skip_result = self.client.scroll(
                     collection_name=self.collection_name,
                     scroll_filter=query_filter,
@@ -679,6 +884,68 @@ class QdrantVectorDB(QdrantVectorStore, BellaVectorStore):
 
         return nodes
 
+    def _scan_pages(
+            self,
+            filter_condition: Optional[Any],
+            batch_size: int,
+            index: Optional[VectorIndex] = None,
+            **kwargs: Any
+    ) -> Iterator[List[BaseNode]]:
+        """scroll游标翻页，每页从上一页的next_page_offset继续，不重复扫描已读取的点"""
+        query_filter = self._build_scroll_filter(filter_condition, kwargs.get("document_ids"))
+        limit = min(batch_size, MAX_SCROLL_LIMIT)
+        cursor = None
+        while True:
+            points, cursor = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=query_filter,
+                limit=limit,
+                offset=cursor,
+                with_payload=True,
+                with_vectors=kwargs.get("with_vectors", False)
+            )
+            if points:
+                yield [self._point_to_node(point, index) for point in points]
+            if not points or cursor is None:
+                return
+
+    def _build_scroll_filter(self, filter_condition: Optional[Any] = None,
+                             document_ids: Optional[List] = None) -> Optional[Filter]:
+        # 智能转换过滤器类型
+        query_filter = filter_condition
+        if filter_condition and hasattr(filter_condition, 'filters'):
+            # 如果是 MetadataFilters 类型，转换为 Qdrant Filter
+            query_filter = self._metadata_filters_to_qdrant_filter(filter_condition)
+        if document_ids:
+            id_condition = FieldCondition(
+                key="id",
+                match=MatchValue(value=document_ids if len(document_ids) > 1 else document_ids[0])
+            )
+            if query_filter:
+                query_filter = Filter(
+                    must=[query_filter, id_condition]
+                )
+            else:
+                query_filter = Filter(must=[id_condition])
+        return query_filter
+
+    def get_embeddings(self, node_ids: List[str]) -> Dict[str, List[float]]:
+        """按原始node_id分批读取向量"""
+        embeddings = {}
+        for i in range(0, len(node_ids), self.batch_size):
+            batch = node_ids[i:i + self.batch_size]
+            points, _ = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(must=[FieldCondition(key="original_node_id", match=MatchAny(any=batch))]),
+                limit=len(batch),
+                with_payload=["original_node_id"],
+                with_vectors=True
+            )
+            for point in points:
+                if point.vector:
+                    embeddings[point.payload.get("original_node_id")] = point.vector
+        return embeddings
+
     def query_by_ids(self, ids: List[str], **kwargs) -> List[dict]:
         """根据ID查询文档"""
         from init.settings import user_logger
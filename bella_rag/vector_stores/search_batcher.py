@@ -0,0 +1,91 @@
+import threading
+from typing import Any, Dict, Hashable, List
+
+from llama_index.core.vector_stores import VectorStoreQuery, VectorStoreQueryResult
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+
+from app.utils.metric_util import increment_counter_with_tag
+
+
+def supports_batch_query(vector_store: BasePydanticVectorStore) -> bool:
+    """向量存储是否支持一次请求完成多个查询，未声明的存储默认不支持"""
+    return getattr(vector_store, 'supports_batch_query', False)
+
+
+class _Request:
+
+    def __init__(self, query: VectorStoreQuery):
+        self.query = query
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class _Batch:
+
+    def __init__(self):
+        self.requests: List[_Request] = []
+        self.full = threading.Event()
+
+
+class VectorSearchBatcher:
+    """
+    向量检索合并：时间窗口内对同一向量库、相同检索参数的并发查询合并为一次批量检索
+    首个查询作为执行者等待窗口结束（或批次已满）后统一提交，其余查询等待结果
+    """
+    METRIC_KEY = 'vector_search_batch'
+
+    def __init__(self, window: float, max_batch_size: int):
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self.batches: Dict[Hashable, _Batch] = {}
+        self.lock = threading.Lock()
+
+    def query(self, vector_store: BasePydanticVectorStore, query: VectorStoreQuery,
+              **kwargs: Any) -> VectorStoreQueryResult:
+        key = self._batch_key(vector_store, kwargs)
+        request = _Request(query)
+        with self.lock:
+            batch = self.batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self.batches[key] = batch
+            batch.requests.append(request)
+            if len(batch.requests) >= self.max_batch_size:
+                # 批次已满，后续查询进入新批次
+                self.batches.pop(key, None)
+                batch.full.set()
+
+        if not leader:
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+            return request.result
+
+        batch.full.wait(self.window)
+        with self.lock:
+            if self.batches.get(key) is batch:
+                self.batches.pop(key)
+            requests = list(batch.requests)
+
+        increment_counter_with_tag(self.METRIC_KEY, 'size', str(len(requests)))
+        try:
+            results = vector_store.batch_query([r.query for r in requests], **kwargs)
+            for r, result in zip(requests, results):
+                r.result = result
+        except Exception as e:
+            for r in requests:
+                r.error = e
+        finally:
+            for r in requests:
+                r.done.set()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    @staticmethod
+    def _batch_key(vector_store: BasePydanticVectorStore, kwargs: Dict[str, Any]) -> Hashable:
+        # 检索参数（索引结构、索引扩展组件等）为进程内单例，按对象标识区分
+        return (id(vector_store),) + tuple(sorted((name, id(value)) for name, value in kwargs.items()))
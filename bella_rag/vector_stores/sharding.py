@@ -0,0 +1,53 @@
+import zlib
+from typing import List, Optional
+
+from llama_index.core.vector_stores.types import FilterCondition
+
+from bella_rag.vector_stores.types import FilterOperator, MetadataFilter, MetadataFilters
+
+SOURCE_ID_KEY = 'source_id'
+DEFAULT_SPACE = 'default'
+
+
+class ShardRouter:
+    """
+    租户分片路由：按文件所属空间（file_id末段，如file-2503121724150021001365-960503137中的960503137）计算分片key
+    shard_num大于0时空间按哈希归入固定数量的分片，避免小空间过多导致分片数膨胀；为0时每个空间一个分片
+    同一空间的数据始终落在同一分片，检索时只访问涉及文件所在的分片
+    """
+
+    def __init__(self, shard_num: int = 0, prefix: str = 'space_'):
+        self.shard_num = shard_num
+        self.prefix = prefix
+
+    @staticmethod
+    def space_of(source_id: Optional[str]) -> str:
+        if not source_id:
+            return DEFAULT_SPACE
+        return str(source_id).rsplit('-', 1)[-1] or DEFAULT_SPACE
+
+    def shard_key(self, source_id: Optional[str]) -> str:
+        space = self.space_of(source_id)
+        if self.shard_num > 0:
+            return f'{self.prefix}{zlib.crc32(space.encode("utf-8")) % self.shard_num}'
+        return f'{self.prefix}{space}'
+
+    def shard_keys(self, source_ids: List[str]) -> List[str]:
+        return sorted({self.shard_key(source_id) for source_id in source_ids})
+
+    def shard_keys_from_filters(self, doc_ids: Optional[List[str]],
+                                metadata_filters: Optional[MetadataFilters]) -> Optional[List[str]]:
+        """
+        根据检索条件中的文件范围计算需要访问的分片，无法确定范围时返回None（访问全部分片）
+        与过滤条件的构建方式一致，只识别顶层AND条件中source_id的等于/IN过滤
+        """
+        if doc_ids:
+            return self.shard_keys(doc_ids)
+        if metadata_filters is None or metadata_filters.condition not in (None, FilterCondition.AND):
+            return None
+        for filter_obj in metadata_filters.filters:
+            if (isinstance(filter_obj, MetadataFilter) and filter_obj.key == SOURCE_ID_KEY
+                    and filter_obj.operator in (FilterOperator.EQ, FilterOperator.IN)):
+                values = filter_obj.value if isinstance(filter_obj.value, list) else [filter_obj.value]
+                return self.shard_keys([str(v) for v in values]) if values else None
+        return None
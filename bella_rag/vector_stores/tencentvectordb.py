@@ -1,5 +1,5 @@
 import json
-from typing import Any, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from llama_index.core.vector_stores import VectorStoreQuery, VectorStoreQueryResult
 from llama_index.core.vector_stores.utils import DEFAULT_DOC_ID_KEY, DEFAULT_TEXT_KEY
@@ -16,10 +16,12 @@ from bella_rag.transformations.index_extend.index_extend_transform_component imp
 from bella_rag.utils.trace_log_util import trace
 from bella_rag.vector_stores.index import FIELD_RELATIONSHIPS, VectorIndex
 from bella_rag.vector_stores.types import FilterOperator, MetadataFilters, MetadataFilter
-from bella_rag.vector_stores.bella_vector_store import BellaVectorStore
+from bella_rag.vector_stores.bella_vector_store import BellaVectorStore, set_batch_node_contents
 
 class TencentVectorDB(OriginalTencentVectorDB, BellaVectorStore):
     stores_text: bool
+    # 过滤条件及返回数量一致的多个查询可一次请求完成
+    supports_batch_query: bool = True
 
     def __init__(self, stores_text: bool = True, **kwargs: Any):
         self.stores_text = stores_text
@@ -45,22 +47,30 @@ class TencentVectorDB(OriginalTencentVectorDB, BellaVectorStore):
     def update_vector(
             self,
             metadata_filters: MetadataFilters,
-            document: Document
+            document: Document,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
     ) -> None:
         """
         更新向量 - 使用统一的MetadataFilters接口
+        腾讯向量库支持按filter服务端批量更新，一次请求即可完成
         
         Args:
             metadata_filters: 元数据过滤器，用于指定要更新的向量
             document: 文档对象，包含要更新的数据
+            progress_callback: 进度回调，参数为(已更新数, 总数)
         """
         # 将MetadataFilters转换为腾讯向量库Filter
         tencent_filter = self._build_tencent_filter_string(metadata_filters)
 
-        if tencent_filter:
-            self.collection.update(data=document, filter=tencent_filter)
-        else:
+        if not tencent_filter:
             user_logger.warning("No valid filter provided for update_vector")
+            return
+
+        res = self.collection.update(data=document, filter=tencent_filter)
+        affected = res.get('affectedCount', 0) if isinstance(res, dict) else 0
+        user_logger.info(f"Update vector progress: {affected}/{affected}")
+        if progress_callback:
+            progress_callback(affected, affected)
 
     def update_field_by_filter(self, filter_key: str, filter_value: str, field_name: str, field_value: str) -> None:
         """
@@ -162,6 +172,19 @@ class TencentVectorDB(OriginalTencentVectorDB, BellaVectorStore):
     def delete_documents(self, doc_ids: List[str]) -> None:
         self.collection.delete(document_ids=doc_ids)
 
+    def get_embeddings(self, node_ids: List[str]) -> Dict[str, List[float]]:
+        """按文档id分批读取向量"""
+        embeddings = {}
+        batch_size = 100
+        for i in range(0, len(node_ids), batch_size):
+            batch = node_ids[i:i + batch_size]
+            docs = self.collection.query(document_ids=batch, limit=len(batch), retrieve_vector=True,
+                                         output_fields=[FIELD_ID, FIELD_VECTOR])
+            for doc in docs:
+                if doc.get(FIELD_VECTOR):
+                    embeddings[doc.get(FIELD_ID)] = doc.get(FIELD_VECTOR)
+        return embeddings
+
     def delete_by_filter(self, metadata_filters: MetadataFilters) -> None:
         """
         通过元数据过滤器删除向量 - 使用统一的MetadataFilters接口
@@ -242,6 +265,36 @@ class TencentVectorDB(OriginalTencentVectorDB, BellaVectorStore):
 
         return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
 
+    @trace("vector_batch_query")
+    def batch_query(self, queries: List[VectorStoreQuery], index: Optional[VectorIndex] = None,
+                    index_extend: Optional[IndexExtendTransformComponent] = None,
+                    **kwargs: Any) -> List[VectorStoreQueryResult]:
+        """
+        过滤条件、返回数量一致的多个查询通过一次多向量检索完成，否则逐个查询
+        """
+        if len(queries) <= 1 or len({(repr(query.filters), repr(query.doc_ids), query.similarity_top_k,
+                                      repr(query.output_fields)) for query in queries}) > 1:
+            return super().batch_query(queries, index=index, index_extend=index_extend, **kwargs)
+
+        search_filter = self._to_vdb_filter(queries[0], **kwargs)
+        results = self.collection.search(
+            vectors=[query.query_embedding for query in queries],
+            limit=queries[0].similarity_top_k,
+            retrieve_vector=kwargs.get("retrieve_vector", False),
+            output_fields=queries[0].output_fields,
+            filter=search_filter,
+            params=SearchParam(ef=10000),
+            timeout=60
+        )
+
+        query_results = []
+        for i in range(len(queries)):
+            docs = results[i] if i < len(results) else []
+            query_results.append(VectorStoreQueryResult(nodes=[self.doc2node(doc, index) for doc in docs],
+                                                        similarities=[doc.get("score") for doc in docs],
+                                                        ids=[doc.get(FIELD_ID) for doc in docs]))
+        return set_batch_node_contents(query_results, index_extend)
+
     @staticmethod
     def _build_tencent_filter_string(filters: MetadataFilters) -> str:
         """
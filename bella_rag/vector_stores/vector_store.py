@@ -1,10 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Any
 
-from llama_index.core import StorageContext, VectorStoreIndex, Settings
+from llama_index.core import StorageContext, Settings
 from llama_index.core.base.embeddings.base import BaseEmbedding
-from llama_index.core.callbacks import CallbackManager
+from llama_index.core.indices.utils import embed_nodes
 from llama_index.core.ingestion import IngestionPipeline
-from llama_index.core.schema import TransformComponent, Document
+from llama_index.core.schema import TransformComponent, Document, BaseNode, MetadataMode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+
+from init.settings import user_logger
+from bella_rag.utils.thread_util import with_context
 
 
 class ManyVectorStoreIndex:
@@ -14,25 +19,84 @@ class ManyVectorStoreIndex:
             documents: Optional[List[Document]] = None,
             storage_context: Optional[StorageContext] = None,
             show_progress: bool = False,
-            callback_manager: Optional[CallbackManager] = None,
             transformations: Optional[List[TransformComponent]] = None,
             embed_model: BaseEmbedding = None,
             insert_batch_size: int = 2048,
             **kwargs: Any
     ):
-        if callback_manager is None:
-            callback_manager = Settings.callback_manager
-
         pipeline = IngestionPipeline(transformations=transformations)
         nodes = pipeline.run(documents=documents, show_progress=show_progress, **kwargs)
 
         vector_stores = storage_context.vector_stores.values() if storage_context.vector_stores else [
             storage_context.vector_store]
 
-        for vector_store in vector_stores:
-            VectorStoreIndex(nodes=nodes,
-                             show_progress=show_progress,
-                             embed_model=embed_model,
-                             storage_context=StorageContext.from_defaults(vector_store=vector_store),
-                             callback_manager=callback_manager,
-                             insert_batch_size=insert_batch_size)
+        ManyVectorStoreIndex.add_nodes(nodes=nodes,
+                                       vector_stores=list(vector_stores),
+                                       embed_model=embed_model,
+                                       show_progress=show_progress,
+                                       insert_batch_size=insert_batch_size)
+
+    @staticmethod
+    def add_nodes(
+            nodes: List[BaseNode],
+            vector_stores: List[BasePydanticVectorStore],
+            embed_model: Optional[BaseEmbedding] = None,
+            show_progress: bool = False,
+            insert_batch_size: int = 2048,
+    ):
+        """
+        节点只做一次embedding，再并行写入所有向量存储
+        不需要向量的存储（如es）不触发embedding；写入的是带向量的节点副本，不修改传入的节点
+        """
+        if not nodes or not vector_stores:
+            return
+
+        if any(requires_embedding(store) for store in vector_stores):
+            embed_model = embed_model or Settings.embed_model
+        else:
+            embed_model = None
+        nodes = _nodes_with_embedding(nodes, embed_model, show_progress=show_progress)
+
+        if len(vector_stores) == 1:
+            _add_nodes_to_store(vector_stores[0], nodes, insert_batch_size)
+            return
+
+        with ThreadPoolExecutor(max_workers=len(vector_stores)) as executor:
+            futures = [executor.submit(with_context(_add_nodes_to_store), store, nodes, insert_batch_size)
+                       for store in vector_stores]
+        # 任一存储写入失败则抛出异常
+        for future in futures:
+            future.result()
+
+
+def requires_embedding(vector_store: BasePydanticVectorStore) -> bool:
+    """向量存储是否依赖节点的embedding，未声明的存储默认需要"""
+    return getattr(vector_store, 'requires_embedding', True)
+
+
+def _nodes_with_embedding(nodes: List[BaseNode], embed_model: Optional[BaseEmbedding],
+                          show_progress: bool = False) -> List[BaseNode]:
+    """
+    与VectorStoreIndex一致跳过无内容节点，返回带embedding的节点副本
+    已有embedding的节点不重复计算；embed_model为None时只过滤
+    """
+    content_nodes = [node for node in nodes if node.get_content(metadata_mode=MetadataMode.EMBED) != ""]
+    if len(content_nodes) != len(nodes):
+        user_logger.info(f'skip nodes without content : {len(nodes) - len(content_nodes)}')
+    if embed_model is None:
+        return content_nodes
+
+    id_to_embed_map = embed_nodes(content_nodes, embed_model, show_progress=show_progress)
+    results = []
+    for node in content_nodes:
+        result = node.copy()
+        result.embedding = id_to_embed_map[node.node_id]
+        results.append(result)
+    return results
+
+
+def _add_nodes_to_store(vector_store: BasePydanticVectorStore, nodes: List[BaseNode], insert_batch_size: int):
+    user_logger.info(f'add nodes to vector store : {type(vector_store).__name__}, size : {len(nodes)}')
+    for i in range(0, len(nodes), insert_batch_size):
+        vector_store.add(nodes[i:i + insert_batch_size])
+
@@ -1,9 +1,11 @@
 import json
 import threading
 import time
-from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Dict, List, Optional
 
-from confluent_kafka import Producer, KafkaError, Consumer
+from confluent_kafka import Producer, KafkaError, Consumer, TopicPartition
 
 from common.helper.exception import BusinessError
 from common.tool.inspect_util import has_parameter
@@ -16,23 +18,53 @@ DEFAULT_ERR_RETRY_MAX = 3
 # 默认重试间隔，0没有间隔
 DEFAULT_RETRY_INTERVAL = 0
 
+# 生产者默认批量发送等待时间（毫秒）
+DEFAULT_LINGER_MS = 20
+# 生产者单批最大消息数
+DEFAULT_BATCH_NUM_MESSAGES = 1000
+# 生产者本地缓冲最大消息数，缓冲满时发送方阻塞
+DEFAULT_BUFFER_MAX_MESSAGES = 100000
+# 发送等待超时时间（秒）
+DEFAULT_SEND_TIMEOUT = 30
+
+# 在途offset状态：执行中、已完成
+_OFFSET_RUNNING = 0
+_OFFSET_DONE = 1
+
 
 class KafkaProducer:
-    def __init__(self, bootstrap_servers, topic):
+    """
+    消息先进入本地缓冲，按linger.ms/batch.num.messages批量发送，后台线程处理发送回调
+    """
+
+    def __init__(self, bootstrap_servers, topic,
+                 linger_ms=DEFAULT_LINGER_MS,
+                 batch_num_messages=DEFAULT_BATCH_NUM_MESSAGES,
+                 buffer_max_messages=DEFAULT_BUFFER_MAX_MESSAGES):
         self.producer = Producer(
             {
                 'bootstrap.servers': bootstrap_servers,
                 'acks': 'all',
                 'retries': 9,
                 'retry.backoff.ms': 1000,
+                'linger.ms': linger_ms,
+                'batch.num.messages': batch_num_messages,
+                'queue.buffering.max.messages': buffer_max_messages,
             }
         )
         self._topic = topic
+        self.__closed = threading.Event()
+        self.__poll_thread = threading.Thread(target=self.__poll_loop, name=f'kafka-producer-{topic}', daemon=True)
+        self.__poll_thread.start()
 
     @property
     def topic(self):
         return self._topic
 
+    def __poll_loop(self):
+        while not self.__closed.is_set():
+            self.producer.poll(0.1)
+
     def __delivery_report(self, future, err, msg):
         if err is not None:
             future.set_result(False)
@@ -42,12 +74,91 @@ class KafkaProducer:
                         msg.value().decode("utf-8"))
             future.set_result(True)
 
-    def sync_send_message(self, message) -> bool:
+    def send_message(self, message, timeout=DEFAULT_SEND_TIMEOUT) -> Future:
+        """
+        异步发送，返回发送结果的future（True为发送成功）
+        本地缓冲满时阻塞等待后台线程发送，超时抛出BufferError
+        """
         future = Future()
-        self.producer.produce(topic=self._topic, value=message,
-                              callback=lambda err, msg: self.__delivery_report(future, err, msg))
-        self.producer.flush()
-        return future.result()  # 等待结果
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.producer.produce(topic=self._topic, value=message,
+                                      callback=lambda err, msg: self.__delivery_report(future, err, msg))
+                return future
+            except BufferError:
+                if time.monotonic() >= deadline:
+                    logger.error("producer buffer full topic: [%s] message: %s", self._topic, message)
+                    raise
+                time.sleep(0.05)
+
+    def sync_send_message(self, message, timeout=DEFAULT_SEND_TIMEOUT) -> bool:
+        try:
+            return self.send_message(message, timeout).result(timeout)  # 等待结果
+        except (BufferError, TimeoutError):
+            logger.error("sync send message timeout topic: [%s] message: %s", self._topic, message)
+            return False
+
+    def close(self, timeout=DEFAULT_SEND_TIMEOUT) -> int:
+        """发送完本地缓冲中的消息后停止后台线程，返回未发送完成的消息数"""
+        if self.__closed.is_set():
+            return 0
+        remaining = self.producer.flush(timeout)
+        self.__closed.set()
+        if remaining:
+            logger.error("producer close with %s messages unsent topic: [%s]", remaining, self._topic)
+        return remaining
+
+
+class OffsetTracker:
+    """
+    按分区跟踪在途消息的offset，只有连续完成的前缀可以提交
+    处理失败的消息与逐条消费一致记录日志后视为完成，不阻塞所在分区的提交
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # partition -> {offset: 状态}，offset按拉取顺序递增
+        self.partitions: Dict[int, OrderedDict] = {}
+        self.running = 0
+
+    def add(self, partition: int, offset: int):
+        with self.lock:
+            self.partitions.setdefault(partition, OrderedDict())[offset] = _OFFSET_RUNNING
+            self.running += 1
+
+    def done(self, partition: int, offset: int):
+        with self.lock:
+            offsets = self.partitions.get(partition)
+            # 分区已被回收的消息直接忽略
+            if offsets is None or offsets.get(offset) != _OFFSET_RUNNING:
+                return
+            offsets[offset] = _OFFSET_DONE
+            self.running -= 1
+
+    def pop_committable(self, partitions: Optional[List[int]] = None) -> Dict[int, int]:
+        """返回各分区可提交的offset（已完成前缀的下一个位置）"""
+        res = {}
+        with self.lock:
+            for partition, offsets in self.partitions.items():
+                if partitions is not None and partition not in partitions:
+                    continue
+                last = None
+                while offsets:
+                    offset, state = next(iter(offsets.items()))
+                    if state != _OFFSET_DONE:
+                        break
+                    offsets.popitem(last=False)
+                    last = offset
+                if last is not None:
+                    res[partition] = last + 1
+        return res
+
+    def remove(self, partitions: List[int]):
+        with self.lock:
+            for partition in partitions:
+                offsets = self.partitions.pop(partition, None) or {}
+                self.running -= sum(1 for state in offsets.values() if state == _OFFSET_RUNNING)
 
 
 class KafkaConsumer:
@@ -61,6 +172,8 @@ class KafkaConsumer:
                  # callback_timeout + err_retry_max 需小于 retry_interval！防止重平衡
                  err_retry_max=DEFAULT_ERR_RETRY_MAX,
                  retry_interval=DEFAULT_RETRY_INTERVAL,
+                 # 并发消费的消息数，1为逐条消费
+                 concurrency=1,
                  **kwargs):
         base_conf = {
             'bootstrap.servers': bootstrap_servers,
@@ -73,80 +186,33 @@ class KafkaConsumer:
         self.consumer = Consumer(base_conf)
         self.topic = topic
         self.group_id = group_id
-        self.consumer.subscribe([self.topic])
         self.callback = callback
         self.err_retry_max = err_retry_max
         self.retry_interval = retry_interval
         self.__closed = False
+        self.__paused = False
         self.lock = threading.Lock()
         self.callback_timeout = callback_timeout
         self.producer = producer
+        self.concurrency = max(int(concurrency or 1), 1)
+        self.offset_tracker = OffsetTracker()
+        self.dispatch_executor = None
+        if self.concurrency > 1:
+            self.dispatch_executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                        thread_name_prefix=f'kafka-{topic}')
+            self.consumer.subscribe([self.topic], on_assign=self._on_assign, on_revoke=self._on_revoke)
+        else:
+            self.consumer.subscribe([self.topic])
 
     def consume_messages(self):
         """
         三次重试，失败后打印错误日志，研发查看原因，手动补偿
         """
         try:
-            while True:
-                with self.lock:
-                    if self.__closed:
-                        break
-                    msg = self.consumer.poll(1.0)
-                if msg is None:
-                    continue
-                if msg.error():
-                    if msg.error().code() == KafkaError._PARTITION_EOF:
-                        logger.info("consume_messages PARTITION_EOF topic=%s partition=%s code=%s ",
-                                    self.topic, msg.partition(), msg.error().code())
-                    else:
-                        logger.error("consume_messages error topic=%s partition=%s code=%s message: %s",
-                                     self.topic, msg.partition(), msg.error().code(),
-                                     msg.value().decode("utf-8") if msg.value() else "None")
-                else:
-                    message_value = msg.value().decode("utf-8")
-                    logger.info("Received topic: [%s] partition:[%s] message: %s",
-                                self.topic, msg.partition(), message_value)
-                    payload: dict = json.loads(message_value)
-                    err_cnt = payload.get('reconsume_times', 0)
-                    try:
-                        # 传递重试次数，仿照rocketMQ，取名，各自回调视情况需要接收
-                        kwargs = {}
-                        if has_parameter(self.callback, "reconsume_times"):
-                            kwargs["reconsume_times"] = err_cnt
-
-                        if self.run_callback(payload, **kwargs):
-                            # 手动提交偏移量
-                            self.consumer.commit(msg)
-                            logger.info("consumer topic: [%s] partition:[%s] message: %s 消费成功",
-                                        self.topic, msg.partition(), message_value)
-                        else:
-                            err_cnt += 1
-                            logger.info("consumer topic: [%s] partition:[%s] message: %s  retry=%s",
-                                        self.topic, msg.partition(), message_value, err_cnt)
-
-                    except BusinessError as e:
-                        err_cnt += 1
-                        logger.error("业务异常consumer  topic: [%s] partition:[%s] message: %s  retry=%s",
-                                    self.topic, msg.partition(), message_value, err_cnt, exc_info=True)
-                        # 如果是0则不会引入任何延迟
-                        time.sleep(self.retry_interval)
-                    except Exception as e:
-                        err_cnt += 1
-                        logger.error("非业务异常需要关注 consumer  topic: [%s] partition:[%s] message: %s  retry=%s",
-                                    self.topic, msg.partition(), message_value, err_cnt, exc_info=True)
-                        # 如果是0则不会引入任何延迟
-                        time.sleep(self.retry_interval)
-
-                    if err_cnt >= self.err_retry_max:
-                        logger.error("consumer fail topic: [%s] partition:[%s] 需要研发关注是否需要补偿: %s",
-                                     self.topic, msg.partition(), message_value)
-                        self.consumer.commit(msg)
-                    elif payload.get('reconsume_times', 0) != err_cnt:
-                        # 本次消费执行失败，重新发送kafka消息
-                        payload.update({'reconsume_times': err_cnt})
-                        self.reconsume_messages(json.dumps(payload))
-                        self.consumer.commit(msg)
-
+            if self.concurrency > 1:
+                self._consume_concurrently()
+            else:
+                self._consume_serially()
         except KeyboardInterrupt:
             logger.error("用户中断")
         except KafkaError as e:
@@ -157,10 +223,135 @@ class KafkaConsumer:
             else:
                 logger.error("Exception 错误: topic: [%s] error: %s", self.topic, e)
         finally:
+            if self.dispatch_executor:
+                self.dispatch_executor.shutdown(wait=False)
             if not self.__closed:
                 logger.info("workers topic = %s final close", self.topic)
                 self.consumer.close()
 
+    def _consume_serially(self):
+        while True:
+            with self.lock:
+                if self.__closed:
+                    break
+                msg = self.consumer.poll(1.0)
+            if msg is None or not self._check_message(msg):
+                continue
+            self._process_message(msg)
+            self.consumer.commit(msg)
+
+    def _consume_concurrently(self):
+        """
+        消息分发到有界线程池并发执行，按分区只提交连续完成的offset前缀，保证至少一次消费
+        在途消息达到并发上限时暂停拉取，poll持续进行，避免长任务触发max.poll.interval重平衡
+        """
+        while True:
+            with self.lock:
+                if self.__closed:
+                    break
+                self._commit_completed()
+                self._apply_backpressure()
+                msg = self.consumer.poll(1.0)
+            if msg is None or not self._check_message(msg):
+                continue
+            self.offset_tracker.add(msg.partition(), msg.offset())
+            self.dispatch_executor.submit(self._dispatch_message, msg)
+
+    def _dispatch_message(self, msg):
+        try:
+            self._process_message(msg)
+        except Exception:
+            # 消息格式错误、重投失败等异常与逐条消费一致只记录日志，offset照常提交，避免阻塞分区
+            logger.error("consumer fail topic: [%s] partition:[%s] offset:[%s] 需要研发关注是否需要补偿: %s",
+                         self.topic, msg.partition(), msg.offset(),
+                         msg.value().decode("utf-8") if msg.value() else "None", exc_info=True)
+        finally:
+            self.offset_tracker.done(msg.partition(), msg.offset())
+
+    def _commit_completed(self, partitions: Optional[List[int]] = None):
+        offsets = self.offset_tracker.pop_committable(partitions)
+        if offsets:
+            self.consumer.commit(offsets=[TopicPartition(self.topic, partition, offset)
+                                          for partition, offset in offsets.items()], asynchronous=False)
+
+    def _apply_backpressure(self):
+        running = self.offset_tracker.running
+        if running >= self.concurrency and not self.__paused:
+            self.consumer.pause(self.consumer.assignment())
+            self.__paused = True
+            logger.info("consumer topic: [%s] pause, running: %s", self.topic, running)
+        elif running < self.concurrency and self.__paused:
+            self.consumer.resume(self.consumer.assignment())
+            self.__paused = False
+
+    def _on_assign(self, consumer, partitions):
+        # 新分配的分区未被暂停，下一轮重新判断
+        self.__paused = False
+
+    def _on_revoke(self, consumer, partitions):
+        revoked = [p.partition for p in partitions]
+        try:
+            self._commit_completed(revoked)
+        except Exception as e:
+            logger.error("consumer topic: [%s] commit on revoke error: %s", self.topic, e)
+        # 回收分区的在途消息由新的消费者重新消费
+        self.offset_tracker.remove(revoked)
+        self.__paused = False
+
+    def _check_message(self, msg) -> bool:
+        if not msg.error():
+            return True
+        if msg.error().code() == KafkaError._PARTITION_EOF:
+            logger.info("consume_messages PARTITION_EOF topic=%s partition=%s code=%s ",
+                        self.topic, msg.partition(), msg.error().code())
+        else:
+            logger.error("consume_messages error topic=%s partition=%s code=%s message: %s",
+                         self.topic, msg.partition(), msg.error().code(),
+                         msg.value().decode("utf-8") if msg.value() else "None")
+        return False
+
+    def _process_message(self, msg):
+        """执行回调，失败时按重试次数重投或放弃，正常返回后即可提交offset"""
+        message_value = msg.value().decode("utf-8")
+        logger.info("Received topic: [%s] partition:[%s] message: %s",
+                    self.topic, msg.partition(), message_value)
+        payload: dict = json.loads(message_value)
+        err_cnt = payload.get('reconsume_times', 0)
+        try:
+            # 传递重试次数，仿照rocketMQ，取名，各自回调视情况需要接收
+            kwargs = {}
+            if has_parameter(self.callback, "reconsume_times"):
+                kwargs["reconsume_times"] = err_cnt
+
+            if self.run_callback(payload, **kwargs):
+                logger.info("consumer topic: [%s] partition:[%s] message: %s 消费成功",
+                            self.topic, msg.partition(), message_value)
+            else:
+                err_cnt += 1
+                logger.info("consumer topic: [%s] partition:[%s] message: %s  retry=%s",
+                            self.topic, msg.partition(), message_value, err_cnt)
+
+        except BusinessError as e:
+            err_cnt += 1
+            logger.error("业务异常consumer  topic: [%s] partition:[%s] message: %s  retry=%s",
+                         self.topic, msg.partition(), message_value, err_cnt, exc_info=True)
+            # 如果是0则不会引入任何延迟
+            time.sleep(self.retry_interval)
+        except Exception as e:
+            err_cnt += 1
+            logger.error("非业务异常需要关注 consumer  topic: [%s] partition:[%s] message: %s  retry=%s",
+                         self.topic, msg.partition(), message_value, err_cnt, exc_info=True)
+            # 如果是0则不会引入任何延迟
+            time.sleep(self.retry_interval)
+
+        if err_cnt >= self.err_retry_max:
+            logger.error("consumer fail topic: [%s] partition:[%s] 需要研发关注是否需要补偿: %s",
+                         self.topic, msg.partition(), message_value)
+        elif payload.get('reconsume_times', 0) != err_cnt:
+            # 本次消费执行失败，重新发送kafka消息
+            payload.update({'reconsume_times': err_cnt})
+            self.reconsume_messages(json.dumps(payload))
+
     def stop(self):
         with self.lock:
             if not self.__closed:
@@ -1,8 +1,9 @@
 import os
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 from app.services.index_extend.db_transformation import ChunkContentAttachedIndexExtend, \
     QuestionAnswerAttachedIndexExtend
+from init.settings import QDRANT_VECTOR_DB
 from bella_rag.schema.nodes import BaseNode
 from app.services import embed_model, chunk_vector_index_structure, question_vector_index_structure
 from bella_rag.vector_stores import qdrant_manager, tencent_manager
@@ -34,6 +35,13 @@ def init_vector_stores():
     
     if get_vector_db_type() == 'qdrant':
         qdrant_manager.init_stores()
+        if QDRANT_VECTOR_DB['AUTO_PAYLOAD_INDEX']:
+            # 摘要集合与切片集合共用索引结构
+            qdrant_manager.ensure_payload_indexes({
+                'chunk': chunk_vector_index_structure,
+                'qa': question_vector_index_structure,
+                'summary': chunk_vector_index_structure,
+            })
         vector_store = qdrant_manager.get_chunk_store()
         master_vector_store = vector_store  # Qdrant不需要区分master
         questions_vector_store = qdrant_manager.get_qa_store()
@@ -49,18 +57,33 @@ def init_vector_stores():
 
 
 def query_all_by_source(source_id: str, read_strong_consistency: bool = False) -> List[BaseNode]:
-    start = 0
-    limit = 5000
     res = []
-    while True:
-        query_res = batch_query_by_source(source_id, limit, start, read_strong_consistency)
-        if not query_res:
-            break
-        res.extend(query_res)
-        start += limit
+    for nodes in scan_by_source(source_id, read_strong_consistency=read_strong_consistency):
+        res.extend(nodes)
     return res
 
 
+def scan_by_source(source_id: str, batch_size: int = 5000, read_strong_consistency: bool = False,
+                   ) -> Iterator[List[BaseNode]]:
+    """按批次遍历文件全部节点，向量库游标翻页，数据库内容补全与下一批次拉取并行"""
+    if not source_id:
+        return
+    if not vector_store and not master_vector_store:
+        return
+
+    store = master_vector_store if read_strong_consistency and master_vector_store else vector_store
+
+    metadata_filters = MetadataFilters(filters=[
+        MetadataFilter(key="source_id", value=source_id, operator=FilterOperator.EQ)
+    ])
+    yield from store.scan_by_filter(
+        filter_condition=metadata_filters,
+        batch_size=batch_size,
+        index=chunk_vector_index_structure,
+        index_extend=chunk_index_extend,
+    )
+
+
 def batch_query_by_source(source_id: str, limit: int, offset: int, read_strong_consistency: bool = False,
                           ) -> List[BaseNode]:
     if not source_id:
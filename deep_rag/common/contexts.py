@@ -1,4 +1,6 @@
 import contextvars
+import threading
+from typing import List
 
 from common.helper.exception import CheckError
 from deep_rag.entity.plan import Plan
@@ -11,8 +13,8 @@ _file_ids_context = contextvars.ContextVar("file_ids", default=[])
 ## file_search参数
 _file_search_params_context = contextvars.ContextVar("file_search_params", default={})
 
-# 已搜索过的文件列表，用于search分页
-_searched_files_context = contextvars.ContextVar("searched_files", default=[])
+# 已搜索过的文件，用于search分页，会话开始时创建
+_searched_files_context = contextvars.ContextVar("searched_files", default=None)
 
 # memory信息
 _memory_context = contextvars.ContextVar("memory", default=Memory(conclusion_memory=[], plan_memory=[]))
@@ -21,6 +23,32 @@ _memory_context = contextvars.ContextVar("memory", default=Memory(conclusion_mem
 _plan_context = contextvars.ContextVar("plan", default=Plan())
 
 
+class SearchedFiles(object):
+    """会话内已搜索过的文件，并发执行的步骤共享同一实例，加锁认领避免重复返回同一文件"""
+
+    def __init__(self):
+        self._files = set()
+        self._lock = threading.Lock()
+
+    def unsearched(self, file_ids: List[str]) -> List[str]:
+        with self._lock:
+            return [f for f in file_ids if f not in self._files]
+
+    def claim(self, file_ids: List[str]) -> List[str]:
+        """认领未被搜索过的文件，返回本次认领成功的文件"""
+        with self._lock:
+            claimed = [f for f in dict.fromkeys(file_ids) if f not in self._files]
+            self._files.update(claimed)
+            return claimed
+
+    def __contains__(self, file_id) -> bool:
+        with self._lock:
+            return file_id in self._files
+
+    def __repr__(self):
+        with self._lock:
+            return str(sorted(self._files))
+
 
 class _DeepRagContext(object):
     @property
@@ -48,8 +76,11 @@ class _DeepRagContext(object):
         _file_search_params_context.set(value)
 
     @property
-    def searched_files(self) -> list:
-        return _searched_files_context.get()
+    def searched_files(self) -> SearchedFiles:
+        searched_files = _searched_files_context.get()
+        if searched_files is None:
+            raise CheckError("deep rag会话未初始化")
+        return searched_files
 
     @searched_files.setter
     def searched_files(self, value):
@@ -75,7 +106,7 @@ class _DeepRagContext(object):
         _query_context.set("")
         _file_ids_context.set([])
         _file_search_params_context.set({})
-        _searched_files_context.set([])
+        _searched_files_context.set(SearchedFiles())
         _memory_context.set(Memory(conclusion_memory=[], plan_memory=[]))
         _plan_context.set(Plan())
 
@@ -3,10 +3,11 @@ from typing import List
 
 from app.common.contexts import UserContext, OpenapiContext
 from app.utils.llm_response_util import get_response_json_str
-from deep_rag.common.contexts import DeepRagContext
+from deep_rag.common.contexts import DeepRagContext, SearchedFiles
 from deep_rag.entity.exception import UnablePlanException
 from deep_rag.entity.memory import MemoryItem, Memory
 from deep_rag.entity.plan import Plan, Step, StepStatus, Action
+from deep_rag.pipline.scheduler import run_steps, execute_tool_calls, STEP_COMPLETE
 from deep_rag.prompt.pipline import plan_prompt, multi_step_planning_prompt, re_planning_prompt, \
     conclusion_prompt, memory_evaluation_prompt, memory_combine_prompt
 from deep_rag.tools.schemas import tool_list, search_tool, read_tool
@@ -91,25 +92,15 @@ def execute_plan(p: Plan, question: str) -> (Plan, List[str]):
     task_steps = []
     step_orders = set()
     step_results = []
-    # 执行任务
-    for data in parsed_data:
-        past_steps = []
-        actions = []
+    # 按依赖关系并发执行任务
+    dependencies = {step.order: step._dependencies for step in p.get_all_steps()}
+    for event, data, past_steps in run_steps(parsed_data, dependencies,
+                                             lambda d: execute_tool_calls(d["tool_calls"], act_tool_mapping)):
+        if event != STEP_COMPLETE:
+            continue
         task_order = data["task_order"]
-        tool_calls = data["tool_calls"]
-        for tool_call in tool_calls:
-            tool_name = tool_call.get("name", "")
-            input_params = tool_call.get("params", {})
-            actions.append(Action(name=tool_name, params=input_params))
-            if tool_name in act_tool_mapping:
-                logger.info("工具执行开始：" + tool_name + str(input_params))
-                tool_result = act_tool_mapping[tool_name].call(*input_params.values()).raw_output
-                logger.info(f"工具执行结果：{tool_result}")
-
-                # 更新计划
-                past_steps.append(f"""当前步骤结果：\n- 工具：{tool_name}\n- 输入：{str(input_params)}\n- 输出：{tool_result}""")
-            else:
-                past_steps.append(f"工具不存在：{tool_name}")
+        actions = [Action(name=tool_call.get("name", ""), params=tool_call.get("params", {}))
+                   for tool_call in data["tool_calls"]]
 
         for step in p.get_all_steps():
             if step.order == task_order:
@@ -122,7 +113,7 @@ def execute_plan(p: Plan, question: str) -> (Plan, List[str]):
                 # 添加依赖的序号
                 for i in step._dependencies:
                     step_orders.add(i)
-                step_results.append(f'任务{task_order}执行结果：{step.step_result}')
+                step_results.append((task_order, f'任务{task_order}执行结果：{step.step_result}'))
                 # store_memory(question, task_order, step.step_result)
 
     # 每次execute执行的结果及其依赖的结果，添加到结果里
@@ -131,6 +122,8 @@ def execute_plan(p: Plan, question: str) -> (Plan, List[str]):
             logger.info(f'添加任务step结果，任务序号：{step.order}')
             task_steps.append(f'任务序号：{step.order}\n 任务执行情况：{step.step_result}\n')
 
+    # 完成顺序随线程调度变化，汇总结果按计划顺序排列
+    step_results = [r for _, r in sorted(step_results, key=lambda r: r[0])]
     plan_sum_prompt = memory_combine_prompt.replace('$question', question).replace('$step_result',
                                                                                    str(step_results)).replace('$plan',
                                                                                                               p.markdown_format())
@@ -219,6 +212,7 @@ def run_deep_rag(question: str,
     # 初始化请求上下文
     DeepRagContext.query = question
     DeepRagContext.file_ids = file_ids
+    DeepRagContext.searched_files = SearchedFiles()
     UserContext.user_id = user
 
     # 任务开始执行
@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Callable, Generator, Tuple
+
+from bella_rag.utils.thread_util import with_context
+from init.settings import DEEP_RAG, user_logger
+
+logger = user_logger
+
+# 步骤与工具调用使用不同线程池，避免步骤占满线程后等待工具调用导致死锁
+step_executor = ThreadPoolExecutor(max_workers=int(DEEP_RAG['STEP_WORKERS']), thread_name_prefix='deep-rag-step')
+tool_executor = ThreadPoolExecutor(max_workers=int(DEEP_RAG['TOOL_WORKERS']), thread_name_prefix='deep-rag-tool')
+
+# 调度事件类型
+STEP_START = 'start'
+STEP_COMPLETE = 'complete'
+
+
+def run_steps(tasks: List[Dict[str, Any]], dependencies: Dict[int, List[int]],
+              execute: Callable[[Dict[str, Any]], Any]) -> Generator[Tuple[str, Dict[str, Any], Any], None, None]:
+    """
+    按依赖关系调度同一轮解析出的任务，无依赖的任务并发执行
+    只等待本轮内排在前面的依赖任务，其余依赖视为已完成，保证不会出现环
+    依次产出 (STEP_START, task, None) 与 (STEP_COMPLETE, task, result)，完成事件按实际完成顺序产出，
+    调用方汇总结果时需按task_order排序，避免结果顺序随线程调度变化
+    """
+    if not DEEP_RAG['PARALLEL']:
+        for task in tasks:
+            yield STEP_START, task, None
+            yield STEP_COMPLETE, task, execute(task)
+        return
+
+    # 任务下标 -> 本轮内需等待的任务下标
+    waiting = {}
+    latest = {}
+    for i, task in enumerate(tasks):
+        waiting[i] = {latest[order] for order in dependencies.get(task["task_order"], []) if order in latest}
+        latest[task["task_order"]] = i
+
+    running = {}
+    finished = set()
+    try:
+        while waiting or running:
+            for i in [i for i, deps in waiting.items() if deps <= finished]:
+                del waiting[i]
+                yield STEP_START, tasks[i], None
+                running[step_executor.submit(with_context(execute), tasks[i])] = i
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                finished.add(i)
+                yield STEP_COMPLETE, tasks[i], future.result()
+    finally:
+        # 任务失败或生成器提前关闭（如客户端断开）时，取消未开始的任务并等待执行中的任务结束
+        if running:
+            logger.warning(f'deep rag steps interrupted, remaining: {[tasks[i]["task_order"] for i in running.values()]}')
+            for future in running:
+                future.cancel()
+            wait(running)
+
+
+def execute_tool_calls(tool_calls: List[Dict[str, Any]], act_tool_mapping: Dict[str, Any]) -> List[str]:
+    """并发执行步骤内的工具调用，结果按调用顺序返回"""
+
+    def call(tool_call: Dict[str, Any]) -> str:
+        tool_name = tool_call.get("name", "")
+        input_params = tool_call.get("params", {})
+        if tool_name not in act_tool_mapping:
+            return f"工具不存在：{tool_name}"
+
+        logger.info("工具执行开始：" + tool_name + str(input_params))
+        tool_result = act_tool_mapping[tool_name].call(*input_params.values()).raw_output
+        logger.info(f"工具执行结果：{tool_result}")
+        return f"""当前步骤结果：\n- 工具：{tool_name}\n- 输入：{str(input_params)}\n- 输出：{tool_result}"""
+
+    if not DEEP_RAG['PARALLEL'] or len(tool_calls) <= 1:
+        return [call(tool_call) for tool_call in tool_calls]
+
+    futures = [tool_executor.submit(with_context(call), tool_call) for tool_call in tool_calls]
+    return [future.result() for future in futures]
@@ -16,17 +16,16 @@ logger = user_logger
 
 def file_search(question, page) -> str:
     """返回可用的知识文件列表file_list及分页信息"""
+    searched_files = DeepRagContext.searched_files
     logger.info(
-        f'start file search. question: {question}, page: {page}, file_ids: {str(DeepRagContext.file_ids)}, has searched files : {str(DeepRagContext.searched_files)}')
+        f'start file search. question: {question}, page: {page}, file_ids: {str(DeepRagContext.file_ids)}, has searched files : {str(searched_files)}')
     file_ids = DeepRagContext.file_ids
     file_search_params = DeepRagContext.file_search_params
     res = file_search_tool.execute(question=question,
-                                   file_ids=[f for f in file_ids if f not in DeepRagContext.searched_files], **file_search_params)
-    searched_files = DeepRagContext.searched_files
-    # 补充本次搜索记录到上下文
-    for f in res:
-        searched_files.append(f["file_id"])
-    DeepRagContext.searched_files = searched_files
+                                   file_ids=searched_files.unsearched(file_ids), **file_search_params)
+    # 并发搜索可能返回相同文件，只保留本次认领成功的文件
+    claimed = set(searched_files.claim([f["file_id"] for f in res]))
+    res = [f for f in res if f["file_id"] in claimed]
     return str(res)
 
 
@@ -1,4 +1,8 @@
+import threading
 from abc import abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import sha256
 from typing import Any, List, Dict
 
 from app.common.contexts import OpenapiContext
@@ -7,12 +11,39 @@ from app.services import chunk_vector_index_structure
 from app.strategy.retrieval import RetrievalMode
 from deep_rag.common.contexts import DeepRagContext
 from deep_rag.prompt.tool import compress_prompt, check_read_info_prompt
-from init.settings import user_logger, OPENAPI
+from init.settings import user_logger, OPENAPI, DEEP_RAG
 from bella_rag.llm.openapi import OpenAPI
+from bella_rag.utils.cache_util import ContentLRUCache
 from bella_rag.utils.complete_util import Small2BigModes
+from bella_rag.utils.thread_util import with_context
 
 logger = user_logger
 
+# 检索内容压缩：有界并发 + 按内容哈希缓存压缩结果，多轮计划内重复检索到的文件直接复用
+compress_executor = ThreadPoolExecutor(max_workers=int(DEEP_RAG['COMPRESS_CONCURRENCY']),
+                                       thread_name_prefix='deep-rag-compress')
+compress_cache = ContentLRUCache(capacity=DEEP_RAG['COMPRESS_CACHE_CAPACITY'], metric_key='deep_rag_compress_cache')
+
+# 按ak哈希缓存llm实例，缓存key中不保留明文ak
+_COMPRESS_LLM_CAPACITY = 64
+_compress_llms = OrderedDict()
+_compress_llms_lock = threading.Lock()
+
+
+def get_compress_llm(api_key: str) -> OpenAPI:
+    """同一ak共享llm实例及其http客户端"""
+    key = sha256((api_key or '').encode('utf-8')).hexdigest()
+    with _compress_llms_lock:
+        llm = _compress_llms.get(key)
+        if llm is None:
+            llm = OpenAPI(temperature=0.01, api_base=OPENAPI["URL"], api_key=api_key,
+                          timeout=DEEP_RAG['COMPRESS_TIMEOUT'], model=DEEP_RAG['COMPRESS_MODEL'])
+            _compress_llms[key] = llm
+        _compress_llms.move_to_end(key)
+        while len(_compress_llms) > _COMPRESS_LLM_CAPACITY:
+            _compress_llms.popitem(last=False)
+        return llm
+
 
 class ITool:
     @abstractmethod
@@ -75,22 +106,46 @@ class FileSearchTool(ITool):
 
     def _compress_contents(self, question: str, file_contents: List[Dict[str, Any]]):
         """使用大模型对contents进行压缩"""
-        # 每个文件单独压缩
+        # 每个文件单独压缩，文件间并发执行
+        llm = get_compress_llm(OpenapiContext.ak)
+        futures = [compress_executor.submit(with_context(self._compress_file), llm, question, contents)
+                   for contents in file_contents]
+
+        # 所有文件共用一个超时时间，超时未完成的任务取消并使用原始内容，不阻塞后续计划
+        _, not_done = wait(futures, timeout=DEEP_RAG['COMPRESS_TIMEOUT'])
+        for future in not_done:
+            future.cancel()
+
         compress_res = []
-        for contents in file_contents:
-            llm_input = compress_prompt.replace("$question", question).replace("$file_contents",
-                                                                               str({'file_name': contents['file_name'],
-                                                                                    'file_contents': contents[
-                                                                                        'file_contents']}))
-            llm = OpenAPI(temperature=0.01, api_base=OPENAPI["URL"], api_key=OpenapiContext.ak,
-                          timeout=300, model='gpt-4o')
-            completion = llm.complete(llm_input)
-            res = completion.text
+        for contents, future in zip(file_contents, futures):
+            res = contents['file_contents']
+            if future in not_done:
+                logger.warning(f"[FileSearchTool] compress timeout, file_id: {contents['file_id']}")
+            elif future.exception() is not None:
+                logger.warning(f"[FileSearchTool] compress failed, file_id: {contents['file_id']}, "
+                               f"error: {future.exception()}")
+            else:
+                res = [future.result()]
             compress_res.append(
-                {'file_name': contents['file_name'], 'file_contents': [res], 'file_id': contents['file_id']})
+                {'file_name': contents['file_name'], 'file_contents': res, 'file_id': contents['file_id']})
 
         return compress_res
 
+    @staticmethod
+    def _compress_file(llm: OpenAPI, question: str, contents: Dict[str, Any]) -> str:
+        key = ContentLRUCache.content_key(llm.model, question, contents['file_name'], contents['file_contents'])
+        res = compress_cache.get(key)
+        if res is not None:
+            return res
+
+        llm_input = compress_prompt.replace("$question", question).replace("$file_contents",
+                                                                           str({'file_name': contents['file_name'],
+                                                                                'file_contents': contents[
+                                                                                    'file_contents']}))
+        res = llm.complete(llm_input).text
+        compress_cache.put(key, res)
+        return res
+
 
 class ReadCheckTool(ITool):
     check_model: str
@@ -460,6 +460,7 @@ try:
         'METRIC_TYPE': config.get('VECTOR_DB', 'metric_type', 'COSINE'),
         'EMBEDDING_MODEL': config.get('VECTOR_DB', 'embedding_model', 'text_embedding_v3'),
         'EMBEDDING_BATCH_SIZE': config.get('VECTOR_DB', 'embedding_batch_size', 100, int),
+        'EMBEDDING_CONCURRENCY': config.get('VECTOR_DB', 'embedding_concurrency', 4, int),
     }
     print(f"DEBUG: VECTOR_DB_COMMON loaded successfully: {VECTOR_DB_COMMON}")
 except Exception as e:
@@ -470,6 +471,7 @@ except Exception as e:
         'METRIC_TYPE': 'COSINE',
         'EMBEDDING_MODEL': 'text_embedding_v3',
         'EMBEDDING_BATCH_SIZE': 100,
+        'EMBEDDING_CONCURRENCY': 4,
     }
     print(f"DEBUG: Using default VECTOR_DB_COMMON: {VECTOR_DB_COMMON}")
 
@@ -499,6 +501,9 @@ QDRANT_VECTOR_DB = {
     'COLLECTION_NAME': config.get('QDRANT_VECTOR_DB', 'collection_name', 'documents'),
     'QUESTIONS_COLLECTION_NAME': config.get('QDRANT_VECTOR_DB', 'questions_collection_name', 'qa_documents'),
     'SUMMARY_COLLECTION_NAME': config.get('QDRANT_VECTOR_DB', 'summary_collection_name', 'summary_documents'),
+    'AUTO_PAYLOAD_INDEX': config.get('QDRANT_VECTOR_DB', 'auto_payload_index', True, bool),
+    'SHARDING': config.get('QDRANT_VECTOR_DB', 'sharding', False, bool),
+    'SHARD_NUM': config.get('QDRANT_VECTOR_DB', 'shard_num', 32, int),
     'EMBEDDING_MODEL': VECTOR_DB_COMMON['EMBEDDING_MODEL'],
 }
 
@@ -525,6 +530,7 @@ KAFKA = {
     'KNOWLEDGE_INDEX_TASK_BOOTSTRAP_SERVERS': config.get('KAFKA', 'knowledge_index_task_bootstrap_servers', ''),
     'KNOWLEDGE_INDEX_TASK_TOPIC': config.get('KAFKA', 'knowledge_index_task_topic', ''),
     'KNOWLEDGE_INDEX_GROUP_ID': config.get('KAFKA', 'knowledge_index_group_id', ''),
+    'KNOWLEDGE_INDEX_TASK_CONCURRENCY': config.get('KAFKA', 'knowledge_index_task_concurrency', 4, int),
 
     'KNOWLEDGE_FILE_INDEX_DONE_BOOTSTRAP_SERVERS': config.get('KAFKA',
                                                               'knowledge_file_index_done_bootstrap_servers', ''),
@@ -540,6 +546,19 @@ KAFKA = {
     'KNOWLEDGE_FILE_DELETE_BOOTSTRAP_SERVERS': config.get('KAFKA', 'knowledge_file_delete_bootstrap_servers', ''),
     'KNOWLEDGE_FILE_DELETE_TOPIC': config.get('KAFKA', 'knowledge_file_delete_topic', ''),
     'KNOWLEDGE_FILE_DELETE_GROUP_ID': config.get('KAFKA', 'knowledge_file_delete_group_id', ''),
+
+    'PRODUCER_LINGER_MS': config.get('KAFKA', 'producer_linger_ms', 20, int),
+    'PRODUCER_BATCH_NUM_MESSAGES': config.get('KAFKA', 'producer_batch_num_messages', 1000, int),
+    'PRODUCER_BUFFER_MAX_MESSAGES': config.get('KAFKA', 'producer_buffer_max_messages', 100000, int),
+}
+
+# 后台任务配置
+WORKER = {
+    # web进程内是否启动kafka消费者及定时任务，关闭后通过 manage.py run_workers 独立部署
+    'WEB_CONSUMER_ENABLE': config.get('WORKER', 'web_consumer_enable', True, bool),
+    # 独立worker启动的消费者，格式：名称[:进程数[:线程数]]
+    'LISTENERS': config.get('WORKER', 'listeners', ['knowledge_index', 'knowledge_file_index_done', 'file_api',
+                                                    'knowledge_file_delete', 'knowledge_file_context'], list),
 }
 
 # 重排序配置
@@ -556,6 +575,37 @@ RETRIEVAL = {
     'TOKEN_THRESHOLD': config.get('RETRIEVAL', 'complete_token_threshold', 0.6, float),
     'COMPLETE_MAX_TOKEN': config.get('RETRIEVAL', 'complete_max_token', 1500, int),
     'MATCH_SCORE': config.get('RETRIEVAL', 'match_score', 0.95, float),
+    'PARALLEL': config.get('RETRIEVAL', 'parallel', True, bool),
+    'PARALLEL_WORKERS': config.get('RETRIEVAL', 'parallel_workers', 32, int),
+    'ROUTE_TIMEOUT': config.get('RETRIEVAL', 'route_timeout', 30, float),
+    'SINGLE_FLIGHT': config.get('RETRIEVAL', 'single_flight', True, bool),
+    'SINGLE_FLIGHT_REDIS': config.get('RETRIEVAL', 'single_flight_redis', False, bool),
+    'SINGLE_FLIGHT_TIMEOUT': config.get('RETRIEVAL', 'single_flight_timeout', 30, float),
+    'CACHE_ENABLE': config.get('RETRIEVAL', 'cache_enable', False, bool),
+    'CACHE_CAPACITY': config.get('RETRIEVAL', 'cache_capacity', 2000, int),
+    'CACHE_TTL': config.get('RETRIEVAL', 'cache_ttl', 600, int),
+    'CACHE_REDIS_ENABLE': config.get('RETRIEVAL', 'cache_redis_enable', False, bool),
+    'SEARCH_BATCH': config.get('RETRIEVAL', 'search_batch', False, bool),
+    'SEARCH_BATCH_WINDOW': config.get('RETRIEVAL', 'search_batch_window', 0.005, float),
+    'SEARCH_BATCH_SIZE': config.get('RETRIEVAL', 'search_batch_size', 16, int),
+}
+
+# deep rag配置
+DEEP_RAG = {
+    'PARALLEL': config.get('DEEP_RAG', 'parallel', True, bool),
+    'STEP_WORKERS': config.get('DEEP_RAG', 'step_workers', 16, int),
+    'TOOL_WORKERS': config.get('DEEP_RAG', 'tool_workers', 32, int),
+    'COMPRESS_MODEL': config.get('DEEP_RAG', 'compress_model', 'gpt-4o'),
+    'COMPRESS_CONCURRENCY': config.get('DEEP_RAG', 'compress_concurrency', 8, int),
+    'COMPRESS_TIMEOUT': config.get('DEEP_RAG', 'compress_timeout', 120, int),
+    'COMPRESS_CACHE_CAPACITY': config.get('DEEP_RAG', 'compress_cache_capacity', 1000, int),
+}
+
+# 流式输出配置
+STREAM = {
+    'HEARTBEAT_INTERVAL': config.get('STREAM', 'heartbeat_interval', 10, int),
+    'BUFFER_SIZE': config.get('STREAM', 'buffer_size', 64, int),
+    'RAG_HEARTBEAT': config.get('STREAM', 'rag_heartbeat', False, bool),
 }
 
 # 上下文总结配置
@@ -567,6 +617,7 @@ CONTEXT_SUMMARY = {
     'MERGE_MAX_LENGTH': config.get('CONTEXT_SUMMARY', 'merge_max_length', 1500, int),
     'FORCE_MERGE_LENGTH': config.get('CONTEXT_SUMMARY', 'force_merge_length', 300, int),
     'SUMMARY_MAX_BATCH_SIZE': config.get('CONTEXT_SUMMARY', 'summary_max_batch_size', 30, int),
+    'SUMMARY_CONCURRENCY': config.get('CONTEXT_SUMMARY', 'summary_concurrency', 8, int),
 }
 
 # file-api配置
@@ -603,6 +654,30 @@ APOLLO = {
 # 缓存配置
 CACHE = {
     'CAPACITY': config.get('CACHE', 'capacity', 10000, int),
+    'REDIS_ENABLE': config.get('CACHE', 'redis_enable', False, bool),
+    'REDIS_TTL': config.get('CACHE', 'redis_ttl', 24 * 60 * 60, int),
+}
+
+# query向量缓存配置
+EMBEDDING_CACHE = {
+    'ENABLE': config.get('EMBEDDING_CACHE', 'enable', True, bool),
+    'CAPACITY': config.get('EMBEDDING_CACHE', 'capacity', 5000, int),
+    'REDIS_ENABLE': config.get('EMBEDDING_CACHE', 'redis_enable', False, bool),
+    'REDIS_TTL': config.get('EMBEDDING_CACHE', 'redis_ttl', 24 * 60 * 60, int),
+}
+
+# 语义答案缓存配置
+ANSWER_CACHE = {
+    'ENABLE': config.get('ANSWER_CACHE', 'enable', False, bool),
+    'MAX_DISTANCE': config.get('ANSWER_CACHE', 'max_distance', 0.05, float),
+    'CAPACITY': config.get('ANSWER_CACHE', 'capacity', 1000, int),
+    'SCOPE_CAPACITY': config.get('ANSWER_CACHE', 'scope_capacity', 100, int),
+    'TTL': config.get('ANSWER_CACHE', 'ttl', 3600, int),
+}
+
+# 文件索引配置
+FILE_INDEX = {
+    'INCREMENTAL': config.get('FILE_INDEX', 'incremental', False, bool),
 }
 
 # 默认用户
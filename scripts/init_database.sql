@@ -19,6 +19,7 @@ CREATE TABLE IF NOT EXISTS `chunk_content_attached` (
   `chunk_status` int(11) DEFAULT '1' COMMENT '切片状态',
   `order_num` varchar(128) DEFAULT '' COMMENT '切片层级信息',
   `context_id` varchar(128) DEFAULT '' COMMENT '切片管理上下文id',
+  `content_hash` varchar(64) DEFAULT '' COMMENT '切片内容指纹',
   `create_time` datetime(6) DEFAULT NULL COMMENT '创建时间',
   `update_time` datetime(6) DEFAULT NULL COMMENT '更新时间',
   PRIMARY KEY (`id`),
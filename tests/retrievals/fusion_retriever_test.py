@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llama_index.core import QueryBundle
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.llms import MockLLM
+from llama_index.core.retrievers.fusion_retriever import FUSION_MODES
+
+from bella_rag.retrievals import fusion_retriever
+from bella_rag.retrievals.fusion_retriever import MultiRecallFusionRetriever, SimilarQueryFusionRetriever
+from bella_rag.schema.nodes import NodeWithScore, TextNode
+
+
+class SleepRetriever(BaseRetriever):
+
+    def __init__(self, node_id: str):
+        super().__init__()
+        self.node_id = node_id
+
+    def _retrieve(self, query_bundle: QueryBundle):
+        time.sleep(0.05)
+        return [NodeWithScore(node=TextNode(id_=self.node_id, text=self.node_id), score=1.0)]
+
+
+def test_nested_parallel_retrieval_more_requests_than_workers(monkeypatch):
+    # 每层只有2个线程，并发请求数远大于线程数，外层与内层共用线程池时会互相等待直至超时
+    monkeypatch.setitem(fusion_retriever.RETRIEVAL, 'PARALLEL_WORKERS', 2)
+    monkeypatch.setattr(fusion_retriever, '_retrieval_executors', {})
+
+    route_timeout = 5
+    inner_retrievers = [SimilarQueryFusionRetriever(retrievers=[SleepRetriever(f'chunk-{i}'), SleepRetriever(f'qa-{i}')],
+                                                    use_parallel=True, route_timeout=route_timeout)
+                        for i in range(2)]
+    retriever = MultiRecallFusionRetriever(retrievers=inner_retrievers, llm=MockLLM(), mode=FUSION_MODES.SIMPLE,
+                                           num_queries=1, use_async=False, use_parallel=True,
+                                           route_timeout=route_timeout)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(retriever.retrieve, f'query {i}') for i in range(8)]
+        results = [future.result() for future in futures]
+
+    assert time.time() - start < route_timeout
+    for nodes in results:
+        assert {n.node_id for n in nodes} == {'chunk-0', 'chunk-1'}
@@ -1,5 +1,6 @@
-from app.models.chunk_content_attached_model import ChunkContentAttachedMapper
+from app.models.chunk_content_attached_model import ChunkContentAttachedMapper, ChunkContentAttached
 from app.services import chunk_service
+from app.services.chunk_content_attached_service import diff_chunks
 
 
 def test_chunk_add(test_file_id):
@@ -67,3 +68,47 @@ def test_chunk_pos_incr(test_file_id):
 def test_chunk_pos_decr(test_file_id):
     file_id = test_file_id("md")
     ChunkContentAttachedMapper.chunk_pos_decrement(file_id, 0)
+
+
+def _chunk(pos, data, content_hash, token=10, order_num=None):
+    return ChunkContentAttached(chunk_id=f'file-{pos}', source_id='file', content_title=data, content_data=data,
+                                chunk_pos=pos, token=token, order_num=order_num or str(pos + 1),
+                                content_hash=content_hash)
+
+
+def test_diff_chunks_content_change():
+    existing = [_chunk(0, 'a', 'h0'), _chunk(1, 'b', 'h1'), _chunk(2, 'c', 'h2'), _chunk(3, 'd', '')]
+    chunks = [_chunk(0, 'a', 'h0'), _chunk(1, 'b', 'h1', token=20), _chunk(2, 'x', 'h9'), _chunk(3, 'd', 'h3')]
+    diff = diff_chunks(existing, chunks)
+
+    # 结构未变只写入内容变化的切片；token变化只重写数据库行；无指纹的旧数据视为变更
+    assert diff.write_ids == {'file-2', 'file-3'}
+    assert diff.reuse_ids == {}
+    assert [c.chunk_id for c in diff.rewrite_chunks] == ['file-1', 'file-2', 'file-3']
+    assert diff.removed_ids == []
+
+
+def test_diff_chunks_insert_reuses_embeddings():
+    existing = [_chunk(0, 'a', 'ha', order_num='1'), _chunk(1, 'b', 'hb', order_num='2'),
+                _chunk(2, 'c', 'hc', order_num='3')]
+    # 头部插入一个切片，其后切片的id、位置均后移，但内容指纹不变
+    chunks = [_chunk(0, 'new', 'hn', order_num='1'), _chunk(1, 'a', 'ha', order_num='2'),
+              _chunk(2, 'b', 'hb', order_num='3'), _chunk(3, 'c', 'hc', order_num='4')]
+    diff = diff_chunks(existing, chunks)
+
+    # 节点关系变化，全部重写向量存储，只有新切片需要embedding
+    assert diff.write_ids == {'file-0', 'file-1', 'file-2', 'file-3'}
+    assert diff.reuse_ids == {'file-1': 'file-0', 'file-2': 'file-1', 'file-3': 'file-2'}
+    assert [c.chunk_id for c in diff.rewrite_chunks] == ['file-0', 'file-1', 'file-2', 'file-3']
+    assert diff.removed_ids == []
+
+
+def test_diff_chunks_remove():
+    existing = [_chunk(0, 'a', 'ha'), _chunk(1, 'b', 'hb'), _chunk(2, 'c', 'hc')]
+    chunks = [_chunk(0, 'a', 'ha'), _chunk(1, 'c', 'hc')]
+    diff = diff_chunks(existing, chunks)
+
+    assert diff.write_ids == {'file-0', 'file-1'}
+    assert diff.reuse_ids == {'file-0': 'file-0', 'file-1': 'file-2'}
+    assert [c.chunk_id for c in diff.rewrite_chunks] == ['file-1']
+    assert diff.removed_ids == ['file-2']
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from llama_index.core.vector_stores import VectorStoreQuery
+
+from bella_rag.vector_stores.qdrant import QdrantVectorDB
+from bella_rag.vector_stores.sharding import ShardRouter
+
+
+def make_store(cluster_shard_keys):
+    client = MagicMock()
+    client.collection_exists.return_value = False
+    client.collection_cluster_info.return_value = SimpleNamespace(
+        local_shards=[SimpleNamespace(shard_key=k) for k in cluster_shard_keys], remote_shards=[])
+    store = QdrantVectorDB(collection_name='test', client=client, aclient_pool=MagicMock(),
+                           shard_router=ShardRouter(0))
+    return store, client
+
+
+def query(file_ids):
+    return VectorStoreQuery(query_embedding=[0.1], similarity_top_k=1, doc_ids=file_ids)
+
+
+def test_selector_keeps_existing_shard_keys():
+    store, client = make_store(['space_a'])
+
+    # space_b尚未写入过数据，其分片不存在
+    assert store._shard_key_selector(query(['file-1-a', 'file-2-b'])) == ['space_a']
+    assert store._shard_key_selector(query(['file-1-a'])) == ['space_a']
+    assert client.collection_cluster_info.call_count == 1
+
+
+def test_selector_without_existing_shard_keys():
+    store, _ = make_store([])
+
+    assert store._shard_key_selector(query(['file-2-b'])) is None
+
+
+def test_selector_uses_shard_keys_created_by_writes():
+    store, client = make_store([])
+    store._create_shard_key('space_a', client.create_shard_key)
+
+    assert store._shard_key_selector(query(['file-1-a'])) == ['space_a']
+    client.collection_cluster_info.assert_not_called()
+
+
+def test_selector_unrouted_when_refresh_skipped(monkeypatch):
+    store, client = make_store(['space_a'])
+    assert store._shard_key_selector(query(['file-1-a'])) == ['space_a']
+
+    # 其他进程创建了新分片，刷新间隔内无法确认，访问全部分片
+    client.collection_cluster_info.return_value.local_shards.append(SimpleNamespace(shard_key='space_c'))
+    assert store._shard_key_selector(query(['file-1-a', 'file-3-c'])) is None
+
+    monkeypatch.setattr(QdrantVectorDB, 'SHARD_KEYS_REFRESH_INTERVAL', 0)
+    assert store._shard_key_selector(query(['file-1-a', 'file-3-c'])) == ['space_a', 'space_c']
+
+
+def test_selector_unrouted_when_refresh_failed():
+    store, client = make_store(['space_a'])
+    client.collection_cluster_info.side_effect = Exception('cluster info unavailable')
+
+    assert store._shard_key_selector(query(['file-1-a'])) is None
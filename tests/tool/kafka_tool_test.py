@@ -0,0 +1,30 @@
+from common.tool.kafka_tool import OffsetTracker
+
+
+def test_offset_tracker_commit_prefix():
+    tracker = OffsetTracker()
+    for offset in range(5):
+        tracker.add(0, offset)
+    tracker.add(1, 10)
+
+    tracker.done(0, 1)
+    tracker.done(0, 2)
+    # offset 0 未完成，分区0不可提交
+    assert tracker.pop_committable() == {}
+
+    tracker.done(0, 0)
+    tracker.done(1, 10)
+    assert tracker.pop_committable() == {0: 3, 1: 11}
+    assert tracker.running == 2
+
+    tracker.done(0, 4)
+    assert tracker.pop_committable() == {}
+    tracker.done(0, 3)
+    assert tracker.pop_committable() == {0: 5}
+    assert tracker.running == 0
+    assert not tracker.partitions[0]
+
+    tracker.add(2, 0)
+    tracker.remove([2])
+    tracker.done(2, 0)
+    assert tracker.running == 0
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from bella_rag.utils.answer_cache import SemanticAnswerCache, CachedAnswer
+
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache(max_distance=0.05, capacity=2, scope_capacity=2, ttl=60)
+
+
+def answer(text: str) -> CachedAnswer:
+    return CachedAnswer(text, b'')
+
+
+def test_get_within_distance(cache):
+    cache.put("scope1", [1.0, 0.0, 0.0], answer("a1"))
+
+    # 余弦距离约0.005，命中
+    assert cache.get("scope1", [1.0, 0.1, 0.0]).text == "a1"
+    # 余弦距离约0.29，未命中
+    assert cache.get("scope1", [1.0, 1.0, 0.0]) is None
+    # 不同作用域互不可见
+    assert cache.get("scope2", [1.0, 0.0, 0.0]) is None
+
+
+def test_get_most_similar(cache):
+    cache.put("scope1", [1.0, 0.0, 0.0], answer("a1"))
+    cache.put("scope1", [0.0, 1.0, 0.0], answer("a2"))
+
+    assert cache.get("scope1", [0.05, 1.0, 0.0]).text == "a2"
+    assert cache.get("scope1", [1.0, 0.05, 0.0]).text == "a1"
+
+
+def test_scope_capacity(cache):
+    cache.put("scope1", [1.0, 0.0, 0.0], answer("a1"))
+    cache.put("scope1", [0.0, 1.0, 0.0], answer("a2"))
+    cache.put("scope1", [0.0, 0.0, 1.0], answer("a3"))
+
+    # 作用域内只保留最新的2条
+    assert cache.get("scope1", [1.0, 0.0, 0.0]) is None
+    assert cache.get("scope1", [0.0, 1.0, 0.0]).text == "a2"
+    assert cache.get("scope1", [0.0, 0.0, 1.0]).text == "a3"
+
+
+def test_scope_lru_eviction(cache):
+    cache.put("scope1", [1.0, 0.0], answer("a1"))
+    cache.put("scope2", [1.0, 0.0], answer("a2"))
+    # 访问scope1后scope2最久未使用
+    assert cache.get("scope1", [1.0, 0.0]).text == "a1"
+    cache.put("scope3", [1.0, 0.0], answer("a3"))
+
+    assert cache.get("scope2", [1.0, 0.0]) is None
+    assert cache.get("scope1", [1.0, 0.0]).text == "a1"
+    assert cache.get("scope3", [1.0, 0.0]).text == "a3"
+
+
+def test_expire():
+    cache = SemanticAnswerCache(max_distance=0.05, capacity=2, scope_capacity=2, ttl=1)
+    cache.put("scope1", [1.0, 0.0], answer("a1"))
+    assert cache.get("scope1", [1.0, 0.0]).text == "a1"
+
+    time.sleep(1.1)
+    assert cache.get("scope1", [1.0, 0.0]) is None
+
+
+def test_dimension_change(cache):
+    cache.put("scope1", [1.0, 0.0], answer("a1"))
+    # 向量维度变化（更换embedding模型）时重建作用域
+    cache.put("scope1", [1.0, 0.0, 0.0], answer("a2"))
+
+    assert cache.get("scope1", [1.0, 0.0, 0.0]).text == "a2"
@@ -1,7 +1,8 @@
 import pytest
 
-from bella_rag.schema.nodes import TextNode
-from bella_rag.utils.cache_util import NodeLRUCache
+from bella_rag.schema.nodes import TextNode, TabelNode, DocumentNodeRelationship
+from bella_rag.utils.cache_util import NodeLRUCache, QueryEmbeddingCache, SharedNodeCache
+from bella_rag.utils.node_graph import dump_node_graph, load_node_graph, CompactNodeGraph
 
 
 @pytest.fixture
@@ -63,3 +64,70 @@ def test_remove_file(cache):
 
     assert cache.get("file1", "node1").node_id == "node1"
     assert cache.get("file3", "node5").node_id == "node5"
+
+
+def test_query_embedding_cache_normalize_and_evict():
+    embedding_cache = QueryEmbeddingCache(capacity=2)
+    embedding_cache.put("model", 3, "  你好\n世界 ", [0.1, 0.2, 0.3])
+    assert embedding_cache.get("model", 3, "你好 世界") == [0.1, 0.2, 0.3]
+    # 模型或维数不同不命中
+    assert embedding_cache.get("other_model", 3, "你好 世界") is None
+    assert embedding_cache.get("model", 4, "你好 世界") is None
+
+    embedding_cache.put("model", 3, "q2", [0.2, 0.2, 0.2])
+    embedding_cache.get("model", 3, "你好 世界")
+    embedding_cache.put("model", 3, "q3", [0.3, 0.3, 0.3])
+    assert embedding_cache.get("model", 3, "q2") is None
+    assert embedding_cache.get("model", 3, "你好 世界") is not None
+
+
+def test_node_graph_dump_and_load():
+    parent = TextNode(id_="parent", text="标题", pos=1, token=10, order_num_str="1")
+    child1 = TextNode(id_="child1", text="正文1", pos=2, token=4, order_num_str="1.1")
+    child2 = TabelNode(id_="child2", text="单元格", pos=3, token=6, order_num_str="1.2")
+    parent.doc_relationships[DocumentNodeRelationship.CHILD] = [child1, child2]
+    child1.doc_relationships[DocumentNodeRelationship.PARENT] = parent
+    child1.doc_relationships[DocumentNodeRelationship.NEXT] = child2
+    child2.doc_relationships[DocumentNodeRelationship.PREVIOUS] = child1
+
+    # 仅传入叶子节点，父节点通过关系可达
+    nodes = {node.node_id: node for node in load_node_graph(dump_node_graph([child1]))}
+    assert set(nodes.keys()) == {"parent", "child1", "child2"}
+    assert isinstance(nodes["child2"], TabelNode)
+    assert nodes["child1"].doc_relationships[DocumentNodeRelationship.PARENT] is nodes["parent"]
+    assert nodes["child2"].doc_relationships[DocumentNodeRelationship.PREVIOUS] is nodes["child1"]
+    assert [n.node_id for n in nodes["parent"].doc_relationships[DocumentNodeRelationship.CHILD]] == \
+           ["child1", "child2"]
+    assert nodes["parent"].token == 10 and nodes["child1"].order_num_str == "1.1"
+
+
+def test_shared_node_cache_without_redis():
+    node_cache = SharedNodeCache(capacity=5)
+    node_cache.put("file1", [TextNode(id_="node1")])
+    assert node_cache.load(["file1"]) == {}
+    assert node_cache.get("file1", "node1").node_id == "node1"
+    node_cache.remove("file1")
+    assert not node_cache.file_cached("file1")
+
+
+def test_compact_node_graph_lazy_view():
+    parent = TextNode(id_="parent", text="标题", token=10, order_num_str="1")
+    context = TextNode(id_="context", text="", doc_relationships={DocumentNodeRelationship.CONTEXTUAL_GROUP: []})
+    child = TextNode(id_="child", text="正文", token=4, order_num_str="1.1")
+    parent.doc_relationships[DocumentNodeRelationship.CHILD] = [child]
+    child.doc_relationships[DocumentNodeRelationship.PARENT] = parent
+
+    graph = CompactNodeGraph.from_nodes([parent, context])
+    assert len(graph) == 3
+
+    view = graph.view()
+    node = view.get("child")
+    # 关系在访问前不实例化关联节点
+    assert len(view.nodes) == 1
+    assert node.doc_relationships.get(DocumentNodeRelationship.PARENT) is view.get("parent")
+    assert view.get("parent").doc_relationships[DocumentNodeRelationship.CHILD][0] is node
+    # 空的上下文节点组需要保留
+    assert view.get("context").doc_relationships[DocumentNodeRelationship.CONTEXTUAL_GROUP] == []
+    # 视图内的修改不影响缓存
+    node.doc_relationships[DocumentNodeRelationship.COMPLETE_GROUP] = {node}
+    assert DocumentNodeRelationship.COMPLETE_GROUP not in graph.view().get("child").doc_relationships
@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bella_rag.utils.single_flight import SingleFlight
+
+
+class FakeRedis:
+    """只实现SingleFlight用到的命令，忽略过期时间"""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def set(self, key, value, nx=False, ex=None):
+        with self.lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value if isinstance(value, bytes) else str(value).encode('utf-8')
+            return True
+
+    def get(self, key):
+        with self.lock:
+            return self.data.get(key)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+def lock_key(flight: SingleFlight, key: str) -> str:
+    return f'{SingleFlight.REDIS_KEY_PREFIX}{flight.name}:lock:{key}'
+
+
+def redis_flight(redis_client: FakeRedis, wait_timeout: float = 5) -> SingleFlight:
+    return SingleFlight(name='test', redis_client=redis_client,
+                        dumps=lambda v: v.encode('utf-8'), loads=lambda v: v.decode('utf-8'),
+                        wait_timeout=wait_timeout, poll_interval=0.01)
+
+
+def run_concurrently(flight: SingleFlight, key: str, func, n: int):
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        futures = [executor.submit(flight.do, key, func) for _ in range(n)]
+        return [f.exception() or f.result() for f in futures]
+
+
+def test_leader_result_shared_by_waiters():
+    flight = SingleFlight(name='test')
+    calls = []
+
+    def func():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'result'
+
+    assert run_concurrently(flight, 'k', func, 4) == ['result'] * 4
+    assert len(calls) == 1
+    assert not flight.calls
+    # 执行结束后不再共享，重新执行
+    assert flight.do('k', func) == 'result'
+    assert len(calls) == 2
+
+
+def test_leader_error_shared_by_waiters():
+    flight = SingleFlight(name='test')
+    calls = []
+
+    def func():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError('failed')
+
+    results = run_concurrently(flight, 'k', func, 4)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(calls) == 1
+    assert not flight.calls
+
+
+def test_waiter_timeout_executes_itself():
+    flight = SingleFlight(name='test', wait_timeout=0.1)
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return 'leader'
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leader = executor.submit(flight.do, 'k', slow)
+        time.sleep(0.05)
+        # 等待超时后自行执行
+        assert flight.do('k', lambda: 'waiter') == 'waiter'
+        release.set()
+        assert leader.result() == 'leader'
+
+
+def test_redis_waiter_reads_leader_result():
+    redis_client = FakeRedis()
+    leader_flight, waiter_flight = redis_flight(redis_client), redis_flight(redis_client)
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.2)
+        return 'leader'
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leader = executor.submit(leader_flight.do, 'k', slow)
+        assert started.wait(5)
+        # 其他进程等待执行进程的结果，不自行执行
+        assert waiter_flight.do('k', lambda: pytest.fail('waiter should not execute')) == 'leader'
+        assert leader.result() == 'leader'
+    assert lock_key(leader_flight, 'k') not in redis_client.data
+
+
+def test_redis_waiter_ignores_previous_result():
+    redis_client = FakeRedis()
+    flight = redis_flight(redis_client)
+    # 上一次执行的结果仍在有效期内
+    assert flight.do('k', lambda: 'old') == 'old'
+
+    # 其他进程开始新一次执行，执行失败未写入结果
+    redis_client.set(lock_key(flight, 'k'), 'other-token', nx=True)
+    threading.Timer(0.1, redis_client.delete, args=(lock_key(flight, 'k'),)).start()
+
+    assert flight.do('k', lambda: 'new') == 'new'
+
+
+def test_redis_waiter_timeout_executes_itself():
+    redis_client = FakeRedis()
+    flight = redis_flight(redis_client, wait_timeout=0.1)
+    # 执行进程一直未结束
+    redis_client.set(lock_key(flight, 'k'), 'other-token', nx=True)
+
+    start = time.time()
+    assert flight.do('k', lambda: 'waiter') == 'waiter'
+    assert time.time() - start < 1